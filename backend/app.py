@@ -14,7 +14,7 @@ import os
 from pathlib import Path
 import re
 import sys
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 import uuid
 import pprint
 import json
@@ -24,18 +24,49 @@ import urllib.request
 import urllib.error
 import time
 
-from flask import Flask, Response, jsonify, request, send_file, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_file, send_from_directory
 from flask_cors import CORS
 from flask_restful import Api, Resource
 from functools import wraps
 
-from modules.lexical_search.lexical_utils import lexical_search_in_files
+from modules.lexical_search.concordance import lexical_concordance
+from modules.lexical_search.lexical_utils import (
+    FACET_LIMIT,
+    SEARCH_MODES,
+    IndexBuilding,
+    available_books,
+    fetch_paragraph,
+    fetch_paragraphs,
+    lexical_search_batch,
+    lexical_search_counts,
+    lexical_search_detailed,
+    lexical_search_export,
+    parse_paragraph_refs,
+    stem_query,
+)
+from modules.lexical_search.spelling import warm_lexical_caches
+from modules.lexical_search.suggest import lexical_suggest
+from modules.lexical_search.collocations import lexical_collocations, precompute_collocations
+from modules.lexical_search.similarity import similar_paragraphs
+from modules.semantic_search.semantic_utils import load_semantic_index, semantic_search
 from modules.mancia.mancia_utils import get_random_paragraph
 from modules.bibliography.biblioRefW import build_biblio_wv, get_books_wv
 from modules.bibliography.biblioRefVerbete import build_ref_verbete
 from utils.config import (
     FILES_SEARCH_DIR,
+    COLLOCATION_LIMIT,
+    COLLOCATION_PRECOMPUTE_TOP,
+    COLLOCATION_WINDOW,
+    CONCORDANCE_LIMIT,
+    CONCORDANCE_WINDOW,
+    LEXICAL_TIME_BUDGET_S,
+    LEXICAL_WARMUP,
     MODEL_LLM,
+    SEMANTIC_RESULTS,
+    SEMANTIC_WARMUP,
+    SIMILAR_RESULTS,
+    SLOW_QUERY_MS,
+    SUGGEST_LIMIT,
 )
 from utils.docx_export import build_docx
 from utils.logs import (
@@ -49,6 +80,8 @@ from utils.logs import (
     summarize_records,
     clear_today,
     clear_all,
+    log_slow_query,
+    read_slow_records,
 )
 from utils.response_llm import generate_llm_answer, reset_conversation_memory
 
@@ -163,6 +196,18 @@ logger.info(
     FILES_SEARCH_DIR,
 )
 
+# Índices léxicos, autocomplete e ortografia montados em segundo plano (a 1ª carga leva alguns segundos)
+def _lexical_warmup():
+    warm_lexical_caches()
+    if COLLOCATION_PRECOMPUTE_TOP > 0:
+        precompute_collocations(available_books(), top_n=COLLOCATION_PRECOMPUTE_TOP)
+    if SEMANTIC_WARMUP:
+        load_semantic_index()
+
+
+if LEXICAL_WARMUP or SEMANTIC_WARMUP:
+    threading.Thread(target=_lexical_warmup, name="lexical-warmup", daemon=True).start()
+
 
 # ______________________________________________________________________
 # 1. Lexical Search
@@ -175,14 +220,51 @@ class LexicalSearchResource(Resource):
             # Parse input parameters with defaults
             term = safe_str(data.get("term", ""))
             source = data.get("source", [])  # lista
+            facets = parse_list_param(data.get("facets"))  # ex.: ["area", "author"]
+            facet_limit = parse_int_param(data.get("facet_limit"), FACET_LIMIT, "facet_limit")
+            mode = safe_str(data.get("mode", "results")).lower() or "results"
+            stem = parse_bool_param(data.get("stem"))  # palavras simples viram palavra~stem
+            snippet = parse_int_param(data.get("snippet"), 0, "snippet")  # N > 0: trecho de N caracteres em vez do parágrafo
+            fields = parse_list_param(data.get("fields"))  # ex.: ["source", "number", "title"]; ["all"] = completo
+            refine = safe_str(data.get("refine", "")) or None  # result_id anterior: busca só nos resultados dele
+            dedupe = parse_bool_param(data.get("dedupe"))  # parágrafos idênticos entre livros viram um só
+            engine = safe_str(data.get("engine", "")).lower() or None  # "memory" | "sqlite" | "sharded" (padrão: LEXICAL_ENGINE)
+            # plano + tempos por fase/livro (também aceito na URL: /lexical_search?explain=1)
+            explain = parse_bool_param(data.get("explain", request.args.get("explain")))
+            # prazo pedido pelo cliente (ms) nunca passa do teto do servidor
+            time_budget_s = parse_time_budget(data.get("time_budget_ms"))
 
            
             if not term:
                 raise ValueError("Search term is required")
+            if mode not in SEARCH_MODES:
+                raise ValueError(f"Invalid mode '{mode}' (expected one of: {', '.join(SEARCH_MODES)})")
+            if refine and mode != "results":
+                raise ValueError("refine is only supported with mode 'results'")
+            if explain and mode != "results":
+                raise ValueError("explain is only supported with mode 'results'")
+            query = stem_query(term) if stem else term
+
+            # Modos leves: só inteiros/booleanos por livro (payload mínimo)
+            if mode != "results":
+                counts = lexical_search_counts(
+                    query, source, mode=mode, time_budget_s=time_budget_s, engine=engine
+                )
+                g.slow_query = {"query": term, "books": source, "results": counts.get("total", counts.get("any"))}
+                response = {"term": term, "search_type": "lexical", "mode": mode, **counts}
+                return response, 200, get_search_headers('lexical')
 
 
             # Process search
-            results = lexical_search_in_files(term, source)
+            search = lexical_search_detailed(
+                query, source, facets=facets, facet_limit=facet_limit, time_budget_s=time_budget_s,
+                snippet=snippet, fields=fields, engine=engine, dedupe=dedupe, refine=refine, explain=explain,
+            )
+            results = search["results"]
+            g.slow_query = {
+                "query": term, "books": source or list(search["facets"]["books"]),
+                "results": search["total"], "phases": search["phases"],
+            }
 
             # Sort by source for consistent ordering
             #results.sort(key=lambda x: x['source' or 'book' or 'file'])
@@ -197,8 +279,25 @@ class LexicalSearchResource(Resource):
                 "term": term,
                 "search_type": "lexical",
                 "results": results or [],
-                "count": len(results) if results else 0
+                "count": len(results) if results else 0,
+                # trechos: texto integral em /paragraph (source, number)
+                "snippet": snippet,
+                # contagens exatas (sem o teto de resultados) por livro e por coluna
+                "total": search["total"],
+                "facets": search["facets"],
+                # orçamento esgotado: resultados parciais (exatos até onde foi avaliado)
+                "truncated": search["truncated"],
+                "skipped_books": search["skipped_books"],
+                # só quando não houve ocorrências: [{"query", "corrections", "distance"}, ...]
+                "suggestions": search["suggestions"],
+                # dedupe=true: repetições retiradas da lista (listadas em "duplicates" de cada item)
+                "duplicates": search["duplicates"],
+                # conjunto completo guardado no servidor (RESULT_CACHE_TTL_S): refine=<result_id>
+                "result_id": search["result_id"],
             }
+            if explain:
+                # tokens, RPN, plano por termo/livro (pré-filtradas/varridas/casadas) e tempos em ms
+                response["explain"] = search["explain"]
 
            
             return response, 200, get_search_headers('lexical')
@@ -208,6 +307,260 @@ class LexicalSearchResource(Resource):
             return error_response, status_code, headers
 
 
+# ______________________________________________________________________
+# 2. Lexical Search em lote (várias queries, uma passada por livro)
+# ______________________________________________________________________
+class LexicalSearchBatchResource(Resource):
+    def post(self):
+        try:
+            data = request.get_json(force=True) or {}
+
+            queries = data.get("queries", [])  # lista de termos
+            source = data.get("source", [])  # lista
+            mode = safe_str(data.get("mode", "count")).lower() or "count"
+            max_results = parse_int_param(data.get("max_results"), 20, "max_results")
+            stem = parse_bool_param(data.get("stem"))
+            snippet = parse_int_param(data.get("snippet"), 0, "snippet")
+            fields = parse_list_param(data.get("fields"))
+            engine = safe_str(data.get("engine", "")).lower() or None  # como em /lexical_search
+            # um orçamento para o lote inteiro; o prazo pedido nunca passa do teto do servidor
+            time_budget_s = parse_time_budget(data.get("time_budget_ms"))
+
+            if not isinstance(queries, list):
+                raise ValueError("'queries' must be a list of search terms")
+            if stem:
+                queries = [stem_query(safe_str(q)) for q in queries]
+
+            batch = lexical_search_batch(
+                queries, source, mode=mode, max_results=max_results, snippet=snippet, fields=fields,
+                time_budget_s=time_budget_s, engine=engine,
+            )
+
+            response = {
+                "search_type": "lexical_batch",
+                "mode": mode,
+                "queries": batch,
+                "count": len(batch),
+                # orçamento esgotado: alguma query ficou parcial (ver truncated/skipped_books de cada uma)
+                "truncated": any(q["truncated"] for q in batch),
+            }
+            return response, 200, get_search_headers('lexical_batch')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "lexical batch search")
+            return error_response, status_code, headers
+
+
+# ______________________________________________________________________
+# 2.1 Autocomplete (termos do corpus + títulos de verbetes por prefixo)
+# ______________________________________________________________________
+class LexicalSuggestResource(Resource):
+    # GET ?q=proj&limit=10&source=LO,DAC  (chamado a cada tecla; POST aceita o mesmo em JSON)
+    def get(self):
+        return self._suggest(request.args)
+
+    def post(self):
+        return self._suggest(request.get_json(force=True) or {})
+
+    def _suggest(self, data):
+        try:
+            prefix = safe_str(data.get("q", data.get("prefix", "")))
+            source = parse_list_param(data.get("source"))
+            limit = parse_int_param(data.get("limit"), SUGGEST_LIMIT, "limit", minimum=1)
+
+            suggestions = lexical_suggest(prefix, source or None, limit=limit)
+            response = {"search_type": "lexical_suggest", **suggestions}
+            return response, 200, get_search_headers('lexical_suggest')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "lexical suggest")
+            return error_response, status_code, headers
+
+
+# ______________________________________________________________________
+# 2.2 Concordância (KWIC: palavra/frase no contexto, sem parágrafos inteiros)
+# ______________________________________________________________________
+class ConcordanceResource(Resource):
+    def post(self):
+        try:
+            data = request.get_json(force=True) or {}
+
+            term = safe_str(data.get("term", ""))
+            source = data.get("source", [])  # lista
+            window = parse_int_param(data.get("window"), CONCORDANCE_WINDOW, "window")
+            sort = safe_str(data.get("sort", "book")).lower() or "book"
+            offset = parse_int_param(data.get("offset"), 0, "offset")
+            limit = parse_int_param(data.get("limit"), CONCORDANCE_LIMIT, "limit")
+
+            if not term:
+                raise ValueError("Search term is required")
+
+            kwic = lexical_concordance(term, source, window=window, sort=sort, offset=offset, limit=limit)
+
+            response = {
+                "term": term,
+                "search_type": "concordance",
+                "sort": sort,
+                "offset": offset,
+                "count": len(kwic["lines"]),
+                **kwic,
+            }
+            return response, 200, get_search_headers('concordance')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "concordance")
+            return error_response, status_code, headers
+
+
+# ______________________________________________________________________
+# 2.3 Colocações (palavras que mais coocorrem com o termo: PMI / log-verossimilhança)
+# ______________________________________________________________________
+class CollocationsResource(Resource):
+    def post(self):
+        try:
+            data = request.get_json(force=True) or {}
+
+            term = safe_str(data.get("term", ""))
+            source = data.get("source", [])  # lista
+            scope = safe_str(data.get("scope", "paragraph")).lower() or "paragraph"
+            measure = safe_str(data.get("measure", "ll")).lower() or "ll"
+            window = parse_int_param(data.get("window"), COLLOCATION_WINDOW, "window", minimum=1)
+            min_count = parse_int_param(data.get("min_count"), 3, "min_count", minimum=1)
+            limit = parse_int_param(data.get("limit"), COLLOCATION_LIMIT, "limit", minimum=1)
+            stopwords = parse_bool_param(data.get("stopwords"))
+
+            if not term:
+                raise ValueError("Search term is required")
+
+            stats = lexical_collocations(
+                term, source, scope=scope, window=window, measure=measure,
+                min_count=min_count, limit=limit, stopwords=stopwords,
+            )
+
+            response = {
+                "term": term,
+                "search_type": "collocations",
+                "scope": scope,
+                "measure": measure,
+                "count": len(stats["collocates"]),
+                **stats,
+            }
+            return response, 200, get_search_headers('collocations')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "collocations")
+            return error_response, status_code, headers
+
+
+# ______________________________________________________________________
+# 2.4 Parágrafos semelhantes ("mais como este", TF-IDF local)
+# ______________________________________________________________________
+class SimilarResource(Resource):
+    def post(self):
+        try:
+            data = request.get_json(force=True) or {}
+
+            book = safe_str(data.get("book", ""))
+            number = parse_int_param(data.get("number"), 0, "number", minimum=1)
+            source = data.get("source", [])  # lista; vazio = todos os livros
+            k = parse_int_param(data.get("k"), SIMILAR_RESULTS, "k", minimum=1)
+
+            if not book or not number:
+                raise ValueError("book and number are required")
+
+            similar = similar_paragraphs(book, number, source, k=k)
+
+            response = {
+                "search_type": "similar",
+                "count": len(similar["results"]),
+                **similar,
+            }
+            return response, 200, get_search_headers('similar')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "similar")
+            return error_response, status_code, headers
+
+
+# ______________________________________________________________________
+# 2.5 Busca semântica local (embeddings LSA, sem rede)
+# ______________________________________________________________________
+class SemanticSearchResource(Resource):
+    def post(self):
+        try:
+            data = request.get_json(force=True) or {}
+
+            query = safe_str(data.get("query", data.get("term", "")))
+            source = data.get("source", [])  # lista; vazio = todos os livros
+            k = parse_int_param(data.get("k"), SEMANTIC_RESULTS, "k", minimum=1)
+
+            if not query:
+                raise ValueError("Search query is required")
+
+            found = semantic_search(query, source, k=k)
+
+            response = {
+                "query": query,
+                "search_type": "semantic_local",
+                "count": len(found["results"]),
+                **found,
+            }
+            return response, 200, get_search_headers('semantic_local')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "semantic search")
+            return error_response, status_code, headers
+
+
+# ______________________________________________________________________
+# 2.6 Parágrafo por id (livro, número) com vizinhos; POST = lote
+# ______________________________________________________________________
+class ParagraphResource(Resource):
+    # GET ?book=LO&number=108&before=2&after=2
+    def get(self):
+        try:
+            book = safe_str(request.args.get("book", ""))
+            number = parse_int_param(request.args.get("number"), 0, "number", minimum=1)
+            context = parse_int_param(request.args.get("context"), 0, "context")
+            before = parse_int_param(request.args.get("before"), context, "before")
+            after = parse_int_param(request.args.get("after"), context, "after")
+
+            if not book or not number:
+                raise ValueError("book and number are required")
+
+            paragraph = fetch_paragraph(book, number, before, after)
+            return {"search_type": "paragraph", **paragraph}, 200, get_search_headers('paragraph')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "paragraph fetch")
+            return error_response, status_code, headers
+
+    # POST {"ids": "TNP: 538, 816" | [...], "before": 1, "after": 1}
+    def post(self):
+        try:
+            data = request.get_json(force=True) or {}
+
+            ids = parse_paragraph_ids(data.get("ids", data.get("refs")))
+            context = parse_int_param(data.get("context"), 0, "context")
+            before = parse_int_param(data.get("before"), context, "before")
+            after = parse_int_param(data.get("after"), context, "after")
+
+            if not ids:
+                raise ValueError("ids are required")
+
+            paragraphs = fetch_paragraphs(ids, before, after)
+            response = {
+                "search_type": "paragraph",
+                "count": len(paragraphs),
+                "paragraphs": paragraphs,
+            }
+            return response, 200, get_search_headers('paragraph')
+
+        except Exception as e:
+            error_response, status_code, headers = handle_search_error(e, "paragraph fetch")
+            return error_response, status_code, headers
+
+
 # ______________________________________________________________________
 # 3. LLM Query
 # ______________________________________________________________________
@@ -306,7 +659,13 @@ class LlmQueryResource(Resource):
 
             # Generate LLM answer
             # -------------------
+            t0 = time.perf_counter()
             results = generate_llm_answer(**parameters)
+            g.slow_query = {
+                "query": query, "books": vector_store_names, "model": model,
+                "results": len(parse_paragraph_refs(safe_str(results.get("file_citations", "")))),  # parágrafos citados
+                "phases": {"llm": round((time.perf_counter() - t0) * 1000.0, 3)},
+            }
 
             if "error" in results:
                 return {"error": results["error"]}, 500
@@ -459,11 +818,37 @@ class DownloadResource(Resource):
         try:
             data = request.get_json(force=True) or {}
             group_results_by_book = data.get("group_results_by_book", False)
-           
+
+            # result_id da busca: os hits saem do cache do servidor (ou a busca é refeita),
+            # sem o navegador reenviar a lista inteira e sem o teto de 100 itens
+            result_id = safe_str(data.get("result_id", ""))
+            phases = {}
+            t0 = time.perf_counter()
+            if result_id and not data.get("lexical"):
+                search = lexical_search_export(
+                    result_id, safe_str(data.get("search_term", "")), parse_list_param(data.get("source_array"))
+                )
+                data = {
+                    **data,
+                    "search_term": data.get("search_term") or search["search_term"],
+                    "source_array": data.get("source_array") or list(search["facets"]["books"]),
+                    "lexical": search["results"],
+                    "facets": search["facets"],
+                    "truncated": search["truncated"],
+                    "skipped_books": search["skipped_books"],
+                }
+                phases = {f"search_{k}": v for k, v in search["phases"].items()}
+                t0 = time.perf_counter()
+
             #Extrai variáveis
             search_term = data.get("search_term")
         
             docx_bytes = build_docx(data, group_results_by_book)
+            phases["docx"] = round((time.perf_counter() - t0) * 1000.0, 3)
+            g.slow_query = {
+                "query": search_term, "books": data.get("source_array"),
+                "results": len(data.get("lexical") or []), "phases": phases,
+            }
             filename = f"{search_term}"
             filename = filename[:30]
             filename = filename + '.' + ".docx"
@@ -477,6 +862,8 @@ class DownloadResource(Resource):
 
 
 
+        except ValueError as e:
+            return handle_search_error(e, "download")
         except Exception as e:
             logger.error(f"Error in DownloadResource: {str(e)}", exc_info=True)
             return {"error": "Internal server error"}, 500
@@ -500,6 +887,12 @@ def handle_search_error(error: Exception, context: str = "search") -> Tuple[Dict
     error_type = error.__class__.__name__
     error_details = str(error)
     
+    if isinstance(error, IndexBuilding):
+        # construção em segundo plano (não é erro): o cliente tenta de novo
+        logger.info(f"[{context}] {error_details}")
+        headers = {**get_search_headers(context), 'Retry-After': '5'}
+        return {'error': 'index building', 'error_type': error_type, 'details': error_details}, 503, headers
+
     if isinstance(error, ValueError):
         status_code = 400
         error_message = f"Invalid request parameters: {error_details}"
@@ -519,6 +912,66 @@ def handle_search_error(error: Exception, context: str = "search") -> Tuple[Dict
 
 
 
+def parse_list_param(value) -> list:
+    """Aceita lista JSON ou string separada por vírgulas; devolve lista de strings limpas."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [safe_str(v) for v in value if safe_str(v)]
+
+
+def parse_bool_param(value) -> bool:
+    """Aceita bool JSON ou string ("1", "true", "sim"...)."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "sim", "on")
+    return bool(value)
+
+
+def parse_int_param(value, default: int, name: str, minimum: int = 0) -> int:
+    """Inteiro do pedido (ausente/vazio = `default`); ValueError (400) se inválido ou < `minimum`."""
+    if value is None or value == "":
+        return default
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer (got {value!r})") from None
+    if number < minimum:
+        raise ValueError(f"{name} must be >= {minimum} (got {number})")
+    return number
+
+
+def parse_time_budget(value) -> Optional[float]:
+    """
+    time_budget_ms do cliente -> prazo em segundos, em (0, LEXICAL_TIME_BUDGET_S]; ausente =
+    o teto do servidor. O cliente só encurta o prazo: 0/negativo/não numérico é 400.
+    """
+    ms = parse_int_param(value, 0, "time_budget_ms", minimum=1)
+    if not ms:
+        return LEXICAL_TIME_BUDGET_S
+    return min(ms / 1000.0, LEXICAL_TIME_BUDGET_S) if LEXICAL_TIME_BUDGET_S else ms / 1000.0
+
+
+def parse_paragraph_ids(raw) -> list:
+    """Aceita "TNP: 538, 816; LO: 12", ["LO:12", ...], [{"book","number"}, ...] ou [[book, number], ...]."""
+    if isinstance(raw, str):
+        return parse_paragraph_refs(raw)
+    ids = []
+    try:
+        for item in raw or []:
+            if isinstance(item, dict):
+                ids.append((safe_str(item.get("book", item.get("source"))), int(item.get("number"))))
+            elif isinstance(item, (list, tuple)) and len(item) == 2:
+                ids.append((safe_str(item[0]), int(item[1])))
+            else:
+                ids.extend(parse_paragraph_refs(safe_str(item)))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid paragraph id: {item!r}")
+    return ids
+
+
 def get_search_headers(search_type: str) -> Dict[str, str]:
     """
     Get standard headers for search responses.
@@ -539,9 +992,43 @@ def get_search_headers(search_type: str) -> Dict[str, str]:
 
 
 
+# ---------------------- Slow-query log ----------------------
+# Requisições acima de SLOW_QUERY_MS vão para logs/access/slow-AAAA-MM-DD.log (thread própria);
+# cada recurso deixa em g.slow_query o que sabe (query, livros, nº de resultados, fases em ms).
+SLOW_QUERY_ENDPOINTS = ("/lexical_search", "/llm_query", "/download")
+
+
+@app.before_request
+def start_request_timer():
+    if SLOW_QUERY_MS and request.path in SLOW_QUERY_ENDPOINTS:
+        g.request_t0 = time.perf_counter()
+
+
+@app.after_request
+def log_slow_request(response):
+    t0 = g.pop("request_t0", None)
+    if t0 is not None:
+        ms = (time.perf_counter() - t0) * 1000.0
+        if ms >= SLOW_QUERY_MS:
+            log_slow_query({
+                "endpoint": request.path,
+                "status": response.status_code,
+                "ms": round(ms, 3),
+                **g.pop("slow_query", {}),
+            })
+    return response
+
+
 # ====================== Routes ======================
 api.add_resource(LlmQueryResource, '/llm_query')
 api.add_resource(LexicalSearchResource, '/lexical_search')
+api.add_resource(LexicalSearchBatchResource, '/lexical_search_batch')
+api.add_resource(LexicalSuggestResource, '/lexical_suggest')
+api.add_resource(ConcordanceResource, '/concordance')
+api.add_resource(CollocationsResource, '/collocations')
+api.add_resource(SimilarResource, '/similar')
+api.add_resource(SemanticSearchResource, '/semantic_search')
+api.add_resource(ParagraphResource, '/paragraph')
 api.add_resource(RandomPensataResource, '/random_pensata')
 api.add_resource(BiblioWVBooksResource, '/biblio_wv/books')
 api.add_resource(BiblioWVBuildResource, '/biblio_wv/build')
@@ -619,6 +1106,25 @@ def get_logs():
     return Response(raw_text, mimetype='text/plain; charset=utf-8')
 
 
+@app.route('/logs/slow', methods=['GET'])
+def get_slow_logs():
+    # ?limit=100&endpoint=/lexical_search&min_ms=5000&format=json|ndjson
+    try:
+        limit = int(request.args.get('limit', '100') or 0)
+        min_ms = float(request.args['min_ms']) if request.args.get('min_ms') else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "invalid limit/min_ms"}), 400
+    records = read_slow_records(
+        limit=limit if limit > 0 else None,
+        endpoint=request.args.get('endpoint') or None,
+        min_ms=min_ms,
+    )
+    if (request.args.get('format') or 'json').lower() == 'ndjson':
+        text = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        return Response(text, mimetype='application/x-ndjson; charset=utf-8')
+    return jsonify({"records": records, "count": len(records), "threshold_ms": SLOW_QUERY_MS})
+
+
 @app.route('/logs/clear', methods=['DELETE'])
 def clear_logs_today():
     try:
@@ -0,0 +1,339 @@
+# collocations.py
+"""
+Colocações e coocorrência de termos ("palavras que mais aparecem com X").
+
+Derivado dos índices da busca léxica (lexical_utils, concordance), sem SciPy:
+  - matriz esparsa linha x palavra (CSR em arrays NumPy) montada uma vez por livro, a partir
+    dos tokens do índice posicional;
+  - escopo "paragraph": coocorrência = nº de parágrafos com X e com a palavra (bincount das
+    palavras das linhas de X);
+  - escopo "window": coocorrência = ocorrências da palavra a até N tokens de X, no mesmo parágrafo.
+
+Medidas: contagem, PMI (log2 observado/esperado) e log-verossimilhança G² de Dunning (2x2).
+Resultados por livro/termo ficam num cache LRU; os termos mais frequentes podem ser
+pré-calculados (precompute_collocations) para respostas interativas.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+from modules.lexical_search.concordance import (
+    PositionIndex,
+    _concordance_words,
+    load_position_index,
+    phrase_positions,
+)
+from modules.lexical_search.lexical_utils import (
+    BookIndex,
+    _BOOL_OPS,
+    _prepare_query,
+    find_book_file,
+    iter_bits,
+    load_book_index,
+    normalize_for_match,
+    resolve_book_files,
+    split_field_token,
+    split_fuzzy_token,
+    split_stem_token,
+    text_term_bits,
+    tokenize_query,
+)
+from modules.lexical_search.stemmer_pt import STOPWORDS_PT
+from utils.config import (
+    COLLOCATION_LIMIT,
+    COLLOCATION_WINDOW,
+    MAX_COLLOCATION_LIMIT,
+    MAX_COLLOCATION_WINDOW,
+)
+
+logger = logging.getLogger("cons-ai")
+
+COLLOCATION_SCOPES = ("paragraph", "window")
+COLLOCATION_MEASURES = ("ll", "pmi", "count")
+
+_CACHE_SIZE = 512  # resultados (livro, termo, escopo, janela) guardados
+
+
+# =============================================================================================
+# Matriz por livro
+# =============================================================================================
+@dataclass
+class CooccurrenceIndex:
+    """Linha x palavra (presença) em CSR + frequências, no espaço de ids do índice posicional."""
+    book: str
+    mtime: float
+    words: List[str]
+    word_ids: Dict[str, int]
+    indptr: np.ndarray        # linha i -> indices[indptr[i]:indptr[i+1]]
+    indices: np.ndarray       # ids de palavra (sem repetição dentro da linha)
+    doc_freq: np.ndarray      # palavra -> nº de linhas
+    tok_word: np.ndarray      # token global -> palavra
+    tok_row: np.ndarray       # token global -> linha
+    tok_freq: np.ndarray      # palavra -> nº de tokens
+    content: np.ndarray       # palavra -> True se não for stopword/número
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.indptr) - 1
+
+
+_matrix_cache: Dict[str, CooccurrenceIndex] = {}
+_result_cache: "OrderedDict[Tuple, Tuple[np.ndarray, np.ndarray, int, int]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def build_cooccurrence_index(index: BookIndex, pos: PositionIndex) -> CooccurrenceIndex:
+    """CSR vetorizado: chaves linha*V+palavra únicas -> (linha, palavra) em ordem."""
+    n_words = len(pos.words)
+    tok_word = np.frombuffer(pos.tok_word, dtype=np.uint32).astype(np.int64)
+    row_ptr = np.frombuffer(pos.row_ptr, dtype=np.uint32).astype(np.int64)
+    tok_row = np.repeat(np.arange(len(row_ptr) - 1), np.diff(row_ptr))
+
+    keys = np.unique(tok_row * n_words + tok_word)
+    rows, indices = np.divmod(keys, n_words)
+    indptr = np.searchsorted(rows, np.arange(len(row_ptr)), side="left")
+
+    content = np.array([w not in STOPWORDS_PT and not w.isdigit() for w in pos.words], dtype=bool)
+    return CooccurrenceIndex(
+        book=index.book,
+        mtime=index.mtime,
+        words=pos.words,
+        word_ids={w: i for i, w in enumerate(pos.words)},
+        indptr=indptr,
+        indices=indices,
+        doc_freq=np.bincount(indices, minlength=n_words),
+        tok_word=tok_word,
+        tok_row=tok_row,
+        tok_freq=np.bincount(tok_word, minlength=n_words),
+        content=content,
+    )
+
+
+def load_cooccurrence_index(index: BookIndex) -> CooccurrenceIndex:
+    """Matriz do livro em cache (refeita quando o índice do livro muda)."""
+    key = str(index.path or index.book)
+    with _cache_lock:
+        cached = _matrix_cache.get(key)
+    if cached is not None and cached.mtime == index.mtime:
+        return cached
+    t0 = time.perf_counter()
+    built = build_cooccurrence_index(index, load_position_index(index))
+    with _cache_lock:
+        _matrix_cache[key] = built
+    logger.info(f"[load_cooccurrence_index] {index.book}: {built.n_rows} linhas em {time.perf_counter() - t0:.2f}s")
+    return built
+
+
+# =============================================================================================
+# Contagens por livro
+# =============================================================================================
+def _token_key(token: str) -> str:
+    """
+    Forma normalizada do termo para o cache de resultados: "Projeção" (consulta) e "projecao"
+    (pré-cálculo, palavra do vocabulário) caem na mesma entrada.
+    """
+    fuzzy = split_fuzzy_token(token)
+    if fuzzy:
+        return f"{fuzzy[0]}~{fuzzy[1]}"
+    stem = split_stem_token(token)
+    if stem:
+        return f"{stem}~stem"
+    if len(token) >= 2 and token[0] == '"' and token[-1] == '"':
+        return '"' + " ".join(normalize_for_match(token[1:-1]).split()) + '"'
+    return normalize_for_match(token)
+
+
+def _book_counts(
+    index: BookIndex, token: str, scope: str, window: int
+) -> Tuple[CooccurrenceIndex, np.ndarray, np.ndarray, int, int]:
+    """
+    Coocorrências do termo no livro, como vetor esparso (ids, contagens), mais
+    f_x (parágrafos ou ocorrências de X) e `slots` (parágrafos de X, ou posições observadas
+    ao redor de X no escopo de janela).
+    """
+    co = load_cooccurrence_index(index)
+    cache_key = (co.book, co.mtime, _token_key(token), scope, window)
+    with _cache_lock:
+        hit = _result_cache.get(cache_key)
+        if hit is not None:
+            _result_cache.move_to_end(cache_key)
+    if hit is not None:
+        return (co,) + hit
+
+    pos = load_position_index(index)
+    seq = _concordance_words(index, pos, token)
+    own = [co.word_ids.get(w) for alternatives in seq for w in alternatives]
+
+    if scope == "paragraph":
+        rows = np.fromiter(iter_bits(text_term_bits(index, token)), dtype=np.int64)
+        mask = np.zeros(co.n_rows, dtype=bool)
+        mask[rows] = True
+        selected = co.indices[np.repeat(mask, np.diff(co.indptr))]
+        counts = np.bincount(selected, minlength=len(co.words))
+        f_x = slots = len(rows)  # tabela 2x2 em parágrafos
+    else:
+        starts = np.asarray(phrase_positions(pos, seq), dtype=np.int64)
+        n = len(seq)
+        offsets = np.concatenate([np.arange(-window, 0), np.arange(n, n + window)])
+        around = starts[:, None] + offsets[None, :]
+        valid = (around >= 0) & (around < len(co.tok_word))
+        around = np.where(valid, around, 0)
+        valid &= co.tok_row[around] == co.tok_row[starts][:, None]  # mesmo parágrafo
+        counts = np.bincount(co.tok_word[around[valid]], minlength=len(co.words))
+        f_x = len(starts)
+        slots = int(valid.sum())
+
+    for wid in own:
+        if wid is not None:
+            counts[wid] = 0  # o próprio termo não é colocado de si mesmo
+    ids = np.flatnonzero(counts)
+    result = (ids, counts[ids], f_x, slots)
+    with _cache_lock:
+        _result_cache[cache_key] = result
+        while len(_result_cache) > _CACHE_SIZE:
+            _result_cache.popitem(last=False)
+    return (co,) + result
+
+
+# =============================================================================================
+# Medidas de associação
+# =============================================================================================
+def _xlogx_ratio(k: np.ndarray, expected: np.ndarray) -> np.ndarray:
+    """k * ln(k / E), com 0 quando k == 0."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = k * np.log(k / expected)
+    return np.where(k > 0, out, 0.0)
+
+
+def association_scores(a: np.ndarray, f_w: np.ndarray, slots: int, total: int) -> Dict[str, np.ndarray]:
+    """
+    Tabela 2x2 por palavra w:  k11 = a (w perto de X), k12 = slots - a,
+    k21 = f_w - a (w longe de X), k22 = total - slots - k21.
+    PMI = log2(k11 / E11); G² = 2 Σ k ln(k / E).
+    """
+    a = a.astype(np.float64)
+    f_w = f_w.astype(np.float64)
+    k11 = a
+    k12 = np.maximum(slots - a, 0.0)
+    k21 = np.maximum(f_w - a, 0.0)
+    k22 = np.maximum(total - slots - k21, 0.0)
+    n = k11 + k12 + k21 + k22
+    r1, r2 = k11 + k12, k21 + k22
+    c1, c2 = k11 + k21, k12 + k22
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        e11, e12, e21, e22 = r1 * c1 / n, r1 * c2 / n, r2 * c1 / n, r2 * c2 / n
+        pmi = np.log2(k11 / e11)
+    ll = 2.0 * (_xlogx_ratio(k11, e11) + _xlogx_ratio(k12, e12) + _xlogx_ratio(k21, e21) + _xlogx_ratio(k22, e22))
+    # associação negativa (menos que o esperado) recebe G² negativo, como de costume
+    ll = np.where(k11 < e11, -ll, ll)
+    return {"pmi": np.nan_to_num(pmi, neginf=0.0), "ll": ll}
+
+
+# =============================================================================================
+# Função pública
+# =============================================================================================
+def lexical_collocations(
+    term: str,
+    source: List[str],
+    scope: str = "paragraph",
+    window: int = COLLOCATION_WINDOW,
+    measure: str = "ll",
+    min_count: int = 3,
+    limit: int = COLLOCATION_LIMIT,
+    stopwords: bool = False,
+) -> Dict[str, Any]:
+    """
+    Colocados de um termo/frase (mesma sintaxe da concordância) nos livros pedidos.
+
+    - scope: "paragraph" (parágrafos em comum) ou "window" (até `window` palavras de distância).
+    - measure: ordenação por "ll" (G²), "pmi" ou "count".
+    - min_count: coocorrência mínima (PMI supervaloriza palavras raras).
+    - stopwords: inclui artigos/preposições/números (por padrão ficam fora).
+
+    Retorno: {"total": f_x, "collocates": [{"word", "count", "freq", "pmi", "ll"}, ...]}
+    """
+    if scope not in COLLOCATION_SCOPES:
+        raise ValueError(f"Invalid scope '{scope}' (expected one of: {', '.join(COLLOCATION_SCOPES)})")
+    if measure not in COLLOCATION_MEASURES:
+        raise ValueError(f"Invalid measure '{measure}' (expected one of: {', '.join(COLLOCATION_MEASURES)})")
+    window = max(1, min(int(window), MAX_COLLOCATION_WINDOW))
+    limit = max(1, min(int(limit), MAX_COLLOCATION_LIMIT))
+
+    leaves = tokenize_query(_prepare_query(term))
+    if len(leaves) != 1 or leaves[0] in _BOOL_OPS or leaves[0] in "()" or split_field_token(leaves[0]):
+        raise ValueError("Colocações aceitam um único termo ou frase (sem operadores nem campos).")
+    token = leaves[0]
+
+    # agrega os livros pela palavra (ids de palavra são locais a cada livro)
+    together: Dict[str, int] = {}
+    books: List[Tuple[CooccurrenceIndex, np.ndarray]] = []
+    f_x = slots = total = 0
+    for path in resolve_book_files(term, source):
+        index = load_book_index(path)
+        co, ids, counts, book_fx, book_slots = _book_counts(index, token, scope, window)
+        books.append((co, co.doc_freq if scope == "paragraph" else co.tok_freq))
+        f_x += book_fx
+        slots += book_slots
+        total += co.n_rows if scope == "paragraph" else len(co.tok_word)
+        if not stopwords:
+            keep = co.content[ids]
+            ids, counts = ids[keep], counts[keep]
+        for wid, n in zip(ids.tolist(), counts.tolist()):
+            word = co.words[wid]
+            together[word] = together.get(word, 0) + n
+
+    words = [w for w, n in together.items() if n >= min_count]
+    if not words:
+        return {"total": f_x, "collocates": []}
+
+    a = np.array([together[w] for w in words])
+    # frequência de w em TODOS os livros pesquisados (inclusive onde não coocorre com X)
+    f_w = np.zeros(len(words), dtype=np.int64)
+    for co, freq in books:
+        for i, w in enumerate(words):
+            wid = co.word_ids.get(w)
+            if wid is not None:
+                f_w[i] += freq[wid]
+    scores = association_scores(a, f_w, slots, total)
+    key = a if measure == "count" else scores[measure]
+    order = np.lexsort((np.array(words), -a, -key))[:limit]
+
+    return {
+        "total": f_x,
+        "collocates": [
+            {
+                "word": words[i],
+                "count": int(a[i]),
+                "freq": int(f_w[i]),
+                "pmi": round(float(scores["pmi"][i]), 3),
+                "ll": round(float(scores["ll"][i]), 2),
+            }
+            for i in order
+        ],
+    }
+
+
+def precompute_collocations(books: Optional[List[str]] = None, top_n: int = 50) -> int:
+    """
+    Preenche o cache com os colocados (escopo parágrafo) dos `top_n` termos de conteúdo mais
+    frequentes de cada livro. Devolve quantos termos foram calculados.
+    """
+    done = 0
+    for book in books or []:
+        path = find_book_file(book)
+        if path is None:
+            continue
+        index = load_book_index(path)
+        co = load_cooccurrence_index(index)
+        freq = np.where(co.content, co.doc_freq, 0)
+        for wid in np.argsort(-freq, kind="stable")[:top_n]:
+            _book_counts(index, co.words[wid], "paragraph", COLLOCATION_WINDOW)
+            done += 1
+    return done
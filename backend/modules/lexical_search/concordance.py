@@ -0,0 +1,232 @@
+# concordance.py
+"""
+Concordância (KWIC) com postings posicionais.
+
+Por livro (lazy, guardado em BookIndex.positions): tokens em arrays contíguos (CSR por linha)
+com offsets no texto exibido, e postings posicionais palavra -> ids globais de token. Token =
+trecho entre espaços do texto exibido; a pontuação interna some na normalização
+(auto-estima -> autoestima), igual ao texto indexado para a busca. Frases = interseção de
+posições consecutivas; o contexto é recortado do texto original só para a página pedida.
+"""
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Dict, List, Tuple
+
+import logging
+import re
+import time
+
+from modules.lexical_search.lexical_utils import (
+    BookIndex,
+    _BOOL_OPS,
+    _KWIC_TOKEN_RE,
+    _prepare_query,
+    fuzzy_vocab,
+    load_book_index,
+    normalize_for_match,
+    resolve_book_files,
+    split_field_token,
+    split_fuzzy_token,
+    split_stem_token,
+    stem_vocab,
+    strip_markdown_simple,
+    term_pattern,
+    tokenize_query,
+)
+from utils.config import (
+    CONCORDANCE_LIMIT,
+    CONCORDANCE_WINDOW,
+    MAX_CONCORDANCE_LIMIT,
+    MAX_CONCORDANCE_WINDOW,
+)
+
+logger = logging.getLogger("cons-ai")
+
+CONCORDANCE_SORTS = ("book", "left", "right")
+_KWIC_CORE_RE = re.compile(r"\w(?:.*\w)?")  # parte "palavra" do token (sem pontuação nas pontas)
+
+
+@dataclass
+class PositionIndex:
+    """Tokens do livro: palavra, início/fim no texto exibido e linha (via row_ptr)."""
+    words: List[str]                 # id -> palavra normalizada
+    tok_word: array                  # token global -> id da palavra
+    tok_start: array                 # token global -> início no texto exibido da linha
+    tok_end: array                   # token global -> fim no texto exibido da linha
+    row_ptr: array                   # linha i ocupa os tokens [row_ptr[i], row_ptr[i+1])
+    postings: Dict[str, array]       # palavra -> tokens globais (crescente)
+
+    def row_of(self, g: int) -> int:
+        return bisect_right(self.row_ptr, g) - 1
+
+
+def _display_text(index: BookIndex, row: int) -> str:
+    """Texto exibido da linha (sem marcação markdown), base dos offsets da concordância."""
+    return strip_markdown_simple(str(index.rows[row].get(index.texto_key, "")))
+
+
+def build_position_index(index: BookIndex) -> PositionIndex:
+    words: List[str] = []
+    word_ids: Dict[str, int] = {}
+    tok_word, tok_start, tok_end = array("I"), array("I"), array("I")
+    row_ptr = array("I", [0])
+    postings: Dict[str, array] = {}
+    normalized: Dict[str, str] = {}  # trecho -> palavra (trechos se repetem muito)
+
+    for row in range(index.size):
+        for m in _KWIC_TOKEN_RE.finditer(_display_text(index, row)):
+            chunk = m.group(0)
+            word = normalized.get(chunk)
+            if word is None:
+                word = normalized[chunk] = normalize_for_match(chunk)
+            if not word:
+                continue  # só pontuação ("—", "…")
+            wid = word_ids.get(word)
+            if wid is None:
+                wid = word_ids[word] = len(words)
+                words.append(word)
+                postings[word] = array("I")
+            postings[word].append(len(tok_word))
+            tok_word.append(wid)
+            tok_start.append(m.start())
+            tok_end.append(m.end())
+        row_ptr.append(len(tok_word))
+
+    return PositionIndex(words, tok_word, tok_start, tok_end, row_ptr, postings)
+
+
+def load_position_index(index: BookIndex) -> PositionIndex:
+    """Índice posicional do livro, montado na primeira concordância e guardado no BookIndex."""
+    if index.positions is None:
+        t0 = time.perf_counter()
+        index.positions = build_position_index(index)
+        logger.info(
+            f"[load_position_index] {index.book}: {len(index.positions.tok_word)} tokens "
+            f"em {time.perf_counter() - t0:.2f}s"
+        )
+    return index.positions
+
+
+def _concordance_words(index: BookIndex, pos: PositionIndex, token: str) -> List[List[str]]:
+    """
+    Sequência de alternativas por posição: frase -> uma palavra por posição; termo simples,
+    curinga, ~k e ~stem -> uma posição com as palavras do vocabulário que casam.
+    """
+    if len(token) >= 2 and token[0] == '"' and token[-1] == '"':
+        return [[w] for w in normalize_for_match(token[1:-1]).split()]
+    fuzzy = split_fuzzy_token(token)
+    if fuzzy:
+        return [fuzzy_vocab(index, *fuzzy)]
+    stem = split_stem_token(token)
+    if stem:
+        return [stem_vocab(index, stem)]
+    if "*" in token:
+        pat = term_pattern(token)
+        return [[w for w in pos.words if pat.search(w)]]
+    return [[normalize_for_match(token)]]
+
+
+def phrase_positions(pos: PositionIndex, seq: List[List[str]]) -> List[int]:
+    """Tokens globais onde a sequência começa (posições consecutivas na mesma linha)."""
+    if not seq:
+        return []
+
+    def occurrences(alternatives: List[str]) -> set:
+        return set(chain.from_iterable(pos.postings.get(w, ()) for w in alternatives))
+
+    starts = occurrences(seq[0])
+    for k, alternatives in enumerate(seq[1:], start=1):
+        if not starts:
+            break
+        nxt = occurrences(alternatives)
+        starts = {g for g in starts if g + k in nxt}
+    if len(seq) > 1:
+        # a frase não atravessa a fronteira entre linhas
+        starts = {g for g in starts if pos.row_of(g) == pos.row_of(g + len(seq) - 1)}
+    return sorted(starts)
+
+
+def _kwic_line(index: BookIndex, pos: PositionIndex, g: int, n: int, window: int) -> Dict[str, Any]:
+    """Linha KWIC do token global `g` (frase de `n` tokens) com `window` palavras de cada lado."""
+    row = pos.row_of(g)
+    first, last = pos.row_ptr[row], pos.row_ptr[row + 1] - 1
+    end_tok = g + n - 1
+    text = _display_text(index, row)
+
+    m_start, m_end = pos.tok_start[g], pos.tok_end[end_tok]
+    core = _KWIC_CORE_RE.search(text, m_start, m_end)
+    if core:  # destaca só a palavra; pontuação colada vai para o contexto
+        m_start, m_end = core.start(), core.end()
+
+    left_from = pos.tok_start[max(first, g - window)]
+    right_to = pos.tok_end[min(last, end_tok + window)]
+    return {
+        "source": index.book,
+        "number": index.rows[row].get("paragraph_number"),
+        "left": text[left_from:m_start].strip(),
+        "match": text[m_start:m_end],
+        "right": text[m_end:right_to].strip(),
+    }
+
+
+def lexical_concordance(
+    term: str,
+    source: List[str],
+    window: int = CONCORDANCE_WINDOW,
+    sort: str = "book",
+    offset: int = 0,
+    limit: int = CONCORDANCE_LIMIT,
+) -> Dict[str, Any]:
+    """
+    Concordância KWIC de um termo ou frase nos livros pedidos.
+
+    - term: palavra, frase (com ou sem aspas), curinga, palavra~k ou palavra~stem (sem operadores).
+    - window: palavras de contexto de cada lado (teto MAX_CONCORDANCE_WINDOW).
+    - sort: "book" (ordem dos livros/parágrafos), "left" (palavras à esquerda, da mais próxima
+      para a mais distante) ou "right" (palavras à direita).
+    - offset/limit: paginação sobre o total de ocorrências.
+
+    Retorno: {"total": int, "counts": {livro: n}, "lines": [{"source","number","left","match","right"}]}
+    """
+    window = max(0, min(int(window), MAX_CONCORDANCE_WINDOW))
+    offset = max(0, int(offset))
+    limit = max(0, min(int(limit), MAX_CONCORDANCE_LIMIT))
+    if sort not in CONCORDANCE_SORTS:
+        raise ValueError(f"Invalid sort '{sort}' (expected one of: {', '.join(CONCORDANCE_SORTS)})")
+
+    leaves = tokenize_query(_prepare_query(term))
+    if len(leaves) != 1 or leaves[0] in _BOOL_OPS or leaves[0] in "()" or split_field_token(leaves[0]):
+        raise ValueError("A concordância aceita um único termo ou frase (sem operadores nem campos).")
+    token = leaves[0]
+
+    hits: List[Tuple[BookIndex, PositionIndex, int, int]] = []
+    counts: Dict[str, int] = {}
+    for path in resolve_book_files(term, source):
+        index = load_book_index(path)
+        pos = load_position_index(index)
+        seq = _concordance_words(index, pos, token)
+        starts = phrase_positions(pos, seq)
+        counts[index.book] = len(starts)
+        hits.extend((index, pos, g, len(seq)) for g in starts)
+
+    if sort != "book":
+        def context_key(hit: Tuple[BookIndex, PositionIndex, int, int]) -> Tuple[str, ...]:
+            _, pos, g, n = hit
+            row = pos.row_of(g)
+            first, last = pos.row_ptr[row], pos.row_ptr[row + 1] - 1
+            if sort == "left":
+                ids = range(g - 1, max(first, g - window) - 1, -1)
+            else:
+                ids = range(g + n, min(last, g + n - 1 + window) + 1)
+            return tuple(pos.words[pos.tok_word[t]] for t in ids)
+
+        hits.sort(key=context_key)
+
+    page = hits[offset: offset + limit]
+    return {
+        "total": len(hits),
+        "counts": counts,
+        "lines": [_kwic_line(index, pos, g, n, window) for index, pos, g, n in page],
+    }
@@ -0,0 +1,219 @@
+# engines.py
+"""
+Motores de busca léxica (interface plugável), escolhidos por LEXICAL_ENGINE ou por requisição.
+
+"memory": bitsets sobre o BookIndex em cache (padrão; único com sugestões ortográficas).
+"sqlite": SQLite FTS5 em disco (fts_engine.py), baixo uso de memória e seguro entre
+          processos; queries sem tradução para FTS5 voltam ao motor em memória.
+"sharded": o motor em memória em processos de shard de longa duração (shard_service.py), cada
+          um dono de parte dos livros; uma requisição usa todos os núcleos.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import logging
+import time
+
+from modules.lexical_search.lexical_utils import (
+    QueryTrace,
+    SearchBudget,
+    estimate_query_cost,
+    evaluate_query_bits,
+    facet_counts,
+    load_book_index,
+    materialize_hits,
+)
+from utils.config import LEXICAL_ENGINE
+
+logger = logging.getLogger("cons-ai")
+
+LEXICAL_ENGINES = ("memory", "sqlite", "sharded")
+
+
+@dataclass
+class BookHits:
+    """Resultado de um livro em `LexicalEngine.search_books`."""
+    count: int = 0
+    hits: List[Dict[str, Any]] = field(default_factory=list)
+    facets: Dict[str, Dict[str, int]] = field(default_factory=dict)  # coluna -> {valor: n}
+    truncated: bool = False   # orçamento cortou o livro no meio (contagem parcial)
+    skipped: bool = False     # orçamento acabou antes do livro
+    bits: Optional[int] = None  # linhas que casaram (keep_bits=True; motores com bitset)
+
+
+class LexicalEngine(ABC):
+    """Motor léxico: avalia a query num livro e devolve contagem e primeiras linhas."""
+    name = "base"
+
+    @abstractmethod
+    def book_count(self, path: Path, query: str, budget: Optional[SearchBudget] = None) -> int:
+        """Total de linhas do livro que casam com a query."""
+
+    @abstractmethod
+    def book_search(
+        self,
+        path: Path,
+        query: str,
+        limit: int,
+        snippet: int = 0,
+        full_metadata: bool = False,
+        budget: Optional[SearchBudget] = None,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """(total de linhas que casam, até `limit` hits no formato de materialize_hits)."""
+
+    def query_cost(self, paths: List[Path], query: str) -> int:
+        """Custo estimado da query nos livros (0 = motor sem planejador)."""
+        return 0
+
+    def search_books(
+        self,
+        paths: List[Path],
+        query: str,
+        limit: int,
+        snippet: int = 0,
+        full_metadata: bool = False,
+        facet_columns: Iterable[str] = (),
+        budget: Optional[SearchBudget] = None,
+        dedupe: bool = False,
+        within: Optional[Dict[str, int]] = None,
+        keep_bits: bool = False,
+        trace: Optional[QueryTrace] = None,
+    ) -> Dict[str, BookHits]:
+        """
+        Busca em vários livros: {livro: BookHits}. `limit` vale para o conjunto (na ordem de
+        `paths`); livros com erro ficam de fora (logado). `dedupe` junta parágrafos idênticos
+        (ver dedupe_hits); `within` ({livro: bitset}) restringe a busca a essas linhas e
+        `keep_bits` devolve o bitset de cada livro (só motores com bitset, ex.: "memory").
+        `trace` recebe o plano e os tempos por livro (só o motor em memória preenche).
+        Padrão: book_search livro a livro, sem facetas por coluna nem bitsets.
+        """
+        if within is not None:
+            raise ValueError(f"O motor '{self.name}' não suporta busca nos resultados (refine).")
+        out: Dict[str, BookHits] = {}
+        seen: Optional[Dict[int, Dict[str, Any]]] = {} if dedupe else None
+        remaining = limit
+        for path in paths:
+            if budget is not None and budget.exhausted:
+                out[path.stem] = BookHits(skipped=True)
+                continue
+            try:
+                count, hits = self.book_search(path, query, max(remaining, 0), snippet, full_metadata, budget)
+            except Exception as e:
+                logger.error(f"[{type(self).__name__}] Erro ao processar {path.name}: {e}", exc_info=True)
+                continue
+            if seen is not None:
+                hits = dedupe_hits(hits, path.stem, seen)
+            remaining -= len(hits)
+            out[path.stem] = BookHits(count=count, hits=hits)
+        return out
+
+
+class MemoryEngine(LexicalEngine):
+    name = "memory"
+
+    def book_count(self, path: Path, query: str, budget: Optional[SearchBudget] = None) -> int:
+        return evaluate_query_bits(load_book_index(path), query, budget=budget).bit_count()
+
+    def book_search(self, path, query, limit, snippet=0, full_metadata=False, budget=None):
+        index = load_book_index(path)
+        bits = evaluate_query_bits(index, query, budget=budget)
+        return bits.bit_count(), materialize_hits(index, bits, query, limit, snippet, full_metadata)
+
+    def query_cost(self, paths: List[Path], query: str) -> int:
+        cost = 0
+        for path in paths:
+            try:
+                cost += estimate_query_cost(load_book_index(path), query)
+            except Exception as e:
+                logger.error(f"[check_query_cost] Erro ao processar {path.name}: {e}", exc_info=True)
+        return cost
+
+    def search_books(
+        self, paths, query, limit, snippet=0, full_metadata=False, facet_columns=(), budget=None, dedupe=False,
+        within=None, keep_bits=False, trace=None,
+    ):
+        out: Dict[str, BookHits] = {}
+        seen: Optional[Dict[int, Dict[str, Any]]] = {} if dedupe else None  # O(1) por hit, entre livros
+        remaining = limit
+        for path in paths:
+            if budget is not None and budget.exhausted:
+                out[path.stem] = BookHits(skipped=True)
+                continue
+            try:
+                if trace is not None:
+                    trace.begin_book(path.stem)
+                    t0 = time.perf_counter()
+                # corpus + índices ficam em cache (recarrega só se o arquivo mudar)
+                index = load_book_index(path, trace)
+                if trace is not None:
+                    t0 = trace.book_phase("load", t0)
+                cutoff_before = budget.cutoff if budget is not None else None
+                mask = within.get(path.stem, 0) if within is not None else None
+                bits = evaluate_query_bits(index, query, budget=budget, within=mask, trace=trace)
+                if trace is not None:
+                    t0 = trace.book_phase("evaluate", t0)
+                hits = materialize_hits(index, bits, query, max(remaining, 0), snippet, full_metadata, seen)
+                if trace is not None:
+                    t0 = trace.book_phase("materialize", t0)
+            except Exception as e:
+                logger.error(f"[lexical_search_in_files] Erro ao processar {path.name}: {e}", exc_info=True)
+                continue
+            remaining -= len(hits)
+            out[path.stem] = BookHits(
+                count=bits.bit_count(),
+                hits=hits,
+                facets={col: facet_counts(index, bits, col) for col in facet_columns},
+                truncated=budget is not None and budget.cutoff is not None and budget.cutoff != cutoff_before,
+                bits=bits if keep_bits else None,
+            )
+            if trace is not None:
+                trace.book_phase("facets", t0)
+                trace.books[path.stem].update(rows=index.size, matched=out[path.stem].count)
+        return out
+
+
+def dedupe_hits(hits: List[Dict[str, Any]], source: str, seen: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Tira de `hits` (do livro `source`) os parágrafos cujo content_hash já está em `seen`,
+    anotando a origem em "duplicates" do primeiro hit igual. Hits sem hash passam direto.
+    """
+    kept: List[Dict[str, Any]] = []
+    for hit in hits:
+        h = hit.get("content_hash")
+        first = seen.get(h) if h is not None else None
+        if first is None:
+            if h is not None:
+                seen[h] = hit
+            kept.append(hit)
+        else:
+            dups = first.setdefault("duplicates", [])
+            dups.append({"source": source, "number": hit.get("paragraph_number")})
+            dups.extend(hit.get("duplicates", []))
+    return kept
+
+
+_engines: Dict[str, LexicalEngine] = {}
+
+
+def get_lexical_engine(name: Optional[str] = None) -> LexicalEngine:
+    """Instância (única por processo) do motor pedido; padrão = LEXICAL_ENGINE."""
+    name = (name or LEXICAL_ENGINE).lower()
+    if name not in LEXICAL_ENGINES:
+        raise ValueError(f"Invalid engine '{name}' (expected one of: {', '.join(LEXICAL_ENGINES)})")
+    engine = _engines.get(name)
+    if engine is None:
+        if name == "sqlite":
+            # import tardio: fts_engine importa este módulo
+            from modules.lexical_search.fts_engine import SqliteFtsEngine
+            engine = SqliteFtsEngine()
+        elif name == "sharded":
+            from modules.lexical_search.shard_service import ShardedEngine
+            engine = ShardedEngine()
+        else:
+            engine = MemoryEngine()
+        _engines[name] = engine
+    return engine
+
+
@@ -0,0 +1,299 @@
+# fts_engine.py
+"""
+Motor léxico alternativo em SQLite FTS5 (LEXICAL_ENGINE=sqlite ou engine="sqlite").
+
+- Um banco em disco (LEXICAL_SQLITE_PATH) com todos os livros: tabela `paragraphs`
+  (texto original, metadados em JSON e texto normalizado) e o índice FTS5 `fts` sobre o
+  texto normalizado (external content). Cada livro ocupa um intervalo contíguo de ids,
+  então filtrar por livro é um intervalo de rowid dentro do próprio FTS5.
+- O texto indexado é o mesmo de BookIndex.norm (normalize_for_match sem markdown): só letras,
+  dígitos e espaços, de modo que o tokenizador unicode61 separa as mesmas palavras do motor
+  em memória.
+- Linhas agregadoras ("cabeçalho | item | item") ficam fora de `fts`: seus itens vão para
+  `segments`/`seg_fts` e a linha casa se algum item casa, como no motor em memória.
+- O livro é (re)indexado quando o mtime do arquivo muda; a escrita é uma transação
+  BEGIN IMMEDIATE em modo WAL, o que deixa vários processos lerem/atualizarem com segurança.
+
+Tradução da sintaxe (to_fts5): palavra -> "palavra"; prefixo proj* -> "proj"*; frase ->
+"frase"; a & b -> AND; a | b -> OR; a & !b -> NOT. Sem equivalente em FTS5 (curinga no início
+ou no meio, ~k, ~stem, campo:valor, ! isolado ou dentro de |): a query vai para o motor em
+memória. Diferença aceita: frases casam por palavras inteiras (no motor em memória são
+substrings do texto normalizado).
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from modules.lexical_search.engines import LexicalEngine, MemoryEngine
+from modules.lexical_search.lexical_utils import (
+    _BOOL_OPS,
+    SearchBudget,
+    _prepare_query,
+    _WORD_RE,
+    compact_metadata,
+    content_hash,
+    is_approx_token,
+    make_snippet,
+    normalize_for_match,
+    read_book_rows,
+    shunting_yard,
+    split_field_token,
+    strip_markdown_simple,
+    tokenize_query,
+)
+from modules.lexical_search.segments import join_segments, split_segments
+from utils.config import LEXICAL_SQLITE_PATH
+
+logger = logging.getLogger("cons-ai")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    book TEXT PRIMARY KEY, mtime REAL, texto_key TEXT, has_metadata INTEGER,
+    first_id INTEGER, last_id INTEGER, seg_first INTEGER, seg_last INTEGER
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+    id INTEGER PRIMARY KEY, book TEXT NOT NULL, number INTEGER, text TEXT, metadata TEXT,
+    norm TEXT, header TEXT
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY, para_id INTEGER NOT NULL, text TEXT, norm TEXT
+);
+CREATE INDEX IF NOT EXISTS segments_para ON segments(para_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(
+    norm, content='paragraphs', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS seg_fts USING fts5(
+    norm, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# linhas que casam: diretas (não agregadoras) + agregadoras com algum item que casa
+_MATCH_IDS = """
+SELECT rowid AS id FROM fts WHERE fts MATCH :expr AND rowid BETWEEN :first_id AND :last_id
+UNION
+SELECT s.para_id FROM seg_fts JOIN segments s ON s.id = seg_fts.rowid
+WHERE seg_fts MATCH :expr AND seg_fts.rowid BETWEEN :seg_first AND :seg_last
+"""
+# contagem sem o UNION: os dois conjuntos são disjuntos (agregadoras não estão em `fts`)
+_COUNT = """
+SELECT (SELECT count(*) FROM fts WHERE fts MATCH :expr AND rowid BETWEEN :first_id AND :last_id)
+     + (SELECT count(DISTINCT s.para_id) FROM seg_fts JOIN segments s ON s.id = seg_fts.rowid
+        WHERE seg_fts MATCH :expr AND seg_fts.rowid BETWEEN :seg_first AND :seg_last)
+"""
+_BOOK_COLUMNS = "mtime, first_id, last_id, seg_first, seg_last, texto_key, has_metadata"
+
+
+# =============================================================================================
+# Tradução da query -> expressão MATCH do FTS5
+# =============================================================================================
+def _fts_term(token: str) -> Optional[str]:
+    """Termo/frase/prefixo -> operando FTS5 (None se não houver equivalente)."""
+    if split_field_token(token) or is_approx_token(token):
+        return None
+    if len(token) >= 2 and token[0] == '"' and token[-1] == '"':
+        words = normalize_for_match(token[1:-1]).split()
+        if not words or "*" in token[1:-1]:
+            return None
+        return '"' + " ".join(words) + '"'
+    prefix = token.endswith("*")
+    word = normalize_for_match(token[:-1] if prefix else token)
+    if not _WORD_RE.fullmatch(word or "") or "*" in word:
+        return None
+    return f'"{word}"*' if prefix else f'"{word}"'
+
+
+def to_fts5(query: str) -> Optional[str]:
+    """Query na sintaxe do motor (!, &, |, aspas, prefixo*) -> MATCH do FTS5, ou None."""
+    q = _prepare_query(query)
+    if not q:
+        return None
+    # pilha de (expressão, negada?) — NOT do FTS5 é binário: só existe como "a NOT b"
+    stack: List[Tuple[str, bool]] = []
+    try:
+        for t in shunting_yard(tokenize_query(q)):
+            if t == "!":
+                expr, negated = stack.pop()
+                stack.append((expr, not negated))
+            elif t in _BOOL_OPS:
+                (b, neg_b), (a, neg_a) = stack.pop(), stack.pop()
+                if t == "|":
+                    if neg_a or neg_b:
+                        return None
+                    stack.append((f"({a} OR {b})", False))
+                elif neg_a and neg_b:
+                    return None
+                elif neg_a or neg_b:
+                    pos, neg = (b, a) if neg_a else (a, b)
+                    stack.append((f"({pos} NOT {neg})", False))
+                else:
+                    stack.append((f"({a} AND {b})", False))
+            else:
+                term = _fts_term(t)
+                if term is None:
+                    return None
+                stack.append((term, False))
+    except IndexError:
+        return None
+    if len(stack) != 1 or stack[0][1]:
+        return None
+    return stack[0][0]
+
+
+# =============================================================================================
+# Motor
+# =============================================================================================
+class SqliteFtsEngine(LexicalEngine):
+    name = "sqlite"
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or LEXICAL_SQLITE_PATH)
+        self._local = threading.local()
+        self._fallback = MemoryEngine()
+
+    # ---------------------------------------------------------------- conexão / sincronização
+    def connection(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def sync_book(self, path: Path) -> Dict[str, Any]:
+        """Garante o livro indexado na versão do arquivo; devolve sua linha da tabela `books`."""
+        conn = self.connection()
+        book, mtime = path.stem, path.stat().st_mtime
+        info = self._book_info(conn, book)
+        if info is not None and info["mtime"] == mtime:
+            return info
+
+        rows, has_metadata = read_book_rows(path)  # fora da transação (leitura do xlsx é lenta)
+        t0 = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            info = self._book_info(conn, book)
+            if info is None or info["mtime"] != mtime:  # senão, outro processo acabou de indexar
+                self._index_book(conn, book, mtime, rows, has_metadata)
+                info = self._book_info(conn, book)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"[SqliteFtsEngine] {book}: {len(rows)} linhas indexadas em {time.perf_counter() - t0:.2f}s")
+        return info
+
+    @staticmethod
+    def _book_info(conn: sqlite3.Connection, book: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(f"SELECT {_BOOK_COLUMNS} FROM books WHERE book = ?", (book,)).fetchone()
+        return dict(zip(_BOOK_COLUMNS.split(", "), row)) if row else None
+
+    @staticmethod
+    def _index_book(conn, book: str, mtime: float, rows: List[Dict[str, Any]], has_metadata: bool) -> None:
+        # remove a versão anterior (external content: o FTS5 precisa do texto antigo para apagar)
+        conn.execute(
+            "INSERT INTO seg_fts(seg_fts, rowid, norm) SELECT 'delete', s.id, s.norm FROM segments s "
+            "JOIN paragraphs p ON p.id = s.para_id WHERE p.book = ?", (book,)
+        )
+        conn.execute("DELETE FROM segments WHERE para_id IN (SELECT id FROM paragraphs WHERE book = ?)", (book,))
+        conn.execute(
+            "INSERT INTO fts(fts, rowid, norm) SELECT 'delete', id, norm FROM paragraphs "
+            "WHERE book = ? AND header IS NULL", (book,)
+        )
+        conn.execute("DELETE FROM paragraphs WHERE book = ?", (book,))
+
+        texto_key = next(iter(rows[0].keys())) if rows and rows[0] else "text"
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM paragraphs").fetchone()[0]
+        seg_first = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM segments").fetchone()[0]
+        records, seg_records = [], []
+        for k, r in enumerate(rows):
+            text = str(r.get(texto_key, ""))
+            meta = {c: v for c, v in r.items() if c != texto_key}
+            split = split_segments(text)
+            records.append((
+                first_id + k, book, r.get("paragraph_number", k + 1), text,
+                json.dumps(meta, ensure_ascii=False) if has_metadata else None,
+                normalize_for_match(strip_markdown_simple(text)),
+                split[0] if split else None,
+            ))
+            for item in (split[1] if split else []):
+                seg_records.append((
+                    seg_first + len(seg_records), first_id + k, item,
+                    normalize_for_match(strip_markdown_simple(item)),
+                ))
+        conn.executemany(
+            "INSERT INTO paragraphs(id, book, number, text, metadata, norm, header) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            records,
+        )
+        conn.executemany("INSERT INTO segments(id, para_id, text, norm) VALUES (?, ?, ?, ?)", seg_records)
+        conn.execute(
+            "INSERT INTO fts(rowid, norm) SELECT id, norm FROM paragraphs WHERE book = ? AND header IS NULL", (book,)
+        )
+        conn.execute(
+            "INSERT INTO seg_fts(rowid, norm) SELECT id, norm FROM segments WHERE id >= ?", (seg_first,)
+        )
+        conn.execute(
+            f"INSERT OR REPLACE INTO books(book, {_BOOK_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (book, mtime, first_id, first_id + len(rows) - 1, seg_first, seg_first + len(seg_records) - 1,
+             texto_key, int(has_metadata)),
+        )
+
+    # ---------------------------------------------------------------- busca
+    def book_count(self, path: Path, query: str, budget: Optional[SearchBudget] = None) -> int:
+        expr = to_fts5(query)
+        if expr is None:
+            return self._fallback.book_count(path, query, budget)
+        params = {"expr": expr, **self.sync_book(path)}
+        return self.connection().execute(_COUNT, params).fetchone()[0]
+
+    def book_search(self, path, query, limit, snippet=0, full_metadata=False, budget=None):
+        expr = to_fts5(query)
+        if expr is None:
+            return self._fallback.book_search(path, query, limit, snippet, full_metadata, budget)
+        info = self.sync_book(path)
+        params = {"expr": expr, **info}
+        conn = self.connection()
+        total = conn.execute(_COUNT, params).fetchone()[0]
+        if total == 0 or limit <= 0:
+            return total, []
+
+        found = conn.execute(
+            f"SELECT p.id, p.number, p.text, p.metadata, p.header, p.norm FROM paragraphs p "
+            f"JOIN ({_MATCH_IDS} ORDER BY id LIMIT :limit) m ON p.id = m.id ORDER BY p.id",
+            {**params, "limit": limit},
+        ).fetchall()
+
+        # linhas agregadoras: só os itens que casaram
+        items: Dict[int, List[str]] = {}
+        aggregated = [r[0] for r in found if r[4] is not None]
+        if aggregated:
+            for para_id, text in conn.execute(
+                "SELECT s.para_id, s.text FROM seg_fts JOIN segments s ON s.id = seg_fts.rowid "
+                f"WHERE seg_fts MATCH ? AND s.para_id IN ({','.join('?' * len(aggregated))}) ORDER BY s.id",
+                (expr, *aggregated),
+            ):
+                items.setdefault(para_id, []).append(text)
+
+        texto_key, has_metadata = info["texto_key"], bool(info["has_metadata"])
+        hits: List[Dict[str, Any]] = []
+        for para_id, number, text, meta_json, header, norm in found:
+            metadata = None
+            if has_metadata:
+                row = {texto_key: text, **json.loads(meta_json or "{}")}
+                metadata = row if full_metadata else compact_metadata(row, texto_key)
+            shown = join_segments(header, items.get(para_id, [])) if header is not None else text
+            hits.append({
+                "paragraph_text": make_snippet(shown, query, snippet) if snippet > 0 else shown,
+                "paragraph_number": number,
+                "metadata": metadata,
+                "content_hash": content_hash(norm),
+            })
+        return total, hits
@@ -9,16 +9,28 @@ Módulo de busca léxica em arquivos .md/.txt e .xlsx com suporte a:
 - Curingas: `*` (prefixo, sufixo, infixo)
 - Frases exatas entre aspas: "campo de força"
 - Normalização: case-insensitive e sem acentos (NFD)
-- Pré-filtro barato por substring (quando seguro) para acelerar a busca
+- Índice invertido por palavra + planejador (postings ou varredura pela regex) por termo
+- Busca por campo de metadados (title:holo*, author:vieira, area:experimentologia)
+  e faixas numéricas/datas (number:100..200, date:2010..2015) via índices secundários
+- Cache em memória do corpus (texto normalizado + índices por coluna) por arquivo
+- Linhas agregadoras ("cabeçalho | item | item"): a query é avaliada item a item
 
 Organização:
 1) Constantes & imports
 2) Modelos de dados
-3) Normalização & helpers gerais
-4) I/O (leitura de arquivos)
-5) Mini-motor booleano (tokenização, RPN, compilação + pré-filtro)
-6) Buscas por tipo de conteúdo (MD/Excel)
-7) Façade pública `lexical_search_in_files`
+3) Façade pública `lexical_search_in_files` (e variantes: detalhada, contagens, lote, exportação)
+4) Normalização & helpers gerais
+5) I/O (leitura de arquivos)
+6) Mini-motor booleano (tokenização, RPN, termos compilados)
+7) Buscas por tipo de conteúdo (MD/Excel)
+8) Índice em memória (cache de corpus, índices por coluna, avaliação por bitsets)
+9) Parágrafo por id (livro, número) com vizinhos
+
+Módulos irmãos:
+- segments.py: linhas agregadoras avaliadas item a item
+- engines.py: motores plugáveis (memória, SQLite FTS5, shards) e `get_lexical_engine`
+- suggest.py / spelling.py: autocomplete e "você quis dizer"
+- concordance.py: concordância KWIC com postings posicionais
 """
 
 from __future__ import annotations
@@ -26,23 +38,105 @@ from __future__ import annotations
 # =============================================================================================
 # 1) Constantes & imports
 # =============================================================================================
-from dataclasses import dataclass, asdict
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, asdict, field
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+import hashlib
 import logging
 import re
+import threading
+import time
 import unicodedata
 
 import pandas as pd
 
-from utils.config import FILES_SEARCH_DIR, MAX_OVERALL_SEARCH_RESULTS
+from modules.lexical_search.result_cache import result_cache
+from modules.lexical_search.stemmer_pt import stem_pt
+from utils.config import (
+    FILES_SEARCH_DIR,
+    LEXICAL_EXPORT_ROW_BUDGET,
+    LEXICAL_EXPORT_TIME_BUDGET_S,
+    LEXICAL_MAX_QUERY_COST,
+    LEXICAL_ROW_BUDGET,
+    LEXICAL_TIME_BUDGET_S,
+    MAX_BATCH_QUERIES,
+    MAX_EXPORT_RESULTS,
+    MAX_OVERALL_SEARCH_RESULTS,
+    MAX_PARAGRAPH_BATCH,
+    MAX_PARAGRAPH_CONTEXT,
+    SNIPPET_MAX_CHARS,
+    SNIPPET_MIN_CHARS,
+)
+
+if TYPE_CHECKING:
+    from modules.lexical_search.concordance import PositionIndex
+    from modules.lexical_search.engines import LexicalEngine
+    from modules.lexical_search.segments import SegmentIndex
 
 logger = logging.getLogger("cons-ai")
 
 # Operadores e precedência: NOT > AND > OR
 _BOOL_OPS: Dict[str, int] = {"!": 3, "&": 2, "|": 1}
 
+# Modos de resposta: resultados completos, só contagem ou só existência (por livro)
+SEARCH_MODES = ("results", "count", "exists")
+
+# Campos de metadados pesquisáveis (colunas das planilhas) e apelidos em português
+KNOWN_FIELDS = {
+    "title", "author", "area", "theme", "date", "number", "pagina",
+    "folha", "argumento", "quest", "answer", "link",
+}
+_FIELD_ALIASES: Dict[str, str] = {
+    "titulo": "title",
+    "autor": "author",
+    "tema": "theme",
+    "data": "date",
+    "numero": "number",
+    "pag": "pagina",
+    "page": "pagina",
+    "pergunta": "quest",
+    "resposta": "answer",
+}
+
+# campo:valor  (o valor pode ser termo, curinga, frase entre aspas ou faixa "a..b")
+_FIELD_TOKEN_RE = re.compile(r"^([A-Za-z_]+):(.+)$", flags=re.DOTALL)
+_RANGE_SEP = ".."
+
+# Termo aproximado "palavra~k": palavras do vocabulário a até k edições (padrão 1, teto 2)
+_FUZZY_RE = re.compile(r'^([^\s"*~:]+)~(\d*)$')
+_FUZZY_DEFAULT_DISTANCE = 1
+FUZZY_MAX_DISTANCE = 2
+
+# Termo radicalizado "palavra~stem": todas as flexões/derivações com o mesmo radical
+_STEM_SUFFIX = "~stem"
+
+# Facetas: colunas com até N valores distintos usam um bitset por valor (popcount);
+# acima disso, conta-se percorrendo só as linhas encontradas.
+FACET_LIMIT = 20
+_FACET_BITSET_MAX = 64
+
+# Planejador de termos: acima de N postings por linha do livro, varrer o texto com a regex
+# sai mais barato do que unir as postings expandidas (ex.: *a*).
+_SCAN_COST_FACTOR = 8
+
+# Orçamento por requisição: relógio/linhas conferidos a cada N linhas varridas
+_BUDGET_CHECK_EVERY = 256
+_WORD_RE = re.compile(r"\w+")
+
+# Arquivos de livro aceitos, em ordem de prioridade
+_BOOK_EXTENSIONS = (".xlsx", ".md", ".txt")
+
+# Trechos de texto exibido (snippets e concordância): token = trecho entre espaços
+_KWIC_TOKEN_RE = re.compile(r"\S+")
+_WORD_RUN_RE = re.compile(r"(?<![\w*:])\w+(?![\w*:])")  # palavra fora de curinga/campo
+_DATE_BR_RE = re.compile(r"^(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{4})$")
+_DATE_ISO_RE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
+
 
 # =============================================================================================
 # 2) Modelos de dados
@@ -57,9 +151,118 @@ class SearchResult:
     metadata: Optional[Dict[str, Any]] = None
 
 
+class QueryCostExceeded(ValueError):
+    """Query cujo custo estimado (planejador) passa do teto configurado."""
+
+
+class IndexBuilding(RuntimeError):
+    """Índice/modelo do corpus ainda em construção (em segundo plano); tentar de novo em instantes."""
+
+
+class SearchBudget:
+    """
+    Orçamento de uma requisição de busca: prazo (segundos) e/ou linhas varridas pela regex.
+    Ao esgotar, as varreduras param e o livro corrente é cortado na linha onde parou
+    (`cutoff`), de modo que os resultados parciais continuam exatos.
+    """
+
+    def __init__(self, time_budget_s: Optional[float] = None, row_budget: Optional[int] = None):
+        self.deadline = time.monotonic() + time_budget_s if time_budget_s else None
+        self.rows_left = row_budget if row_budget else None
+        self.exhausted = False
+        self.cutoff: Optional[int] = None  # 1ª linha NÃO avaliada no livro corrente
+
+    def consume(self, rows: int) -> bool:
+        """Debita `rows` linhas; retorna False quando o orçamento acabou."""
+        if self.exhausted:
+            return False
+        if self.rows_left is not None:
+            self.rows_left -= rows
+            if self.rows_left < 0:
+                self.exhausted = True
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.exhausted = True
+        return not self.exhausted
+
+    def cut(self, row: int) -> None:
+        """Registra que as linhas a partir de `row` do livro corrente ficaram sem avaliação."""
+        self.cutoff = row if self.cutoff is None else min(self.cutoff, row)
+
+
+class QueryTrace:
+    """
+    Instrumentação de uma busca: tempos por fase da requisição, em ms (sempre; poucas
+    medidas por busca, usadas no slow-query log) e, com explain=1, tokens, RPN e o plano de
+    cada termo por livro (estratégia, palavras expandidas, linhas pré-filtradas pelas
+    postings, varridas pela regex e casadas). Sem trace (None), as funções por livro não
+    medem nada: só conferem `trace is not None`.
+    """
+
+    def __init__(self, engine: str = ""):
+        self.engine = engine
+        self.cost: Optional[int] = None  # custo estimado pelo planejador (check_query_cost)
+        self.query = ""
+        self.tokens: List[str] = []
+        self.rpn: List[str] = []
+        self.phases: Dict[str, float] = {}
+        self.books: Dict[str, Dict[str, Any]] = {}
+        self._book: Optional[Dict[str, Any]] = None
+        self._t0 = time.perf_counter()
+
+    def phase(self, name: str, t0: float) -> float:
+        """Soma em `name` o tempo desde `t0`; devolve o relógio atual (início da próxima fase)."""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - t0) * 1000.0
+        return now
+
+    def begin_book(self, book: str) -> Dict[str, Any]:
+        self._book = self.books.setdefault(book, {"terms": [], "ms": {}})
+        return self._book
+
+    def book_phase(self, name: str, t0: float) -> float:
+        now = time.perf_counter()
+        if self._book is not None:
+            ms = self._book["ms"]
+            ms[name] = ms.get(name, 0.0) + (now - t0) * 1000.0
+        return now
+
+    def term(self, entry: Dict[str, Any]) -> None:
+        if self._book is not None:
+            self._book["terms"].append(entry)
+
+    def phase_ms(self) -> Dict[str, float]:
+        """Fases da requisição (ms, arredondados), com "total" desde a criação do trace."""
+        phases = {**self.phases, "total": (time.perf_counter() - self._t0) * 1000.0}
+        return {k: round(v, 3) for k, v in phases.items()}
+
+    def as_dict(self) -> Dict[str, Any]:
+        def rounded(ms: Dict[str, float]) -> Dict[str, float]:
+            return {k: round(v, 3) for k, v in ms.items()}
+
+        books = {}
+        for book, info in self.books.items():
+            terms = info["terms"]
+            books[book] = {
+                **{k: v for k, v in info.items() if k not in ("terms", "ms")},
+                "prefiltered": sum(t.get("prefiltered") or 0 for t in terms),
+                "scanned": sum(t.get("scanned") or 0 for t in terms),
+                "ms": rounded(info["ms"]),
+                "terms": [{**t, "ms": round(t["ms"], 3)} for t in terms],
+            }
+        return {
+            "engine": self.engine,
+            "estimated_cost": self.cost,
+            "query": self.query,
+            "tokens": self.tokens,
+            "rpn": self.rpn,
+            "phases": self.phase_ms(),
+            "books": books,
+        }
+
+
 
 # =============================================================================================
-# 7) Public function (versão atualizada)
+# 3) Façade pública (`lexical_search_in_files` e variantes)
 # =============================================================================================
 def lexical_search_in_files(search_term: str, source: List[str]) -> List[Dict[str, Any]]:
     """
@@ -69,131 +272,521 @@ def lexical_search_in_files(search_term: str, source: List[str]) -> List[Dict[st
     - Senão, marca como ausente.
 
     Parâmetros:
-    - search_term: string de consulta com operadores (!, &, |), curingas (*) e frases entre aspas.
+    - search_term: string de consulta com operadores (!, &, |), curingas (*), frases entre aspas
+      termos por campo (title:holo*, author:"waldo vieira", number:100..200) e termos
+      aproximados (consciencia~1: até 1 edição; ~ sozinho vale 1, teto 2; projecao~stem:
+      mesmo radical, com grafias pré-reforma).
     - source: lista com nomes de "books" (sem extensão). Ex.: ["DAC","LO","EC"].
 
     Retorno:
     - Lista de dicionários compatível com o restante do pipeline (source, text, number, score, metadata).
     """
-    if not source:
-        raise ValueError("Parâmetro 'source' está vazio.")
+    return lexical_search_detailed(search_term, source)["results"]
+
+
+def lexical_search_detailed(
+    search_term: str,
+    source: List[str],
+    facets: Optional[List[str]] = None,
+    facet_limit: int = FACET_LIMIT,
+    time_budget_s: Optional[float] = LEXICAL_TIME_BUDGET_S,
+    row_budget: Optional[int] = LEXICAL_ROW_BUDGET,
+    max_cost: Optional[int] = LEXICAL_MAX_QUERY_COST,
+    snippet: int = 0,
+    fields: Optional[List[str]] = None,
+    engine: Optional[str] = None,
+    dedupe: bool = False,
+    refine: Optional[str] = None,
+    max_results: int = MAX_OVERALL_SEARCH_RESULTS,
+    explain: bool = False,
+    cache_result: bool = True,
+) -> Dict[str, Any]:
+    """
+    Igual a `lexical_search_in_files`, mas devolve também contagens exatas (sem o teto de
+    resultados), calculadas dos bitsets do índice sem materializar linhas.
+
+    Parâmetros extras:
+    - facets: colunas de metadados a agregar (ex.: ["area", "author", "theme"]).
+    - facet_limit: máximo de valores por coluna (os mais frequentes).
+    - time_budget_s / row_budget: orçamento da requisição; ao esgotar, devolve o que já foi
+      avaliado com truncated=True (0/None desliga).
+    - max_cost: teto do custo estimado pelo planejador; acima dele levanta QueryCostExceeded.
+    - snippet: > 0 devolve em `text` só um trecho de até N caracteres em torno das ocorrências
+      (texto integral via fetch_paragraph(source, number)).
+    - fields: campos de cada resultado (ver select_fields); None = esquema compacto.
+    - engine: "memory" (padrão de LEXICAL_ENGINE), "sqlite" ou "sharded"; o SQLite não calcula
+      facetas por coluna nem orçamento, e só o motor em memória dá sugestões ortográficas.
+    - dedupe: parágrafos de texto normalizado idêntico (content_hash) aparecem uma só vez, com
+      as outras ocorrências em "duplicates": [{"source", "number"}, ...]; os repetidos não
+      ocupam o teto de resultados. total/facetas continuam contando todas as linhas.
+    - refine: result_id de uma busca anterior; `search_term` é avaliado só nas linhas daquele
+      resultado (nos livros dele; `source` vazio = todos). Cada busca completa devolve um
+      novo "result_id" (None se o orçamento cortou a busca ou o motor não tem bitsets).
+    - max_results: teto de resultados (até MAX_EXPORT_RESULTS; exportação usa o máximo).
+    - explain: devolve em "explain" o plano e os tempos da busca (ver QueryTrace); o detalhe
+      por livro só sai do motor em memória (shards/SQLite: só tokens, RPN e fases).
+    - cache_result: False não guarda o conjunto no cache de result_id (result_id None); a
+      exportação usa isso para não tirar do LRU os resultados que o usuário ainda refina.
 
-    files_dir = Path(FILES_SEARCH_DIR)
+    Retorno:
+    - {"results": [...], "total": int, "facets": {"books": {"EC": 1204, …}, "area": {…}, …},
+       "truncated": bool, "skipped_books": [...], "suggestions": [...], "duplicates": int,
+       "result_id": str | None, "phases": {fase: ms}, "explain": dict | None}
+    """
+    # import tardio: engines e spelling importam este módulo
+    from modules.lexical_search.engines import MemoryEngine, dedupe_hits, get_lexical_engine
+    from modules.lexical_search.spelling import spelling_suggestions
+
+    trace = QueryTrace()  # fases da requisição; plano por livro só com explain (book_trace)
+    book_trace = trace if explain else None
+    t0 = time.perf_counter()
+    max_results = min(max(0, int(max_results)), MAX_EXPORT_RESULTS)
+    queries, within = [search_term], None
+    if refine:
+        cached = result_cache.get(refine)
+        if cached is None:
+            raise ValueError("result_id desconhecido ou expirado; refaça a busca.")
+        selected_files = []
+        for book, (_, mtime) in cached.books.items():
+            path = find_book_file(book)
+            if path is None or path.stat().st_mtime != mtime:
+                raise ValueError(f"O livro {book} mudou desde a busca; refaça a busca.")
+            if not source or book in source:
+                selected_files.append(path)
+        queries = cached.queries + [search_term]
+        within = {book: bits for book, (bits, _) in cached.books.items()}
+    else:
+        selected_files = resolve_book_files(search_term, source)
+    search_engine = get_lexical_engine(engine)
+    trace.engine = search_engine.name
+    if explain:
+        trace.query = _prepare_query(search_term)
+        trace.tokens = tokenize_query(trace.query)
+        trace.rpn = shunting_yard(trace.tokens)
+    t0 = trace.phase("resolve", t0)
+    if isinstance(search_engine, MemoryEngine):
+        # carga/indexação do disco fica na fase "load" (senão cairia no cálculo do custo)
+        for path in selected_files:
+            if book_trace is not None:
+                book_trace.begin_book(path.stem)
+            try:
+                load_book_index(path, book_trace)
+            except Exception:
+                pass  # o erro é logado (e o livro pulado) na busca
+        t0 = trace.phase("load", t0)
+    if within is None:  # refine: as varreduras já ficam limitadas às linhas do resultado
+        trace.cost = check_query_cost(search_term, selected_files, max_cost, engine=search_engine)
+        t0 = trace.phase("cost", t0)
+    budget = SearchBudget(time_budget_s, row_budget)
+    truncated = False
+    skipped_books: List[str] = []
 
     # -----------------------------------------------------------------------------
-    # Helper: retorna Path do arquivo por prioridade XLSX > MD > TXT
+    # Processamento dos arquivos selecionados
     # -----------------------------------------------------------------------------
-    def get_file_for_book(book: str) -> Optional[Path]:
-        candidates = [
-            files_dir / f"{book}.xlsx",
-            files_dir / f"{book}.md",
-            files_dir / f"{book}.txt",
-        ]
-
-        logger.info(f"[lexical_search_in_files] Livro: {book}")
-        #logger.info(f"[lexical_search_in_files] Candidates: {candidates}")
-        for c in candidates:
-            if c.exists():
-                return c
-        return None
+    results: List[SearchResult] = []
+    result_hits: List[Dict[str, Any]] = []  # hit de origem de cada resultado ("duplicates")
+    seen: Dict[int, Dict[str, Any]] = {}
+    facet_columns = [_FIELD_ALIASES.get(c, c) for c in (facets or [])]
+    book_counts: Dict[str, int] = {}
+    column_counts: Dict[str, Dict[str, int]] = {c: {} for c in facet_columns}
+
+    per_book = search_engine.search_books(
+        selected_files, search_term, max_results, snippet=snippet,
+        full_metadata=wants_full_fields(fields), facet_columns=facet_columns, budget=budget, dedupe=dedupe,
+        within=within, keep_bits=True, trace=book_trace,
+    )
+    t0 = trace.phase("search", t0)
+    for path in selected_files:
+        book = path.stem
+        found = per_book.get(book)
+        if found is None:  # erro (já logado) no livro
+            continue
+        if found.skipped:
+            skipped_books.append(book)
+            continue
+        truncated = truncated or found.truncated
+        book_counts[book] = found.count
+
+        for col, counts in found.facets.items():
+            for label, n in counts.items():
+                column_counts[col][label] = column_counts[col].get(label, 0) + n
+
+        # cada motor já deduplica os próprios livros; aqui só sobram repetições entre shards
+        for m in dedupe_hits(found.hits, book, seen) if dedupe else found.hits:
+            results.append(SearchResult(
+                source=book,
+                text=m.get("paragraph_text", ""),
+                number=m.get("paragraph_number"),
+                score=0.0,
+                metadata=m.get("metadata")
+            ))
+            result_hits.append(m)
 
     # -----------------------------------------------------------------------------
-    # Logging inicial
+    # Limita resultados globais e devolve no formato esperado (dict)
     # -----------------------------------------------------------------------------
-    logger.info("\n" + "─" * 80)
-    logger.info("📚 LEXICAL SEARCH REQUEST")
-    logger.info(f"🔍 Termo: {search_term}")
-    logger.info(f"📘 Livros solicitados: {', '.join(source)}")
+    results = clamp_max_results(results, max_results)
+    total = sum(book_counts.values())
+    items = [select_fields(asdict(r), fields) for r in results]
+    n_duplicates = 0
+    for item, hit in zip(items, result_hits):
+        if hit.get("duplicates"):
+            item["duplicates"] = hit["duplicates"]
+            n_duplicates += len(hit["duplicates"])
+
+    logger.info(f"[lexical_search_in_files] Total de resultados: {len(results)} (ocorrências: {total})")
+    if truncated or skipped_books:
+        logger.warning(
+            f"[lexical_search_in_files] Orçamento esgotado: resultados parciais "
+            f"(livros não avaliados: {', '.join(skipped_books) or '-'})"
+        )
 
-    selected_files: List[Path] = []
-    missing_books: List[str] = []
+    # conjunto completo (sem corte do orçamento) -> result_id para refinamentos
+    result_id = None
+    if cache_result and not truncated and not skipped_books and all(f.bits is not None for f in per_book.values()):
+        result_id = result_cache.put(queries, {
+            p.stem: (per_book[p.stem].bits, p.stat().st_mtime) for p in selected_files if p.stem in per_book
+        })
+
+    facet_out: Dict[str, Dict[str, int]] = {"books": book_counts}
+    for col, counts in column_counts.items():
+        top = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[: max(0, facet_limit)]
+        facet_out[col] = dict(top)
+    t0 = trace.phase("merge", t0)
+
+    # zero ocorrências: queries alternativas a partir do vocabulário (sem varrer parágrafos)
+    suggestions = (
+        spelling_suggestions(search_term, selected_files)
+        if isinstance(search_engine, MemoryEngine) and total == 0 and not truncated else []
+    )
+    trace.phase("suggestions", t0)
+
+    return {
+        "results": items,
+        "total": total,
+        "facets": facet_out,
+        "truncated": truncated or bool(skipped_books),
+        "skipped_books": skipped_books,
+        "suggestions": suggestions,
+        "duplicates": n_duplicates,
+        "result_id": result_id,
+        "phases": trace.phase_ms(),
+        "explain": trace.as_dict() if explain else None,
+    }
+
+
+def lexical_search_export(
+    result_id: Optional[str] = None,
+    search_term: str = "",
+    source: Optional[List[str]] = None,
+    max_results: int = MAX_EXPORT_RESULTS,
+    time_budget_s: Optional[float] = LEXICAL_EXPORT_TIME_BUDGET_S,
+    row_budget: Optional[int] = LEXICAL_EXPORT_ROW_BUDGET,
+) -> Dict[str, Any]:
+    """
+    Todos os hits de uma busca para exportação (/download), sem o teto de 100 resultados e
+    sem o navegador reenviar a lista. Com `result_id` ainda em cache, os hits saem dos bitsets
+    guardados (a query original só é reavaliada nas linhas do resultado); senão, a busca é
+    refeita a partir de `search_term`/`source`. Metadados completos (fields=["all"]).
+    Orçamento próprio da exportação (maior que o interativo); se ainda assim cortar,
+    "truncated"/"skipped_books" vêm no retorno. Nada entra no cache de result_id.
+
+    Retorno: o mesmo de `lexical_search_detailed`, mais "search_term" (cadeia de queries).
+    """
+    cached = result_cache.get(result_id) if result_id else None
+    if cached is not None:
+        try:
+            search = lexical_search_detailed(
+                cached.queries[0], source or [], fields=[FULL_FIELDS], refine=result_id, max_results=max_results,
+                time_budget_s=time_budget_s, row_budget=row_budget, cache_result=False,
+            )
+            queries = cached.queries
+            term = queries[0] if len(queries) == 1 else " & ".join(f"({q})" for q in queries)
+            return {**search, "search_term": term}
+        except ValueError as e:  # livro alterado / motor sem refine: refaz a busca abaixo
+            logger.info(f"[lexical_search_export] result_id {result_id} não reaproveitado: {e}")
+    if not search_term:
+        raise ValueError("result_id desconhecido ou expirado; envie search_term para refazer a busca.")
+    search = lexical_search_detailed(
+        search_term, source or [], fields=[FULL_FIELDS], max_results=max_results,
+        time_budget_s=time_budget_s, row_budget=row_budget, cache_result=False,
+    )
+    return {**search, "search_term": search_term}
 
-    for book in source:
-        file_path = get_file_for_book(book)
-        if file_path:
-            selected_files.append(file_path)
-        else:
-            missing_books.append(book)
 
-    if missing_books:
-        logger.warning(f"⚠️ Livros sem arquivo correspondente: {', '.join(missing_books)}")
+def check_query_cost(
+    search_term: str,
+    files: List[Path],
+    max_cost: Optional[int],
+    engine: Optional[LexicalEngine] = None,
+) -> int:
+    """
+    Soma o custo estimado da query nos livros e rejeita (QueryCostExceeded) se passar de
+    `max_cost`. Não executa a busca: só consulta o planejador/vocabulário de cada índice
+    (no motor `engine`; motores sem planejador devolvem custo 0).
+    """
+    from modules.lexical_search.engines import MemoryEngine
 
-    if not selected_files:
-        raise FileNotFoundError(
-            f"Nenhum arquivo correspondente encontrado para os livros: {', '.join(source)}"
+    cost = (engine or MemoryEngine()).query_cost(files, search_term)
+    raise_if_too_costly(cost, max_cost)
+    return cost
+
+
+def raise_if_too_costly(cost: int, max_cost: Optional[int]) -> None:
+    """QueryCostExceeded se `cost` passar de `max_cost` (0/None desliga o teto)."""
+    if max_cost and cost > max_cost:
+        raise QueryCostExceeded(
+            f"Consulta ampla demais (custo estimado {cost:,} > {max_cost:,}). "
+            "Restrinja curingas como *a* ou combine com outros termos."
         )
 
-    logger.info("CONS-AI lexical_utils.py")
-    logger.info(f"[lexical_search_in_files] Arquivos selecionados: {', '.join([p.name for p in selected_files])}")
 
-    # -----------------------------------------------------------------------------
-    # Processamento dos arquivos selecionados
-    # -----------------------------------------------------------------------------
-    results: List[SearchResult] = []
+def lexical_search_counts(
+    search_term: str,
+    source: List[str],
+    mode: str = "count",
+    time_budget_s: Optional[float] = LEXICAL_TIME_BUDGET_S,
+    row_budget: Optional[int] = LEXICAL_ROW_BUDGET,
+    max_cost: Optional[int] = LEXICAL_MAX_QUERY_COST,
+    engine: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Modos leves para widgets: só inteiros (mode="count") ou booleanos (mode="exists") por livro.
+    Nenhuma linha é materializada; a contagem sai direto do bitset resolvido pelas postings.
+    Orçamento, teto de custo e motor (`engine`) como em `lexical_search_detailed`.
 
-    for path in selected_files:
-        book = path.stem
-        ext = path.suffix.lower()
+    Retorno:
+    - count:  {"counts": {"EC": 1204, "DAC": 311}, "total": 1515, "truncated": False}
+    - exists: {"exists": {"EC": True, "DAC": False}, "any": True, "truncated": False}
+    """
+    if mode not in ("count", "exists"):
+        raise ValueError(f"Modo inválido: {mode!r} (use 'count' ou 'exists').")
 
-        try:
-            if ext == ".xlsx":
-                rows = read_excel_first_sheet(path)
-                matches = search_excel_rows(rows, search_term)
+    from modules.lexical_search.engines import get_lexical_engine
 
-                #logger.info(f"[lexical_search_in_files] search_term: {search_term}")
-                #logger.info(f"[lexical_search_in_files] matches: {matches}")
-                
+    selected_files = resolve_book_files(search_term, source)
+    search_engine = get_lexical_engine(engine)
+    check_query_cost(search_term, selected_files, max_cost, engine=search_engine)
+    budget = SearchBudget(time_budget_s, row_budget)
+    truncated = False
 
-                for m in matches:
-                    results.append(SearchResult(
-                        source=book,
+    per_book: Dict[str, Any] = {}
+    found_books = search_engine.search_books(selected_files, search_term, 0, budget=budget)
+    for path in selected_files:
+        found = found_books.get(path.stem)
+        if found is None:
+            continue
+        if found.skipped:
+            truncated = True
+            break
+        truncated = truncated or found.truncated
+        per_book[path.stem] = found.count if mode == "count" else found.count > 0
+
+    if mode == "count":
+        return {"counts": per_book, "total": sum(per_book.values()), "truncated": truncated}
+    return {"exists": per_book, "any": any(per_book.values()), "truncated": truncated}
+
+
+def lexical_search_batch(
+    queries: List[str],
+    source: List[str],
+    mode: str = "count",
+    max_results: int = MAX_OVERALL_SEARCH_RESULTS,
+    snippet: int = 0,
+    fields: Optional[List[str]] = None,
+    time_budget_s: Optional[float] = LEXICAL_TIME_BUDGET_S,
+    row_budget: Optional[int] = LEXICAL_ROW_BUDGET,
+    max_cost: Optional[int] = LEXICAL_MAX_QUERY_COST,
+    engine: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Várias queries sobre os mesmos livros numa única passada por livro: cada índice é obtido
+    uma vez e os termos repetidos entre queries (ex.: glossário) são resolvidos uma só vez.
+
+    Parâmetros:
+    - queries: lista de queries (mesma sintaxe de `lexical_search_in_files`).
+    - source: livros a consultar.
+    - mode: "count" | "exists" | "results".
+    - max_results: teto de resultados por query (modo "results").
+    - snippet: > 0 devolve trechos de até N caracteres em vez do parágrafo inteiro.
+    - fields: campos de cada resultado (ver select_fields); None = esquema compacto.
+    - time_budget_s / row_budget: um único orçamento para o lote inteiro; ao esgotar, a query
+      corrente fica truncada e as seguintes (e os livros seguintes) ficam sem avaliação.
+    - max_cost: teto da SOMA dos custos estimados das queries (conservador: termos repetidos
+      contam uma vez por query); acima dele levanta QueryCostExceeded antes de buscar.
+    - engine: motor como em `lexical_search_detailed`. Só o motor em memória compartilha os
+      termos entre as queries (cache de folhas sobre o BookIndex); nos demais o lote roda
+      query a query pelo `search_books` do motor, com o mesmo orçamento único.
+
+    Retorno (uma entrada por query, na ordem recebida), sempre com "truncated" e
+    "skipped_books" (livros não avaliados para aquela query):
+    - count:   {"query", "counts": {livro: n}, "total"}
+    - exists:  {"query", "exists": {livro: bool}, "any"}
+    - results: {"query", "results": [...], "count", "total", "facets": {"books": {...}}}
+    """
+    from modules.lexical_search.engines import MemoryEngine, get_lexical_engine
+
+    queries = [str(q or "").strip() for q in (queries or [])]
+    if not queries or not all(queries):
+        raise ValueError("Parâmetro 'queries' deve ser uma lista de termos não vazios.")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise ValueError(f"Máximo de {MAX_BATCH_QUERIES} queries por lote (recebidas: {len(queries)}).")
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Modo inválido: {mode!r} (use um de {', '.join(SEARCH_MODES)}).")
+
+    selected_files = resolve_book_files(f"[lote] {len(queries)} queries", source)
+    limit = min(max(0, int(max_results)), MAX_OVERALL_SEARCH_RESULTS)
+    search_engine = get_lexical_engine(engine)
+    raise_if_too_costly(sum(search_engine.query_cost(selected_files, q) for q in queries), max_cost)
+    budget = SearchBudget(time_budget_s, row_budget)
+
+    per_book: List[Dict[str, int]] = [{} for _ in queries]
+    results: List[List[SearchResult]] = [[] for _ in queries]
+    truncated = [False] * len(queries)
+    skipped: List[List[str]] = [[] for _ in queries]
+
+    if not isinstance(search_engine, MemoryEngine):
+        # sem BookIndex para compartilhar folhas: uma busca do motor por query
+        for k, q in enumerate(queries):
+            found_books = search_engine.search_books(
+                selected_files, q, limit if mode == "results" else 0, snippet=snippet,
+                full_metadata=wants_full_fields(fields), budget=budget,
+            )
+            for path in selected_files:
+                found = found_books.get(path.stem)
+                if found is None:  # erro (já logado) no livro
+                    continue
+                if found.skipped:
+                    skipped[k].append(path.stem)
+                    continue
+                truncated[k] = truncated[k] or found.truncated
+                per_book[k][path.stem] = found.count
+                for m in found.hits:
+                    results[k].append(SearchResult(
+                        source=path.stem,
                         text=m.get("paragraph_text", ""),
                         number=m.get("paragraph_number"),
                         score=0.0,
                         metadata=m.get("metadata")
                     ))
+    else:
+        for path in selected_files:
+            book = path.stem
+            try:
+                index = load_book_index(path)
+                leaf_cache: Dict[str, int] = {}
+                for k, q in enumerate(queries):
+                    # esgotado: as folhas em cache podem estar parciais, então nada mais é avaliado
+                    if budget.exhausted:
+                        skipped[k].append(book)
+                        continue
+                    bits = evaluate_query_bits(index, q, leaf_cache=leaf_cache, budget=budget)
+                    truncated[k] = truncated[k] or budget.cutoff is not None
+                    per_book[k][book] = bits.bit_count()
+                    if mode != "results":
+                        continue
+                    for m in materialize_hits(
+                        index, bits, q, limit - len(results[k]), snippet=snippet,
+                        full_metadata=wants_full_fields(fields),
+                    ):
+                        results[k].append(SearchResult(
+                            source=book,
+                            text=m.get("paragraph_text", ""),
+                            number=m.get("paragraph_number"),
+                            score=0.0,
+                            metadata=m.get("metadata")
+                        ))
+            except Exception as e:
+                logger.error(f"[lexical_search_batch] Erro ao processar {path.name}: {e}", exc_info=True)
+
+    if budget.exhausted:
+        logger.warning(
+            f"[lexical_search_batch] Orçamento esgotado: {sum(map(bool, skipped))} de {len(queries)} "
+            "queries com livros não avaliados"
+        )
 
-            elif ext in {".md", ".txt"}:
-                text = read_text_file(path)
-                matches = search_md_content(text, search_term)
-                for m in matches:
-                    results.append(SearchResult(
-                        source=book,
-                        text=m.get("paragraph_text", ""),
-                        number=m.get("paragraph_number"),
-                        score=0.0,
-                        metadata=None
-                    ))
+    out: List[Dict[str, Any]] = []
+    for k, q in enumerate(queries):
+        counts = per_book[k]
+        status = {"truncated": truncated[k] or bool(skipped[k]), "skipped_books": skipped[k]}
+        if mode == "count":
+            out.append({"query": q, "counts": counts, "total": sum(counts.values()), **status})
+        elif mode == "exists":
+            exists = {b: n > 0 for b, n in counts.items()}
+            out.append({"query": q, "exists": exists, "any": any(exists.values()), **status})
+        else:
+            out.append({
+                "query": q,
+                "results": [select_fields(asdict(r), fields) for r in results[k]],
+                "count": len(results[k]),
+                "total": sum(counts.values()),
+                "facets": {"books": counts},
+                **status,
+            })
+    return out
 
-        except Exception as e:
-            logger.error(f"[lexical_search_in_files] Erro ao processar {path.name}: {e}", exc_info=True)
+
+def resolve_book_files(search_term: str, source: List[str]) -> List[Path]:
+    """
+    Resolve os arquivos dos 'books' pedidos (prioridade XLSX > MD > TXT) e loga a requisição.
+    Levanta ValueError se `source` vier vazio e FileNotFoundError se nenhum livro existir.
+    """
+    if not source:
+        raise ValueError("Parâmetro 'source' está vazio.")
 
     # -----------------------------------------------------------------------------
-    # Limita resultados globais e devolve no formato esperado (dict)
+    # Logging inicial
     # -----------------------------------------------------------------------------
-    results = clamp_max_results(results, MAX_OVERALL_SEARCH_RESULTS)
-
-    logger.info(f"[lexical_search_in_files] Total de resultados: {len(results)}")
-
-    return [asdict(r) for r in results]
-
-
-
-
-
+    logger.info("\n" + "─" * 80)
+    logger.info("📚 LEXICAL SEARCH REQUEST")
+    logger.info(f"🔍 Termo: {search_term}")
+    logger.info(f"📘 Livros solicitados: {', '.join(source)}")
 
+    selected_files: List[Path] = []
+    missing_books: List[str] = []
 
+    for book in source:
+        logger.info(f"[lexical_search_in_files] Livro: {book}")
+        file_path = find_book_file(book)
+        if file_path:
+            selected_files.append(file_path)
+        else:
+            missing_books.append(book)
 
+    if missing_books:
+        logger.warning(f"⚠️ Livros sem arquivo correspondente: {', '.join(missing_books)}")
 
+    if not selected_files:
+        raise FileNotFoundError(
+            f"Nenhum arquivo correspondente encontrado para os livros: {', '.join(source)}"
+        )
 
+    logger.info("CONS-AI lexical_utils.py")
+    logger.info(f"[lexical_search_in_files] Arquivos selecionados: {', '.join([p.name for p in selected_files])}")
+    return selected_files
 
 
+def find_book_file(book: str) -> Optional[Path]:
+    """Arquivo do livro em FILES_SEARCH_DIR, por prioridade XLSX > MD > TXT (None se não houver)."""
+    files_dir = Path(FILES_SEARCH_DIR)
+    for ext in _BOOK_EXTENSIONS:
+        candidate = files_dir / f"{book}{ext}"
+        if candidate.exists():
+            return candidate
+    return None
 
 
+def available_books() -> List[str]:
+    """Nomes dos livros disponíveis em FILES_SEARCH_DIR (um por stem, ordem alfabética)."""
+    files_dir = Path(FILES_SEARCH_DIR)
+    if not files_dir.is_dir():
+        return []
+    return sorted({p.stem for p in files_dir.iterdir() if p.suffix.lower() in _BOOK_EXTENSIONS})
 
 
 # =============================================================================================
-# 3) Normalização & helpers gerais
+# 4) Normalização & helpers gerais
 # =============================================================================================
 def strip_accents(s: str) -> str:
     """Remove acentos mantendo apenas as letras base (NFD)."""
@@ -244,7 +837,7 @@ def strip_markdown_simple(s: str) -> str:
 
 
 # =============================================================================================
-# 4) I/O (leitura de arquivos)
+# 5) I/O (leitura de arquivos)
 # =============================================================================================
 def list_files(source_dir: str, extension: str) -> List[Path]:
     """
@@ -290,15 +883,21 @@ def read_excel_first_sheet(path: Path) -> List[Dict[str, str]]:
 
 
 # =============================================================================================
-# 5) Mini-motor booleano (tokenização, RPN, compilação + pré-filtro)
+# 6) Mini-motor booleano (tokenização, RPN, termos compilados)
 # =============================================================================================
 def tokenize_query(q: str) -> List[str]:
     """
     Tokeniza conectores, parênteses e termos.
     - Suporta frases entre aspas duplas como um único token (pode conter espaços).
+    - Campo seguido de frase vira um único token: author:"waldo vieira".
     - Ex.: pato & "donald duck" | !cadeira -> ['pato','&','\"donald duck\"','|','!','cadeira']
     """
-    tokens: List[str] = []
+    return [t for t, _, _ in tokenize_query_spans(q)]
+
+
+def tokenize_query_spans(q: str) -> List[Tuple[str, int, int]]:
+    """Tokens de `tokenize_query` com o trecho [início, fim) de cada um em `q`."""
+    tokens: List[Tuple[str, int, int]] = []
     i, n = 0, len(q)
     while i < n:
         c = q[i]
@@ -306,7 +905,7 @@ def tokenize_query(q: str) -> List[str]:
             i += 1
             continue
         if c in "()&|!":
-            tokens.append(c)
+            tokens.append((c, i, i + 1))
             i += 1
             continue
         if c == '"':
@@ -316,17 +915,28 @@ def tokenize_query(q: str) -> List[str]:
             while j < n and q[j] != '"':
                 buf.append(q[j])
                 j += 1
-            tokens.append('"' + "".join(buf) + '"')
-            i = j + 1 if j < n and q[j] == '"' else j
+            end = j + 1 if j < n and q[j] == '"' else j
+            tokens.append(('"' + "".join(buf) + '"', i, end))
+            i = end
             continue
         # termo simples até operador/espaço/aspas
         j = i
         while j < n and (q[j] not in '()&|!"') and (not q[j].isspace()):
             j += 1
-        tokens.append(q[i:j])
+        term = q[i:j]
+        if term.endswith(":") and j < n and q[j] == '"':
+            # campo com frase entre aspas: author:"waldo vieira"
+            k = j + 1
+            while k < n and q[k] != '"':
+                k += 1
+            end = k + 1 if k < n else k
+            tokens.append((term + q[j:k] + '"', i, end))
+            i = end
+            continue
+        tokens.append((term, i, j))
         i = j
     # remove tokens vazios (p. ex., se houver múltiplos espaços)
-    return [t for t in tokens if t]
+    return [t for t in tokens if t[0]]
 
 
 def shunting_yard(tokens: List[str]) -> List[str]:
@@ -370,6 +980,12 @@ def wildcard_pattern(term_raw: str) -> re.Pattern:
     prefix_bound = not term_raw.startswith("*")
     suffix_bound = not term_raw.endswith("*")
 
+    # ".*" nas pontas não altera o resultado de search(); removê-los evita backtracking
+    if not prefix_bound:
+        escaped = escaped.lstrip(".*") if escaped.replace(".*", "") else escaped
+    if not suffix_bound:
+        escaped = escaped.rstrip(".*") if escaped.replace(".*", "") else escaped
+
     pattern_str = ""
     if prefix_bound:
         pattern_str += r"\b"
@@ -380,6 +996,104 @@ def wildcard_pattern(term_raw: str) -> re.Pattern:
     return re.compile(pattern_str, flags=re.IGNORECASE)
 
 
+def _is_word_char(c: str) -> bool:
+    """Mesmo critério do \\w do `re` para str (alfanumérico Unicode ou '_')."""
+    return c.isalnum() or c == "_"
+
+
+class WildcardMatcher:
+    """
+    Casamento de curingas em tempo linear, equivalente a `wildcard_pattern(term).search`.
+
+    O termo vira segmentos literais separados por '*' (".*" na regex). Em cada linha
+    (o "." da regex não cruza '\\n'):
+      1) acha a ocorrência mais à esquerda do 1º segmento que respeite o limite de palavra;
+      2) encadeia str.find dos segmentos do meio (posição gulosa = a mais à esquerda);
+      3) procura o último segmento depois disso, respeitando o limite final.
+    Se a linha falhar, nenhuma outra escolha nela casa (a gulosa é ótima): pula para a próxima.
+    Cada caractere é examinado um número limitado de vezes -> sem backtracking.
+    """
+
+    __slots__ = ("term", "segments", "prefix_bound", "suffix_bound")
+
+    def __init__(self, segments: List[str], prefix_bound: bool, suffix_bound: bool, term: str = ""):
+        self.term = term
+        self.segments = segments
+        self.prefix_bound = prefix_bound
+        self.suffix_bound = suffix_bound
+
+    @property
+    def pattern(self) -> str:
+        """Representação legível (compatível com re.Pattern.pattern)."""
+        core = ".*".join(re.escape(seg) for seg in self.segments)
+        return (r"\b" if self.prefix_bound else "") + core + (r"\b" if self.suffix_bound else "")
+
+    def _find_bounded(self, s: str, seg: str, start: int, end: int, left: bool, right: bool) -> int:
+        """Primeira ocorrência de `seg` em s[start:end] respeitando os limites de palavra pedidos."""
+        while True:
+            p = s.find(seg, start, end)
+            if p < 0:
+                return -1
+            e = p + len(seg)
+            if left and p > 0 and _is_word_char(s[p - 1]):
+                start = p + 1
+                continue
+            if right and e < len(s) and _is_word_char(s[e]):
+                start = p + 1
+                continue
+            return p
+
+    def search(self, s: str) -> bool:
+        segs = self.segments
+        first, last = segs[0], segs[-1]
+        single = len(segs) == 1
+        n = len(s)
+        start = 0
+        while start <= n:
+            p = self._find_bounded(s, first, start, n, self.prefix_bound, single and self.suffix_bound)
+            if p < 0:
+                return False
+            if single:
+                return True
+            line_end = s.find("\n", p)
+            if line_end < 0:
+                line_end = n
+            pos = p + len(first)
+            ok = True
+            for seg in segs[1:-1]:
+                q = s.find(seg, pos, line_end)
+                if q < 0:
+                    ok = False
+                    break
+                pos = q + len(seg)
+            if ok and self._find_bounded(s, last, pos, line_end, False, self.suffix_bound) >= 0:
+                return True
+            start = line_end + 1
+        return False
+
+
+def compile_wildcard(term_raw: str) -> Union[WildcardMatcher, re.Pattern]:
+    """
+    Compila um termo com '*' no matcher linear (WildcardMatcher).
+    Casos degenerados (sem segmento literal, segmento com caractere não-palavra) ficam
+    com a regex de `wildcard_pattern`, que tem a semântica de referência.
+    """
+    term = normalize_for_match(term_raw)
+    prefix_bound = not term_raw.startswith("*")
+    suffix_bound = not term_raw.endswith("*")
+    parts = term.split("*")
+    segments = [seg for seg in parts if seg]
+    if not segments or not all(_WORD_RE.fullmatch(seg) for seg in segments):
+        return wildcard_pattern(term_raw)
+    # "\b.*X" / "X.*\b": X começa/termina em letra, então há sempre um limite de palavra
+    # ao lado dela -> o limite na ponta vazia não restringe nada
+    if not parts[0]:
+        prefix_bound = False
+    if not parts[-1]:
+        suffix_bound = False
+    return WildcardMatcher(segments, prefix_bound, suffix_bound, term=term_raw)
+
+
 def phrase_pattern(quoted_raw: str) -> re.Pattern:
     """
     Frase entre aspas: busca de substring literal (sem curingas), insensível a caso/acentos.
@@ -389,301 +1103,1091 @@ def phrase_pattern(quoted_raw: str) -> re.Pattern:
     return re.compile(re.escape(core_norm), flags=re.IGNORECASE)
 
 
-def compile_boolean_predicate(query: str) -> Callable[[str], bool]:
+def split_field_token(token: str) -> Optional[Tuple[str, str]]:
     """
-    Compila a query textual em um predicado (pnorm: str) -> bool, onde `pnorm`
-    é o parágrafo previamente normalizado (normalize_for_match).
-
-    Regras:
-      - "frase exata" -> substring literal normalizada
-      - termo com *   -> wildcard (.*)
-      - termo sem *   -> palavra inteira (\b...\b)
-      - conectores    -> !, &, |   (precedência ! > & > |)
-      - parênteses    -> opcionais
+    Separa um token "campo:valor" em (campo, valor), resolvendo apelidos (titulo -> title).
+    Retorna None se o token não for de campo conhecido (ex.: "http://…" continua termo comum).
     """
-    q = (query or "").strip()
-    if q and ('"' not in q) and ('*' not in q) and all(op not in q for op in ('&', '|', '!', '(', ')')) and any(ch.isspace() for ch in q):
-        q = '"' + q + '"'
-    if not q:
-        # query vazia nunca casa nada
-        return lambda _: False
+    m = _FIELD_TOKEN_RE.match(token or "")
+    if not m:
+        return None
+    name = m.group(1).lower()
+    name = _FIELD_ALIASES.get(name, name)
+    if name not in KNOWN_FIELDS:
+        return None
+    return name, m.group(2)
 
-    # validação leve (opcional, só loga)
-    if not balanced_parentheses(q):
-        logging.warning("[compile_boolean_predicate] Parênteses possivelmente desbalanceados.")
 
-    tokens = tokenize_query(q)
-    rpn = shunting_yard(tokens)
-
-    # cache de padrões por token; evita recompilar o mesmo regex
-    pat_cache: Dict[str, re.Pattern] = {}
-
-    def make_term_pred(token: str) -> Callable[[str], bool]:
-        """Constrói predicado para 'token' (termo simples ou frase entre aspas)."""
-        # frase entre aspas?
-        if len(token) >= 2 and token[0] == '"' and token[-1] == '"':
-            if token not in pat_cache:
-                pat_cache[token] = phrase_pattern(token)
-            pat = pat_cache[token]
-            return lambda s: bool(pat.search(s))
-
-        # termo comum: com/sem '*'
-        if token not in pat_cache:
-            if "*" in token:
-                pat_cache[token] = wildcard_pattern(token)
-            else:
-                norm = normalize_for_match(token)
-                # Default: prefix match at word start (behaves like implicit trailing '*')
-                # Example: 'casa' matches 'casa', 'casado', but not 'emcasacado'.
-                pat_cache[token] = re.compile(rf"\b{re.escape(norm)}\b", flags=re.IGNORECASE)
-        pat = pat_cache[token]
-        return lambda s: bool(pat.search(s))
-
-    # monta a função via RPN
-    stack: List[Callable[[str], bool]] = []
-    for t in rpn:
-        if t in _BOOL_OPS:
-            try:
-                if t == "!":
-                    a = stack.pop()
-                    stack.append(lambda s, a=a: not a(s))
-                elif t == "&":
-                    b, a = stack.pop(), stack.pop()
-                    stack.append(lambda s, a=a, b=b: a(s) and b(s))
-                elif t == "|":
-                    b, a = stack.pop(), stack.pop()
-                    stack.append(lambda s, a=a, b=b: a(s) or b(s))
-            except IndexError:
-                logging.error("[compile_boolean_predicate] Expressão booleana inválida (operandos insuficientes).")
-                # retorna predicado que falha sempre para não quebrar o fluxo
-                return lambda _: False
-        else:
-            stack.append(make_term_pred(t))
+def split_fuzzy_token(token: str) -> Optional[Tuple[str, int]]:
+    """
+    Reconhece o termo aproximado "palavra~k" e devolve (palavra normalizada, k).
+    Sem k vale 1; k acima de FUZZY_MAX_DISTANCE é limitado ao teto.
+    """
+    m = _FUZZY_RE.match(token)
+    if not m:
+        return None
+    word = normalize_for_match(m.group(1))
+    if not _WORD_RE.fullmatch(word):
+        return None
+    k = int(m.group(2)) if m.group(2) else _FUZZY_DEFAULT_DISTANCE
+    return word, min(k, FUZZY_MAX_DISTANCE)
 
-    if not stack:
-        # Query só com operadores ou vazia
-        return lambda _: False
 
-    return stack[-1]
+def split_stem_token(token: str) -> Optional[str]:
+    """Reconhece "palavra~stem" e devolve o radical da palavra normalizada."""
+    if not token.lower().endswith(_STEM_SUFFIX):
+        return None
+    word = normalize_for_match(token[: -len(_STEM_SUFFIX)])
+    if not _WORD_RE.fullmatch(word):
+        return None
+    return stem_pt(word)
 
 
-# ----------------------------- PRÉ-FILTRO BARATO POR SUBSTRING --------------------------------
-def _has_or(tokens: List[str]) -> bool:
-    """Retorna True se a expressão possui operador OR (|)."""
-    return "|" in tokens
+def is_approx_token(token: str) -> bool:
+    """Termo aproximado (~k ou ~stem): sem literal fixo, resolvido pelo vocabulário."""
+    return bool(split_fuzzy_token(token) or split_stem_token(token))
 
 
-def _extract_conj_literals_for_prefilter(tokens: List[str]) -> Tuple[List[str], List[str]]:
+def stem_query(query: str) -> str:
     """
-    Extrai literais para pré-filtro quando a expressão é CONJUNÇÃO pura (sem OR).
-    Retorna (must_have, must_not), já normalizados (sem acentos, minúsculos).
-
-    Regras:
-      - Inclui frases entre aspas e termos simples SEM '*'.
-      - Ignora termos com curinga.
-      - Considera negação unária '!' no token imediatamente seguinte.
+    Modo radicalizado da query inteira: cada palavra simples (fora de frases, curingas,
+    campos e termos aproximados) vira "palavra~stem".
     """
-    must_have: List[str] = []
-    must_not: List[str] = []
+    parts = (query or "").split('"')
+    for k in range(0, len(parts), 2):  # índices pares = fora das aspas
+        parts[k] = re.sub(r"(?<![\w*:~])\w+(?![\w*:~])", lambda m: m.group(0) + _STEM_SUFFIX, parts[k])
+    return '"'.join(parts)
 
-    negate_next = False
-    for t in tokens:
-        if t == "!":
-            negate_next = True
-            continue
-        if t in ("&", "(", ")"):
-            continue
-        if t == "|":
-            # segurança extra — não usar prefilter se houver OR
-            return [], []
 
-        # t é termo/frase; ignorar se tem curinga
-        is_phrase = (len(t) >= 2 and t[0] == '"' and t[-1] == '"')
-        core = t[1:-1] if is_phrase else t
+class StemMatcher:
+    """Casa se alguma palavra do texto tiver o radical dado (uso fora do índice, como FuzzyMatcher)."""
 
-        if "*" in core:
-            negate_next = False
-            continue
+    __slots__ = ("stem",)
 
-        lit = normalize_for_match(core)
+    def __init__(self, stem: str):
+        self.stem = stem
 
-        if negate_next:
-            must_not.append(lit)
-        else:
-            must_have.append(lit)
-        negate_next = False
+    @property
+    def pattern(self) -> str:
+        return f"{self.stem}{_STEM_SUFFIX}"
+
+    def search(self, s: str) -> bool:
+        return any(stem_pt(w) == self.stem for w in _WORD_RE.findall(s))
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Distância de edição com transposição de vizinhas (OSA), interrompida cedo:
+    devolve max_distance + 1 quando passa do limite.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return min(prev[-1], max_distance + 1)
+
+
+class FuzzyMatcher:
+    """
+    Casa se alguma palavra do texto estiver a até k edições do termo. Usado fora do índice
+    (predicado, valores de campo); no texto principal o termo é expandido pelo vocabulário.
+    """
+
+    __slots__ = ("word", "k")
 
-    return must_have, must_not
+    def __init__(self, word: str, k: int):
+        self.word = word
+        self.k = k
 
+    @property
+    def pattern(self) -> str:
+        return f"{self.word}~{self.k}"
 
-def compile_prefilter(query: str) -> Optional[Callable[[str], bool]]:
+    def search(self, s: str) -> bool:
+        return any(edit_distance(w, self.word, self.k) <= self.k for w in _WORD_RE.findall(s))
+
+
+def _prepare_query(query: str) -> str:
     """
-    Compila um pré-filtro barato (checks de substring) OU retorna None se não for seguro aplicar.
-    Só ativa para CONJUNÇÃO pura (sem OR) e sem curingas nos literais pré-filtrados.
+    Normaliza a query textual antes da tokenização.
+    Várias palavras sem operadores/aspas/curingas/campos/termos aproximados viram uma
+    frase exata implícita.
     """
     q = (query or "").strip()
-    if q and ('"' not in q) and ('*' not in q) and all(op not in q for op in ('&', '|', '!', '(', ')')) and any(ch.isspace() for ch in q):
+    if (
+        q
+        and ('"' not in q)
+        and ('*' not in q)
+        and not any(is_approx_token(t) for t in q.split())
+        and all(op not in q for op in ('&', '|', '!', '(', ')'))
+        and any(ch.isspace() for ch in q)
+        and not any(split_field_token(t) for t in q.split())
+    ):
         q = '"' + q + '"'
-    if not q:
-        return None
+    return q
 
-    tokens = tokenize_query(q)
-    if _has_or(tokens):
-        return None  # desliga quando há OR
 
-    must_have, must_not = _extract_conj_literals_for_prefilter(tokens)
-    if not must_have and not must_not:
-        return None
+@lru_cache(maxsize=1024)
+def term_pattern(token: str) -> Union[re.Pattern, WildcardMatcher, FuzzyMatcher, StemMatcher]:
+    """
+    Matcher (sobre texto normalizado) para um termo simples, curinga ou frase entre aspas.
+    Todos expõem `.search(texto)`.
+      - "frase exata" -> substring literal normalizada
+      - termo com *   -> wildcard linear (WildcardMatcher), sem backtracking
+      - termo~k       -> alguma palavra a até k edições (FuzzyMatcher)
+      - termo~stem    -> alguma palavra com o mesmo radical (StemMatcher)
+      - termo sem *   -> palavra inteira (\b...\b)
+    """
+    if len(token) >= 2 and token[0] == '"' and token[-1] == '"':
+        return phrase_pattern(token)
+    fuzzy = split_fuzzy_token(token)
+    if fuzzy:
+        return FuzzyMatcher(*fuzzy)
+    stem = split_stem_token(token)
+    if stem:
+        return StemMatcher(stem)
+    if "*" in token:
+        return compile_wildcard(token)
+    norm = normalize_for_match(token)
+    return re.compile(rf"\b{re.escape(norm)}\b", flags=re.IGNORECASE)
 
-    def _prefilter(pnorm: str) -> bool:
-        # todos obrigatórios presentes
-        for lit in must_have:
-            if lit not in pnorm:
-                return False
-        # nenhum proibido presente
-        for lit in must_not:
-            if lit in pnorm:
-                return False
-        return True
 
-    return _prefilter
+# =============================================================================================
+# 7) Buscas por tipo de conteúdo (MD/Excel)
+# =============================================================================================
+def split_md_paragraphs(content: str) -> List[str]:
+    """1 parágrafo = 1 linha não vazia."""
+    return [p.strip() for p in (content or "").split("\n") if p.strip()]
+
+
+def search_md_content(content: str, query: str) -> List[Dict[str, Any]]:
+    """
+    Aplica a busca booleana em conteúdo de texto/markdown.
+    Retorna dicionários simples para posterior montagem de SearchResult.
+    """
+    if not content or not query:
+        return []
+
+    rows = [{"text": p, "paragraph_number": i} for i, p in enumerate(split_md_paragraphs(content), start=1)]
+    index = build_book_index("", rows, has_metadata=False)
+    return [
+        {"paragraph_text": m["paragraph_text"], "paragraph_number": m["paragraph_number"]}
+        for m in search_book_index(index, query)
+    ]
+
+
+def search_excel_rows(rows: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    """
+    Aplica a busca booleana em linhas de Excel (primeira coluna textual é a "principal").
+    Termos por campo (title:, author:, …) consultam as demais colunas.
+    Retorna dicionários simples para posterior montagem de SearchResult.
+    """
+    if not rows or not query:
+        return []
+
+    # normaliza chaves (defensivo – já normalizamos em read_excel_first_sheet)
+    rows = [{k.lower(): v for k, v in row.items()} for row in rows]
+
+    # primeira coluna de dados (ordem preservada pelo pandas; se vazio, aborta)
+    if not rows[0]:
+        return []
+
+    index = build_book_index("", rows)
+    return search_book_index(index, query)
 
 
 # =============================================================================================
-# 6) Buscas por tipo de conteúdo (MD/Excel)
+# 8) Índice em memória (cache de corpus, índices por coluna, avaliação por bitsets)
+# ---------------------------------------------------------------------------------------------
+# Cada livro é lido uma única vez (por mtime) e mantido com o texto principal já normalizado.
+# Conjuntos de linhas são bitsets em `int` (bit i = linha i), o que deixa !, & e | baratos.
 # =============================================================================================
-def process_found_paragraph(paragraph: str, search_term: str) -> str:
+@dataclass
+class FieldIndex:
+    """Índice secundário de uma coluna de metadados."""
+    name: str
+    kind: str = "text"                                           # "text" | "number" | "date"
+    values: List[str] = field(default_factory=list)             # valor normalizado por linha
+    postings: Dict[str, List[int]] = field(default_factory=dict)  # palavra -> linhas
+    distinct: Dict[str, List[int]] = field(default_factory=dict)  # valor completo -> linhas
+    labels: Dict[str, str] = field(default_factory=dict)        # valor normalizado -> original
+    sorted_keys: List[float] = field(default_factory=list)      # faixas: chaves ordenadas
+    sorted_ids: List[int] = field(default_factory=list)         # faixas: linha de cada chave
+    value_bits: Optional[Dict[str, int]] = None                 # facetas: bitset por valor (lazy)
+
+
+@dataclass
+class BookIndex:
+    """Corpus de um livro em memória: linhas originais, texto normalizado e índices por coluna."""
+    book: str
+    rows: List[Dict[str, Any]]
+    texto_key: str
+    norm: List[str]
+    fields: Dict[str, FieldIndex]
+    has_metadata: bool = True
+    path: Optional[Path] = None
+    mtime: float = 0.0
+    postings: Dict[str, array] = field(default_factory=dict)  # palavra do texto -> linhas
+    vocab: List[str] = field(default_factory=list)            # palavras em ordem (prefixos)
+    fuzzy_cache: Dict[Tuple[str, int], List[str]] = field(default_factory=dict, repr=False)
+    stem_groups: Optional[Dict[str, List[str]]] = field(default=None, repr=False)  # radical -> palavras (lazy)
+    positions: Optional["PositionIndex"] = field(default=None, repr=False)          # concordância (lazy)
+    segments: Optional[SegmentIndex] = field(default=None, repr=False)              # linhas com '|'
+    hashes: array = field(default_factory=lambda: array("Q"), repr=False)           # content_hash por linha
+
+    @property
+    def size(self) -> int:
+        return len(self.rows)
+
+    @property
+    def universe(self) -> int:
+        """Bitset com todas as linhas do livro."""
+        return (1 << len(self.rows)) - 1
+
+
+_index_cache: Dict[str, BookIndex] = {}
+_index_cache_lock = threading.Lock()
+
+
+# ----------------------------------- BITSETS -------------------------------------------------
+def ids_to_bits(ids: Iterable[int], size: int) -> int:
+    """Converte índices de linha (0-based) em bitset."""
+    buf = bytearray((size + 7) // 8)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """Itera os índices dos bits ligados, em ordem crescente."""
+    if bits <= 0:
+        return
+    s = format(bits, "b")[::-1]  # s[i] == "1" <=> bit i ligado
+    i = s.find("1")
+    while i != -1:
+        yield i
+        i = s.find("1", i + 1)
+
+
+# ------------------------------ CONSTRUÇÃO DO ÍNDICE -----------------------------------------
+def parse_sortable(value: str, kind: str) -> Optional[float]:
+    """Converte valor de célula em chave ordenável ("date" -> AAAAMMDD, "number" -> float)."""
+    v = (value or "").strip()
+    if not v:
+        return None
+    if kind == "date":
+        m = _DATE_BR_RE.match(v)
+        if m:
+            return float(int(m.group(3)) * 10000 + int(m.group(2)) * 100 + int(m.group(1)))
+        m = _DATE_ISO_RE.match(v)
+        if m:
+            return float(int(m.group(1)) * 10000 + int(m.group(2)) * 100 + int(m.group(3)))
+        return None
+    try:
+        return float(v.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _detect_kind(raw_values: List[str]) -> str:
+    """Tipo da coluna: "date" / "number" se TODOS os valores não vazios forem conversíveis."""
+    filled = [v for v in raw_values if v.strip()]
+    if not filled:
+        return "text"
+    for kind in ("date", "number"):
+        if all(parse_sortable(v, kind) is not None for v in filled):
+            return kind
+    return "text"
+
+
+def build_field_index(name: str, raw_values: List[str]) -> FieldIndex:
+    """Monta o índice secundário de uma coluna (palavras, valores distintos e faixa ordenável)."""
+    fidx = FieldIndex(name=name, kind=_detect_kind(raw_values))
+    for i, raw in enumerate(raw_values):
+        norm = normalize_for_match(strip_markdown_simple(raw)).strip()
+        fidx.values.append(norm)
+        if not norm:
+            continue
+        fidx.distinct.setdefault(norm, []).append(i)
+        fidx.labels.setdefault(norm, raw.strip())
+        for tok in set(_WORD_RE.findall(norm)):
+            fidx.postings.setdefault(tok, []).append(i)
+
+    if fidx.kind != "text":
+        keyed = [(parse_sortable(v, fidx.kind), i) for i, v in enumerate(raw_values)]
+        keyed = sorted((k, i) for k, i in keyed if k is not None)
+        fidx.sorted_keys = [k for k, _ in keyed]
+        fidx.sorted_ids = [i for _, i in keyed]
+    return fidx
+
+
+def content_hash(norm: str) -> int:
+    """
+    Hash estável (64 bits, igual em todos os processos) do texto normalizado de um parágrafo:
+    parágrafos idênticos a menos de acentos, caixa, pontuação e markdown têm o mesmo hash.
     """
-    Reestrutura parágrafos que usam '|' como agregador:
-      - Se houver 2+ ocorrências de '|': mantém o primeiro "cabeçalho" e
-        adiciona apenas subtrechos que contenham o termo de busca (normalizado).
-      - Caso contrário, retorna o parágrafo original.
+    return int.from_bytes(hashlib.blake2b(" ".join(norm.split()).encode("utf-8"), digest_size=8).digest(), "little")
+
 
-    Obs.: mantém acentuação/caixa do texto original (apenas a checagem é normalizada).
+def build_book_index(
+    book: str,
+    rows: List[Dict[str, Any]],
+    has_metadata: bool = True,
+    path: Optional[Path] = None,
+    mtime: float = 0.0,
+    split_segments: bool = True,
+) -> BookIndex:
     """
-    if not search_term:
-        return paragraph
+    Monta o índice de um livro a partir das linhas já lidas.
+    - Primeira coluna = texto principal (normalizado uma única vez aqui).
+    - Demais colunas (exceto paragraph_number) ganham índice secundário.
+    - Linhas agregadoras ("cabeçalho | item | item") ganham também um índice por item.
+    """
+    # import tardio: segments importa este módulo
+    from modules.lexical_search.segments import build_segment_index
+
+    texto_key = next(iter(rows[0].keys())) if rows and rows[0] else "text"
+    norm = [normalize_for_match(strip_markdown_simple(str(r.get(texto_key, "")))) for r in rows]
+
+    # índice invertido do texto principal: palavra -> linhas (crescente, sem repetição)
+    postings: Dict[str, array] = {}
+    for i, text in enumerate(norm):
+        for tok in set(_WORD_RE.findall(text)):
+            ids = postings.get(tok)
+            if ids is None:
+                ids = postings[tok] = array("I")
+            ids.append(i)
+
+    fields: Dict[str, FieldIndex] = {}
+    if has_metadata and rows:
+        for col in rows[0].keys():
+            if col in (texto_key, "paragraph_number"):
+                continue
+            fields[col] = build_field_index(col, [str(r.get(col, "") or "") for r in rows])
+
+    return BookIndex(
+        book=book,
+        rows=rows,
+        texto_key=texto_key,
+        norm=norm,
+        fields=fields,
+        has_metadata=has_metadata,
+        path=path,
+        mtime=mtime,
+        postings=postings,
+        vocab=sorted(postings),
+        segments=build_segment_index(book, rows, texto_key, has_metadata) if split_segments else None,
+        hashes=array("Q", map(content_hash, norm)),
+    )
 
-    needle = normalize_for_match(search_term)
 
-    if paragraph.count("|") >= 2:
-        parts = paragraph.split("|")
-        if not parts:
-            return paragraph
+def read_book_rows(path: Path) -> Tuple[List[Dict[str, Any]], bool]:
+    """Linhas do livro (XLSX: colunas da planilha; MD/TXT: 1 parágrafo por linha) e se há metadados."""
+    if path.suffix.lower() == ".xlsx":
+        return read_excel_first_sheet(path), True
+    paragraphs = split_md_paragraphs(read_text_file(path))
+    return [{"text": p, "paragraph_number": i} for i, p in enumerate(paragraphs, start=1)], False
 
-        rebuilt: List[str] = [parts[0].strip()]
-        for sub in parts[1:]:
-            s = sub.strip()
-            if needle in normalize_for_match(s):
-                rebuilt.append(s)
 
-        # se nenhum subtrecho relevante foi encontrado, descarta o parágrafo
-        if len(rebuilt) == 1:
-            return ""
+def load_book_index(path: Path, trace: Optional[QueryTrace] = None) -> BookIndex:
+    """
+    Devolve o índice do arquivo (XLSX ou MD/TXT), lendo do disco apenas na primeira vez
+    ou quando o arquivo for modificado (mtime). Com `trace`, uma carga do disco registra
+    no livro corrente os tempos de leitura ("read") e de normalização/indexação ("build").
+    """
+    key = str(path.resolve())
+    mtime = path.stat().st_mtime
+    with _index_cache_lock:
+        cached = _index_cache.get(key)
+        if cached is not None and cached.mtime == mtime:
+            return cached
+
+        t0 = time.perf_counter() if trace is not None else 0.0
+        rows, has_metadata = read_book_rows(path)
+        if trace is not None:
+            t0 = trace.book_phase("read", t0)
+        index = build_book_index(path.stem, rows, has_metadata=has_metadata, path=path, mtime=mtime)
+        if trace is not None:
+            trace.book_phase("build", t0)
+
+        _index_cache[key] = index
+        logger.info(f"[load_book_index] {path.name}: {index.size} linhas, campos={list(index.fields)}")
+        return index
+
+
+def clear_index_cache() -> None:
+    """Descarta todos os índices em memória (próxima busca relê os arquivos)."""
+    with _index_cache_lock:
+        _index_cache.clear()
+
+
+# ------------------------------ AVALIAÇÃO POR BITSETS ----------------------------------------
+def _range_bits(fidx: FieldIndex, raw_value: str, size: int) -> int:
+    """Faixa fechada "a..b" (extremos opcionais) sobre coluna numérica ou de data."""
+    if fidx.kind == "text":
+        return 0
+    lo_raw, _, hi_raw = raw_value.partition(_RANGE_SEP)
+    lo_raw, hi_raw = lo_raw.strip(), hi_raw.strip()
+
+    def bound(raw: str, upper: bool) -> Optional[float]:
+        if fidx.kind == "date" and re.fullmatch(r"\d{4}", raw):
+            # só o ano: 2010..2015 -> 01/01/2010 .. 31/12/2015
+            return float(int(raw) * 10000 + (1231 if upper else 101))
+        return parse_sortable(raw, fidx.kind)
+
+    lo = bound(lo_raw, upper=False) if lo_raw else None
+    hi = bound(hi_raw, upper=True) if hi_raw else None
+    if (lo_raw and lo is None) or (hi_raw and hi is None):
+        logging.warning(f"[_range_bits] Faixa inválida para '{fidx.name}': {raw_value}")
+        return 0
+
+    start = bisect_left(fidx.sorted_keys, lo) if lo is not None else 0
+    end = bisect_right(fidx.sorted_keys, hi) if hi is not None else len(fidx.sorted_keys)
+    return ids_to_bits(fidx.sorted_ids[start:end], size)
+
+
+def field_bits(index: BookIndex, name: str, raw_value: str) -> int:
+    """
+    Bitset das linhas cujo campo `name` casa com `raw_value`, usando apenas o índice da coluna.
+      - faixa "a..b"           -> busca binária nas chaves ordenadas
+      - palavra simples        -> lookup direto nas postings da coluna
+      - curinga / frase / ~k   -> matcher sobre os valores DISTINTOS da coluna
+    """
+    fidx = index.fields.get(name)
+    if fidx is None:
+        return 0  # campo inexistente neste livro
 
-        result = " ".join(rebuilt)
-        return result.replace("|", "").replace("\\", "").replace("\n", "").strip()
+    is_phrase = len(raw_value) >= 2 and raw_value[0] == '"' and raw_value[-1] == '"'
+    if not is_phrase and _RANGE_SEP in raw_value:
+        return _range_bits(fidx, raw_value, index.size)
 
-    return paragraph
+    if not is_phrase and "*" not in raw_value and not is_approx_token(raw_value):
+        norm = normalize_for_match(raw_value)
+        if _WORD_RE.fullmatch(norm or ""):
+            return ids_to_bits(fidx.postings.get(norm, ()), index.size)
 
+    pat = term_pattern(raw_value)
+    ids = (i for value, rows in fidx.distinct.items() if pat.search(value) for i in rows)
+    return ids_to_bits(ids, index.size)
 
-def search_md_content(content: str, query: str) -> List[Dict[str, Any]]:
+
+@dataclass
+class TermPlan:
+    """Plano de resolução de um termo/frase sobre o texto principal."""
+    token: str
+    strategy: str                                               # "postings" | "verify" | "scan"
+    groups: List[List[str]] = field(default_factory=list)      # E de OUs de palavras do vocabulário
+    cost: int = 0                                               # postings a ler (ou linhas, se "scan")
+
+
+def expand_vocab(index: BookIndex, seg: str, at_start: bool, at_end: bool) -> List[str]:
     """
-    Aplica a busca booleana em conteúdo de texto/markdown.
-    Retorna dicionários simples para posterior montagem de SearchResult.
+    Palavras do vocabulário que contêm o segmento `seg`:
+      - at_start & at_end -> a própria palavra
+      - at_start          -> começam com seg (busca binária no vocabulário ordenado)
+      - at_end            -> terminam com seg
+      - nenhum            -> contêm seg em qualquer posição
     """
-    if not content or not query:
-        return []
+    if at_start and at_end:
+        return [seg] if seg in index.postings else []
+    if at_start:
+        lo = bisect_left(index.vocab, seg)
+        hi = bisect_left(index.vocab, seg + "\U0010ffff")
+        return index.vocab[lo:hi]
+    if at_end:
+        return [t for t in index.vocab if t.endswith(seg)]
+    return [t for t in index.vocab if seg in t]
+
+
+def fuzzy_expand(vocab: List[str], word: str, k: int) -> List[str]:
+    """
+    Palavras de `vocab` (ordenado) a até `k` edições de `word` (inserção, remoção, troca e
+    transposição de vizinhas), sem comparar palavra a palavra.
 
-    # 1 parágrafo = 1 linha não vazia
-    paragraphs: List[str] = [p.strip() for p in content.split("\n") if p.strip()]
+    Percorre o vocabulário como um trie: a linha da programação dinâmica é o estado do autômato
+    de Levenshtein após o prefixo corrente, e palavras vizinhas reaproveitam as linhas do
+    prefixo em comum. Quando nenhuma célula da linha fica <= k, o prefixo está morto e todas
+    as palavras que começam com ele são puladas de uma vez (busca binária).
+    """
+    out: List[str] = []
+    n = len(word)
+    rows: List[List[int]] = [list(range(n + 1))]  # rows[m] = estado após prev[:m]
+    prev = ""
+    i = 0
+    while i < len(vocab):
+        term = vocab[i]
+        c = 0
+        limit = min(len(term), len(prev), len(rows) - 1)
+        while c < limit and term[c] == prev[c]:
+            c += 1
+        del rows[c + 1:]
+
+        dead = False
+        for j in range(c, len(term)):
+            ch = term[j]
+            r = rows[-1]
+            r2 = rows[-2] if j > 0 else None
+            new = [r[0] + 1]
+            for x in range(1, n + 1):
+                v = min(r[x] + 1, new[x - 1] + 1, r[x - 1] + (word[x - 1] != ch))
+                if r2 is not None and x > 1 and word[x - 1] == term[j - 1] and word[x - 2] == ch:
+                    v = min(v, r2[x - 2] + 1)
+                new.append(v)
+            rows.append(new)
+            if min(new) > k:
+                dead_prefix = term[: j + 1]
+                i = bisect_left(vocab, dead_prefix + "\U0010ffff", i)
+                prev = dead_prefix
+                dead = True
+                break
+        if dead:
+            continue
+        if rows[-1][n] <= k:
+            out.append(term)
+        prev = term
+        i += 1
+    return out
 
-    pred = compile_boolean_predicate(query)
-    pre = compile_prefilter(query)  # pré-filtro barato (pode ser None)
 
-    results: List[Dict[str, Any]] = []
+def fuzzy_vocab(index: BookIndex, word: str, k: int) -> List[str]:
+    """Expansão de "word~k" no vocabulário do livro (em cache no próprio índice)."""
+    key = (word, k)
+    found = index.fuzzy_cache.get(key)
+    if found is None:
+        found = index.fuzzy_cache[key] = fuzzy_expand(index.vocab, word, k)
+    return found
+
 
-    for idx, paragraph in enumerate(paragraphs, start=1):
-        # remove marcações markdown antes de normalizar
-        cleaned = strip_markdown_simple(paragraph)
-        pnorm = normalize_for_match(cleaned)
+def stem_vocab(index: BookIndex, stem: str) -> List[str]:
+    """
+    Palavras do livro com o radical `stem`. O campo radicalizado (radical -> palavras) é
+    montado na primeira consulta ~stem ao livro e fica no próprio índice.
+    """
+    if index.stem_groups is None:
+        groups: Dict[str, List[str]] = {}
+        for word in index.vocab:
+            groups.setdefault(stem_pt(word), []).append(word)
+        index.stem_groups = groups
+    return index.stem_groups.get(stem, [])
 
 
-        # 1) pré-filtro barato (quando aplicável)
-        if pre is not None and not pre(pnorm):
+def plan_text_term(index: BookIndex, token: str) -> TermPlan:
+    """
+    Escolhe como resolver o termo:
+      - "postings": o vocabulário resolve o termo exatamente (palavra, curinga de 1 segmento,
+                    frase de 1 palavra, termo~k, termo~stem) -> só união/interseção de postings
+      - "verify":   postings dão candidatos (condição necessária) e a regex confirma só esses
+      - "scan":     regex em todas as linhas (termo degenerado ou expansão mais cara que varrer)
+    """
+    fuzzy = split_fuzzy_token(token)
+    stem = split_stem_token(token) if not fuzzy else None
+    if fuzzy or stem:
+        group = fuzzy_vocab(index, *fuzzy) if fuzzy else stem_vocab(index, stem)
+        cost = sum(len(index.postings[t]) for t in group)
+        return TermPlan(token=token, strategy="postings", groups=[group], cost=cost)
+
+    is_phrase = len(token) >= 2 and token[0] == '"' and token[-1] == '"'
+    specs: List[Tuple[str, bool, bool]] = []  # (segmento, início de palavra, fim de palavra)
+    exact = False
+
+    if is_phrase:
+        words = normalize_for_match(token[1:-1]).split()
+        if len(words) == 1:
+            specs, exact = [(words[0], False, False)], True
+        elif words:
+            specs = [(words[0], False, True)]
+            specs += [(w, True, True) for w in words[1:-1]]
+            specs += [(words[-1], True, False)]
+    elif "*" in token:
+        segs = normalize_for_match(token).split("*")
+        prefix_bound = not token.startswith("*")
+        suffix_bound = not token.endswith("*")
+        specs = [
+            (seg, k == 0 and prefix_bound, k == len(segs) - 1 and suffix_bound)
+            for k, seg in enumerate(segs) if seg
+        ]
+        exact = len(specs) == 1
+    else:
+        norm = normalize_for_match(token)
+        specs, exact = [(norm, True, True)], True
+
+    if not specs or not all(_WORD_RE.fullmatch(seg) for seg, _, _ in specs):
+        return TermPlan(token=token, strategy="scan", cost=index.size)
+
+    groups = [expand_vocab(index, seg, a, b) for seg, a, b in specs]
+    cost = sum(len(index.postings[t]) for g in groups for t in g)
+    if len(groups) > 1 or len(groups[0]) > 1:
+        if cost > _SCAN_COST_FACTOR * index.size:
+            return TermPlan(token=token, strategy="scan", groups=groups, cost=index.size)
+    return TermPlan(token=token, strategy="postings" if exact else "verify", groups=groups, cost=cost)
+
+
+def estimate_query_cost(index: BookIndex, query: str) -> int:
+    """
+    Custo estimado da query neste livro, em postings lidas (1) e linhas varridas pela regex
+    (_SCAN_COST_FACTOR cada). Termos por campo usam só índices pequenos e não entram na conta.
+    """
+    cost = 0
+    for t in query_leaves(query):
+        if split_field_token(t):
             continue
+        plan = plan_text_term(index, t)
+        if plan.strategy == "scan":
+            cost += index.size * _SCAN_COST_FACTOR
+        elif plan.strategy == "verify":
+            smallest = min(sum(len(index.postings[w]) for w in g) for g in plan.groups)
+            cost += plan.cost + smallest * _SCAN_COST_FACTOR
+        else:
+            cost += plan.cost
+    return cost
+
+
+def _budgeted(ids: Iterable[int], budget: Optional[SearchBudget]) -> Iterator[int]:
+    """Repassa os ids enquanto houver orçamento; ao esgotar, corta o livro no id corrente."""
+    if budget is None:
+        yield from ids
+        return
+    for n, i in enumerate(ids):
+        if n % _BUDGET_CHECK_EVERY == 0 and not budget.consume(_BUDGET_CHECK_EVERY):
+            budget.cut(i)
+            return
+        yield i
+
+
+def text_term_bits(
+    index: BookIndex,
+    token: str,
+    budget: Optional[SearchBudget] = None,
+    within: Optional[int] = None,
+    trace: Optional[QueryTrace] = None,
+) -> int:
+    """
+    Bitset das linhas cujo texto principal (já normalizado) casa com o termo/frase.
+    Com `within`, a regex só varre essas linhas (o resultado fora delas não é confiável).
+    Com `trace`, registra o plano e as linhas pré-filtradas/varridas/casadas do termo.
+    """
+    t0 = time.perf_counter() if trace is not None else 0.0
+    plan = plan_text_term(index, token)
+    norm = index.norm
+    scanned: Optional[int] = None  # linhas entregues à regex (None = só postings)
+
+    if plan.strategy == "scan":
+        pat = term_pattern(token)
+        rows = range(index.size) if within is None else iter_bits(within)
+        scanned = index.universe if within is None else within
+        bits = ids_to_bits((i for i in _budgeted(rows, budget) if pat.search(norm[i])), index.size)
+    else:
+        bits = -1  # interseção dos grupos (cada grupo = união das postings das palavras)
+        for group in plan.groups:
+            bits &= ids_to_bits(chain.from_iterable(index.postings[t] for t in group), index.size)
+            if not bits:
+                break
+
+        if plan.strategy == "verify" and bits:
+            pat = term_pattern(token)
+            if within is not None:
+                bits &= within
+            scanned = bits
+            bits = ids_to_bits((i for i in _budgeted(iter_bits(bits), budget) if pat.search(norm[i])), index.size)
+
+    if trace is not None:
+        # linhas varridas = candidatas antes do corte do orçamento (sem contador no laço)
+        if scanned is not None and budget is not None and budget.cutoff is not None:
+            scanned &= (1 << budget.cutoff) - 1
+        trace.term({
+            "token": token,
+            "strategy": plan.strategy,
+            "words": sum(len(g) for g in plan.groups),
+            "cost": plan.cost,
+            "prefiltered": scanned.bit_count() if scanned is not None and plan.strategy == "verify" else None,
+            "scanned": scanned.bit_count() if scanned is not None else 0,
+            "matched": bits.bit_count(),
+            "ms": (time.perf_counter() - t0) * 1000.0,
+        })
+    return bits
+
+
+def query_leaves(query: str) -> List[str]:
+    """Termos/frases/campos da query (sem operadores nem parênteses)."""
+    return [t for t in tokenize_query(_prepare_query(query)) if t not in _BOOL_OPS and t not in "()"]
+
+
+def evaluate_query_bits(
+    index: BookIndex,
+    query: str,
+    leaf_cache: Optional[Dict[str, int]] = None,
+    budget: Optional[SearchBudget] = None,
+    within: Optional[int] = None,
+    trace: Optional[QueryTrace] = None,
+) -> int:
+    """
+    Avalia a query inteira sobre o índice e devolve o bitset de linhas que casam.
+    Gramática de `tokenize_query`/`shunting_yard` (!, &, |, parênteses), com termos por campo.
+    `leaf_cache` (token -> bitset) permite reaproveitar termos entre várias queries do mesmo livro.
+    Com `budget`, se o orçamento acabar no meio do livro, só as linhas antes do corte são
+    devolvidas (budget.cutoff indica onde o livro foi truncado).
+    Com `within` (bitset), só essas linhas são avaliadas ("buscar nos resultados"); como os
+    operadores são linha a linha, basta restringir as varreduras e o resultado final.
+    Não combinar com `leaf_cache` (as folhas varridas ficam parciais).
+    `trace` (QueryTrace) recebe o plano de cada termo (ver text_term_bits).
+    """
+    q = _prepare_query(query)
+    if not q:
+        return 0
+    if budget is not None:
+        budget.cutoff = None
 
-        # 2) predicado completo (regex/curingas/aspas/conectores)
-        if pred(pnorm):
-            processed = process_found_paragraph(paragraph, query)
-            if processed and processed.strip():
-                results.append({"paragraph_text": processed, "paragraph_number": idx})
-        if len(results) >= MAX_OVERALL_SEARCH_RESULTS:
-            break
+    if not balanced_parentheses(q):
+        logging.warning("[evaluate_query_bits] Parênteses possivelmente desbalanceados.")
 
-    return results
+    tokens = tokenize_query(q)
+    result = _evaluate_rpn(index, shunting_yard(tokens), leaf_cache, budget, within, trace)
+
+    # linhas agregadoras casam se algum item casa (mesma semântica booleana, por item)
+    if index.segments is not None and _is_text_scoped(query):
+        # import tardio: segments importa este módulo
+        from modules.lexical_search.segments import merge_segment_rows
+        result = merge_segment_rows(index, query, tokens, result, within, budget, trace)
+
+    if budget is not None and budget.cutoff is not None:
+        result &= (1 << budget.cutoff) - 1
+    if within is not None:
+        result &= within
+    return result
+
+
+def _evaluate_rpn(
+    index: BookIndex,
+    rpn: List[str],
+    leaf_cache: Optional[Dict[str, int]] = None,
+    budget: Optional[SearchBudget] = None,
+    within: Optional[int] = None,
+    trace: Optional[QueryTrace] = None,
+) -> int:
+    """Avalia a RPN da query com bitsets sobre as linhas do índice."""
+    universe = index.universe
+
+    stack: List[int] = []
+    for t in rpn:
+        if t in _BOOL_OPS:
+            try:
+                if t == "!":
+                    stack.append(universe & ~stack.pop())
+                elif t == "&":
+                    b, a = stack.pop(), stack.pop()
+                    stack.append(a & b)
+                elif t == "|":
+                    b, a = stack.pop(), stack.pop()
+                    stack.append(a | b)
+            except IndexError:
+                logging.error("[evaluate_query_bits] Expressão booleana inválida (operandos insuficientes).")
+                return 0
+        else:
+            if leaf_cache is not None and t in leaf_cache:
+                stack.append(leaf_cache[t])
+                continue
+            scoped = split_field_token(t)
+            if scoped:
+                t0 = time.perf_counter() if trace is not None else 0.0
+                bits = field_bits(index, *scoped)
+                if trace is not None:
+                    trace.term({
+                        "token": t, "strategy": "field", "words": 0, "cost": 0, "prefiltered": None,
+                        "scanned": 0, "matched": bits.bit_count(), "ms": (time.perf_counter() - t0) * 1000.0,
+                    })
+            else:
+                bits = text_term_bits(index, t, budget, within, trace)
+            if leaf_cache is not None:
+                leaf_cache[t] = bits
+            stack.append(bits)
 
+    return stack[-1] if stack else 0
 
-def search_excel_rows(rows: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+
+def _is_text_scoped(query: str) -> bool:
+    """Query com algum termo do texto principal (só termos por campo não filtram subtrechos)."""
+    return any(not split_field_token(t) for t in query_leaves(query))
+
+
+def search_book_index(
+    index: BookIndex, query: str, limit: int = MAX_OVERALL_SEARCH_RESULTS
+) -> List[Dict[str, Any]]:
     """
-    Aplica a busca booleana em linhas de Excel (primeira coluna textual é a "principal").
+    Executa a query sobre o índice e monta até `limit` resultados (ordem do livro).
     Retorna dicionários simples para posterior montagem de SearchResult.
     """
-    if not rows or not query:
+    if not query:
         return []
+    return materialize_hits(index, evaluate_query_bits(index, query), query, limit)
 
-    # normaliza chaves (defensivo – já normalizamos em read_excel_first_sheet)
-    rows = [{k.lower(): v for k, v in row.items()} for row in rows]
 
-    # primeira coluna de dados (ordem preservada pelo pandas; se vazio, aborta)
-    first_row = rows[0]
+# ----------------------------------- CAMPOS DO RESULTADO -------------------------------------
+RESULT_FIELDS = ("source", "text", "number", "score", "metadata")
+FULL_FIELDS = "all"  # fields=["all"]: formato antigo (linha inteira em metadata)
 
-    if not first_row:
-        return []
 
-    texto_key = list(first_row.keys())[0]  # "primeira coluna"
+def compact_metadata(row: Dict[str, Any], texto_key: str) -> Optional[Dict[str, Any]]:
+    """Metadados sem o texto principal (já em `text`), sem paragraph_number e sem colunas vazias."""
+    meta = {
+        k: v for k, v in row.items()
+        if k not in (texto_key, "paragraph_number") and v is not None and str(v).strip()
+    }
+    return meta or None
 
-    #logger.info(f"\n\n[lexical_search_in_files] texto_key: {texto_key}")
 
-    pred = compile_boolean_predicate(query)
-    pre = compile_prefilter(query)  # pré-filtro barato (pode ser None)
+def wants_full_fields(fields: Optional[List[str]]) -> bool:
+    return bool(fields) and FULL_FIELDS in fields
 
-    results: List[Dict[str, Any]] = []
 
-    for row in rows:
-        paragraph = str(row.get(texto_key, ""))
-        
-        cleaned = strip_markdown_simple(paragraph)
-        pnorm = normalize_for_match(cleaned)
+def select_fields(result: Dict[str, Any], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Projeção de um resultado (asdict(SearchResult)):
+    - None/[]  -> esquema compacto: sem score zerado e sem metadata vazio;
+    - ["all"]  -> tudo, como antes;
+    - lista    -> só os campos de topo pedidos; os demais nomes escolhem colunas de metadata
+                  (ex.: ["source", "number", "title"] -> {"source", "number", "metadata": {"title"}}).
+    """
+    if not fields:
+        return {
+            k: v for k, v in result.items()
+            if not (k == "score" and not v) and not (k == "metadata" and not v)
+        }
+    if FULL_FIELDS in fields:
+        return result
+    out = {k: result[k] for k in RESULT_FIELDS if k in fields and k in result}
+    columns = [f for f in fields if f not in RESULT_FIELDS]
+    if columns:
+        meta = result.get("metadata") or {}
+        out["metadata"] = {c: meta[c] for c in columns if c in meta}
+    return out
 
 
-        # 1) pré-filtro barato (quando aplicável)
-        if pre is not None and not pre(pnorm):
+# ----------------------------------- TRECHOS (snippet) ---------------------------------------
+def _snippet_terms(query: str) -> List[Union[List[str], Any]]:
+    """Termos positivos do texto: frase -> lista de palavras; demais -> matcher de uma palavra."""
+    tokens = tokenize_query(_prepare_query(query))
+    terms: List[Union[List[str], Any]] = []
+    for pos, t in enumerate(tokens):
+        if t in _BOOL_OPS or t in "()" or split_field_token(t) or (pos and tokens[pos - 1] == "!"):
             continue
+        if len(t) >= 2 and t[0] == '"' and t[-1] == '"':
+            terms.append(normalize_for_match(t[1:-1]).split())
+        else:
+            terms.append(term_pattern(t))
+    return terms
+
 
-        # 2) predicado completo
-        if pred(pnorm):
-            processed = process_found_paragraph(paragraph, query)
-            if processed and processed.strip():
-                number = row.get("paragraph_number")
-                results.append({
-                    "paragraph_text": processed,
-                    "paragraph_number": int(number) if str(number).isdigit() else None,
-                    "metadata": row
-                })
-        if len(results) >= MAX_OVERALL_SEARCH_RESULTS:
+def make_snippet(text: str, query: str, size: int) -> str:
+    """
+    Trecho de até `size` caracteres (texto sem markdown) com a maior concentração de
+    ocorrências dos termos positivos da query; "…" marca os cortes.
+    """
+    plain = strip_markdown_simple(text).strip()
+    size = max(SNIPPET_MIN_CHARS, min(int(size), SNIPPET_MAX_CHARS))
+    if len(plain) <= size:
+        return plain
+
+    tokens = [(m.start(), m.end(), normalize_for_match(m.group(0))) for m in _KWIC_TOKEN_RE.finditer(plain)]
+    words = [w for _, _, w in tokens]
+    spans: List[Tuple[int, int]] = []
+    for term in _snippet_terms(query):
+        for i in range(len(tokens)):
+            if isinstance(term, list):
+                n = len(term)
+                if n and words[i:i + n] == term:
+                    spans.append((tokens[i][0], tokens[i + n - 1][1]))
+            elif words[i] and term.search(words[i]):
+                spans.append((tokens[i][0], tokens[i][1]))
+    spans.sort()
+
+    # janela com mais ocorrências (dois ponteiros sobre os inícios), centrada nelas
+    lo = 0
+    if spans:
+        best, best_i, best_j, i = 0, 0, 0, 0
+        for j in range(len(spans)):
+            while spans[j][1] - spans[i][0] > size:
+                i += 1
+            if j - i + 1 > best:
+                best, best_i, best_j = j - i + 1, i, j
+        middle = (spans[best_i][0] + spans[best_j][1]) // 2
+        lo = max(0, min(middle - size // 2, len(plain) - size))
+    hi = min(len(plain), lo + size)
+
+    # corta em espaço para não partir palavras
+    if lo > 0:
+        cut = plain.find(" ", lo, hi)
+        lo = cut + 1 if cut != -1 else lo
+    if hi < len(plain):
+        cut = plain.rfind(" ", lo, hi)
+        hi = cut if cut > lo else hi
+    return ("…" if lo > 0 else "") + plain[lo:hi].strip() + ("…" if hi < len(plain) else "")
+
+
+def materialize_hits(
+    index: BookIndex,
+    bits: int,
+    query: str,
+    limit: int,
+    snippet: int = 0,
+    full_metadata: bool = False,
+    seen: Optional[Dict[int, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Monta os dicionários de resultado para as primeiras `limit` linhas do bitset.
+    Com `snippet` > 0, o texto vira um trecho de até `snippet` caracteres em torno das ocorrências.
+    Metadados compactos (compact_metadata) por padrão; `full_metadata` devolve a linha inteira.
+    Com `seen` (content_hash -> hit já devolvido, compartilhado entre livros), parágrafos
+    repetidos não ocupam o limite: entram em "duplicates" do primeiro hit igual.
+    """
+    results: List[Dict[str, Any]] = []
+    if limit <= 0 or not bits:
+        return results
+
+    # linhas agregadoras mostram só o cabeçalho e os itens que casaram
+    seg_hits = None
+    if index.segments is not None and _is_text_scoped(query) and bits & index.segments.rows_bits:
+        # import tardio: segments importa este módulo
+        from modules.lexical_search.segments import matched_segments_text, segment_bits
+        seg_hits = segment_bits(index, query, bits & index.segments.rows_bits)
+
+    for i in iter_bits(bits):
+        row = index.rows[i]
+        if seen is not None:
+            first = seen.get(index.hashes[i])
+            if first is not None:
+                first.setdefault("duplicates", []).append(
+                    {"source": index.book, "number": row.get("paragraph_number")}
+                )
+                continue
+        if seg_hits is not None and i in index.segments.spans:
+            processed = matched_segments_text(index, i, seg_hits)
+        else:
+            processed = str(row.get(index.texto_key, ""))
+        if processed and processed.strip():
+            if snippet > 0:
+                processed = make_snippet(processed, query, snippet)
+            results.append({
+                "paragraph_text": processed,
+                "paragraph_number": row.get("paragraph_number"),
+                "metadata": (dict(row) if full_metadata else compact_metadata(row, index.texto_key))
+                if index.has_metadata else None,
+            })
+            if seen is not None:
+                results[-1]["content_hash"] = index.hashes[i]
+                seen[index.hashes[i]] = results[-1]
+        if len(results) >= limit:
             break
 
     return results
 
 
+# ----------------------------------- FACETAS -------------------------------------------------
+def facet_counts(index: BookIndex, bits: int, column: str) -> Dict[str, int]:
+    """
+    Contagem de linhas do bitset por valor da coluna (rótulo original -> quantidade).
+    Não materializa linhas: colunas de baixa cardinalidade usam popcount de bitsets por valor;
+    as demais percorrem apenas os índices das linhas encontradas.
+    """
+    fidx = index.fields.get(column)
+    if fidx is None or not bits:
+        return {}
+
+    counts: Dict[str, int] = {}
+    if len(fidx.distinct) <= _FACET_BITSET_MAX:
+        if fidx.value_bits is None:
+            fidx.value_bits = {v: ids_to_bits(ids, index.size) for v, ids in fidx.distinct.items()}
+        for value, vbits in fidx.value_bits.items():
+            n = (bits & vbits).bit_count()
+            if n:
+                counts[fidx.labels[value]] = n
+        return counts
+
+    for i in iter_bits(bits):
+        value = fidx.values[i]
+        if value:
+            label = fidx.labels[value]
+            counts[label] = counts.get(label, 0) + 1
+    return counts
+
+
+# =============================================================================================
+# 9) Parágrafo por id (livro, número) com vizinhos
+# ---------------------------------------------------------------------------------------------
+# paragraph_number é a posição (1-based) da linha no livro, então a busca é um acesso direto
+# a index.rows do BookIndex em cache. Citações do RAGbot ("TNP: 538, 816; LO: 12") também valem.
+# =============================================================================================
+_PARAGRAPH_REF_RE = re.compile(r"([^\s:;,]+)\s*:\s*(\d+(?:\s*,\s*\d+)*)")
+
+
+def parse_paragraph_refs(text: str) -> List[Tuple[str, int]]:
+    """'TNP: 538, 816; LO: 12' -> [("TNP", 538), ("TNP", 816), ("LO", 12)]."""
+    refs: List[Tuple[str, int]] = []
+    for m in _PARAGRAPH_REF_RE.finditer(text or ""):
+        refs.extend((m.group(1), int(n)) for n in m.group(2).split(","))
+    return refs
+
+
+def _paragraph_dict(index: BookIndex, row: int) -> Dict[str, Any]:
+    r = index.rows[row]
+    return {
+        "source": index.book,
+        "number": r.get("paragraph_number", row + 1),
+        "text": str(r.get(index.texto_key, "")),
+        "metadata": dict(r) if index.has_metadata else None,
+    }
+
+
+def fetch_paragraph(book: str, number: int, before: int = 0, after: int = 0) -> Dict[str, Any]:
+    """
+    Parágrafo `number` de `book` e até `before`/`after` vizinhos (teto MAX_PARAGRAPH_CONTEXT).
+
+    Retorno: {"source","number","text","metadata","before":[...],"after":[...]};
+    livro ou número inexistente -> ValueError.
+    """
+    path = find_book_file(str(book))
+    if path is None:
+        raise ValueError(f"Livro não encontrado: {book}")
+    index = load_book_index(path)
+    row = int(number) - 1
+    if not 0 <= row < index.size:
+        raise ValueError(f"Parágrafo {number} fora do livro {index.book} (1..{index.size}).")
+    before = max(0, min(int(before), MAX_PARAGRAPH_CONTEXT))
+    after = max(0, min(int(after), MAX_PARAGRAPH_CONTEXT))
+
+    item = _paragraph_dict(index, row)
+    item["before"] = [_paragraph_dict(index, i) for i in range(max(0, row - before), row)]
+    item["after"] = [_paragraph_dict(index, i) for i in range(row + 1, min(index.size, row + 1 + after))]
+    return item
+
+
+def fetch_paragraphs(ids: List[Tuple[str, int]], before: int = 0, after: int = 0) -> List[Dict[str, Any]]:
+    """Versão em lote: um item por id, na ordem pedida; ids inválidos viram {"source","number","error"}."""
+    if len(ids) > MAX_PARAGRAPH_BATCH:
+        raise ValueError(f"Too many paragraphs: {len(ids)} (max {MAX_PARAGRAPH_BATCH})")
+    items: List[Dict[str, Any]] = []
+    for book, number in ids:
+        try:
+            items.append(fetch_paragraph(book, number, before, after))
+        except ValueError as e:
+            items.append({"source": book, "number": number, "error": str(e)})
+    return items
+
+
 # =============================================================================================
 # Notas de manutenção
 # ---------------------------------------------------------------------------------------------
-# - O pré-filtro barato acelera muito coleções grandes sem comprometer a correção,
-#   pois só ativa em CONJUNÇÃO pura (sem OR) e sem curingas nos literais.
+# - Os módulos irmãos (segments, engines, suggest, spelling, concordance, collocations,
+#   similarity, fts_engine) importam este no topo; este os importa dentro das funções.
 # - Para aspas simples como frase exata, duplique a lógica de phrase_pattern para "'…'".
 # - Para destacar trechos no `text` (HTML), devolva offsets do regex ao invés de apenas True/False.
-# - Se quiser pré-filtros mais sofisticados (com OR), é possível analisar a árvore booleana e
-#   construir conjuntos "pelo menos um" para cada cláusula — fica mais complexo, mas viável.
 # =============================================================================================
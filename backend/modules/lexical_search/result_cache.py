@@ -0,0 +1,70 @@
+# result_cache.py
+"""
+Conjuntos de resultados da busca léxica guardados no servidor (result_id), para "buscar nos
+resultados" (refine) sem reavaliar a query original em todos os livros.
+
+Cada entrada guarda, por livro, o bitset (int) das linhas que casaram e o mtime do arquivo
+no momento da busca, além da cadeia de queries que produziu o conjunto. O cache é um LRU
+limitado (RESULT_CACHE_SIZE entradas) com validade (RESULT_CACHE_TTL_S). É por processo:
+com vários workers do gunicorn, um result_id só vale no worker que o criou.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import secrets
+import threading
+import time
+
+from utils.config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S
+
+
+@dataclass
+class CachedResult:
+    result_id: str
+    queries: List[str]                       # query original + refinamentos, em ordem
+    books: Dict[str, Tuple[int, float]]      # livro -> (bitset das linhas, mtime do arquivo)
+    created: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(bits.bit_count() for bits, _ in self.books.values())
+
+
+class ResultCache:
+    """LRU com validade por entrada; thread-safe."""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl_s: float = RESULT_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, queries: List[str], books: Dict[str, Tuple[int, float]]) -> str:
+        entry = CachedResult(secrets.token_urlsafe(12), list(queries), dict(books), time.monotonic())
+        with self._lock:
+            self._entries[entry.result_id] = entry
+            while len(self._entries) > max(self.max_entries, 1):
+                self._entries.popitem(last=False)
+        return entry.result_id
+
+    def get(self, result_id: str) -> Optional[CachedResult]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            if self.ttl_s and time.monotonic() - entry.created > self.ttl_s:
+                del self._entries[result_id]
+                return None
+            self._entries.move_to_end(result_id)
+            return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+result_cache = ResultCache()
@@ -0,0 +1,158 @@
+# segments.py
+"""
+Linhas agregadoras ("cabeçalho | item | item"): a query booleana é avaliada item a item.
+
+Cada item vira uma linha de um BookIndex próprio (texto normalizado e postings na carga,
+metadados herdados da linha); a linha agregadora casa se algum item casa, e o texto exibido
+traz o cabeçalho e só os itens que casaram. Montado por build_book_index (lexical_utils).
+"""
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import threading
+import time
+
+from modules.lexical_search.lexical_utils import (
+    BookIndex,
+    QueryTrace,
+    SearchBudget,
+    build_book_index,
+    evaluate_query_bits,
+    ids_to_bits,
+    iter_bits,
+)
+
+_SEGMENT_SEP = "|"
+_SEGMENT_MIN_SEPS = 2
+_SEGMENT_CACHE_SIZE = 128
+
+
+@dataclass
+class SegmentIndex:
+    """
+    Subtrechos das linhas que agregam itens com '|' (2+ ocorrências): "cabeçalho | item | item".
+    Cada item vira uma linha de um BookIndex próprio (texto normalizado e postings na carga,
+    metadados herdados da linha), de modo que a query booleana é avaliada por item.
+    """
+    index: BookIndex
+    row_of: array                              # segmento -> linha do livro
+    spans: Dict[int, Tuple[int, int]]          # linha -> segmentos [início, fim)
+    headers: Dict[int, str]                    # linha -> cabeçalho (texto antes do 1º '|')
+    rows_bits: int                             # bitset das linhas agregadoras
+    cache: Dict[Tuple[str, int], int] = field(default_factory=dict, repr=False)  # (query, linhas) -> bitset de segmentos
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+def split_segments(text: str) -> Optional[Tuple[str, List[str]]]:
+    """(cabeçalho, itens) de uma linha agregadora; None se tiver menos de 2 separadores."""
+    if text.count(_SEGMENT_SEP) < _SEGMENT_MIN_SEPS:
+        return None
+    header, *parts = text.split(_SEGMENT_SEP)
+    return header.strip(), [p.strip() for p in parts]
+
+
+def join_segments(header: str, items: List[str]) -> str:
+    """Texto exibido de uma linha agregadora: cabeçalho + itens, sem '|', '\\' nem quebras de linha."""
+    return " ".join([header] + items).replace("|", "").replace("\\", "").replace("\n", "").strip()
+
+
+def build_segment_index(book: str, rows: List[Dict[str, Any]], texto_key: str, has_metadata: bool) -> Optional[SegmentIndex]:
+    """Separa as linhas agregadoras em subtrechos indexados (None se o livro não tem nenhuma)."""
+    seg_rows: List[Dict[str, Any]] = []
+    row_of = array("I")
+    spans: Dict[int, Tuple[int, int]] = {}
+    headers: Dict[int, str] = {}
+    for i, r in enumerate(rows):
+        split = split_segments(str(r.get(texto_key, "")))
+        if split is None:
+            continue
+        headers[i], parts = split
+        start = len(seg_rows)
+        for part in parts:
+            seg_rows.append({**r, texto_key: part})
+            row_of.append(i)
+        spans[i] = (start, len(seg_rows))
+    if not seg_rows:
+        return None
+    return SegmentIndex(
+        index=build_book_index(book, seg_rows, has_metadata=has_metadata, split_segments=False),
+        row_of=row_of,
+        spans=spans,
+        headers=headers,
+        rows_bits=ids_to_bits(spans, len(rows)),
+    )
+
+
+def segment_bits(index: BookIndex, query: str, rows: int, budget: Optional[SearchBudget] = None) -> int:
+    """
+    Bitset dos itens (subtrechos) que casam com a query, avaliando só os itens das linhas
+    agregadoras em `rows`. Com `budget`, budget.cutoff volta na numeração dos segmentos.
+    Cache pequeno por livro, por (query, linhas), só de avaliações completas.
+    """
+    segments = index.segments
+    key = (query, rows)
+    with segments.lock:
+        bits = segments.cache.get(key)
+    if bits is not None:
+        if budget is not None:
+            budget.cutoff = None
+        return bits
+    mask = 0
+    for row in iter_bits(rows & segments.rows_bits):
+        start, end = segments.spans[row]
+        mask |= ((1 << (end - start)) - 1) << start
+    if not mask:
+        return 0
+    bits = evaluate_query_bits(segments.index, query, budget=budget, within=mask)
+    if budget is None or budget.cutoff is None:
+        with segments.lock:
+            if len(segments.cache) >= _SEGMENT_CACHE_SIZE:
+                segments.cache.pop(next(iter(segments.cache)))
+            segments.cache[key] = bits
+    return bits
+
+
+def merge_segment_rows(
+    index: BookIndex,
+    query: str,
+    tokens: List[str],
+    result: int,
+    within: Optional[int] = None,
+    budget: Optional[SearchBudget] = None,
+    trace: Optional[QueryTrace] = None,
+) -> int:
+    """
+    Troca, em `result` (bitset das linhas do livro), as linhas agregadoras pelas que têm algum
+    item casando (mesma semântica booleana, por item). Um corte do orçamento dentro dos itens
+    volta para budget.cutoff na numeração das linhas do livro.
+    """
+    t0 = time.perf_counter() if trace is not None else 0.0
+    segments = index.segments
+    # sem negação, item que casa implica linha que casa: bastam as linhas já casadas;
+    # com '!', qualquer linha agregadora ainda avaliável pode casar por um item
+    rows = segments.rows_bits if "!" in tokens else result & segments.rows_bits
+    if within is not None:
+        rows &= within
+    cutoff = budget.cutoff if budget is not None else None
+    if cutoff is not None:
+        rows &= (1 << cutoff) - 1
+    seg_hits = segment_bits(index, query, rows, budget) if rows else 0
+    if budget is not None:
+        # o corte da avaliação dos itens vem na numeração dos segmentos: volta para linhas
+        if budget.cutoff is not None and budget.cutoff < len(segments.row_of):
+            cutoff = segments.row_of[budget.cutoff] if cutoff is None else min(cutoff, segments.row_of[budget.cutoff])
+        budget.cutoff = cutoff
+    seg_rows = ids_to_bits((segments.row_of[s] for s in iter_bits(seg_hits)), index.size)
+    if trace is not None:
+        trace.book_phase("segments", t0)
+    return (result & ~segments.rows_bits) | seg_rows
+
+
+def matched_segments_text(index: BookIndex, row: int, seg_hits: int) -> str:
+    """Texto exibido da linha agregadora `row`: cabeçalho + itens que casaram."""
+    segments = index.segments
+    start, end = segments.spans[row]
+    window = (seg_hits >> start) & ((1 << (end - start)) - 1)
+    items = [str(segments.index.rows[start + k].get(segments.index.texto_key, "")) for k in iter_bits(window)]
+    return join_segments(segments.headers[row], items)
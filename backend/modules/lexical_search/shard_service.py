@@ -0,0 +1,396 @@
+# shard_service.py
+"""
+Serviço de busca em shards: processos de longa duração, cada um dono de parte dos livros
+(índices em memória pré-carregados), atendendo queries por sockets Unix locais.
+
+Com workers síncronos do gunicorn, uma query pesada prende um worker enquanto os outros
+núcleos ficam ociosos. Com LEXICAL_ENGINE=sharded, o worker Flask (ShardedEngine) envia a
+query a todos os shards de uma vez e só depois lê as respostas: os livros são avaliados em
+paralelo, um processo por shard, e o worker Flask só espera I/O.
+
+- Partição: livros do maior para o menor arquivo, cada um para o shard mais leve (plan_shards).
+- Protocolo: multiprocessing.connection (pickle + HMAC) em LEXICAL_SHARD_DIR/shard-N.sock;
+  pedidos {"op": "books" | "cost" | "search", ...}. A query vai em texto, não compilada (RPN):
+  cada shard a tokeniza de novo, o que custa microssegundos perto da avaliação, e os matchers
+  dos termos ficam no cache do próprio processo (term_pattern). Assim o protocolo não depende
+  do formato interno da RPN nem de matchers serializáveis. A chave é LEXICAL_SHARD_AUTHKEY ou, sem
+  ela, uma chave aleatória que o serviço grava em LEXICAL_SHARD_DIR/authkey (0600, num
+  diretório 0700) e que os workers Flask leem de lá.
+- Cada shard roda MemoryEngine.search_books nos seus livros, com o prazo que restou da
+  requisição e a sua parte das linhas (proporcional aos livros), e devolve {livro: BookHits}
+  (contagem, hits e facetas por coluna).
+- Livros sem shard (livro novo, shard fora do ar, resposta além do prazo) são buscados no
+  próprio processo Flask.
+
+Uso (a partir de backend/, ao lado do gunicorn):
+    python -m modules.lexical_search.shard_service --shards 4
+    LEXICAL_ENGINE=sharded gunicorn app:app
+"""
+from multiprocessing.connection import AuthenticationError, Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import argparse
+import logging
+import multiprocessing
+import os
+import secrets
+import sys
+import threading
+import time
+
+from modules.lexical_search.engines import BookHits, LexicalEngine, MemoryEngine
+from modules.lexical_search.lexical_utils import (
+    SearchBudget,
+    available_books,
+    find_book_file,
+    load_book_index,
+)
+from utils.config import LEXICAL_SHARD_AUTHKEY, LEXICAL_SHARD_DIR, LEXICAL_SHARDS
+
+logger = logging.getLogger("cons-ai")
+
+_RETRY_S = 30.0        # shard que falhou só é tentado de novo depois disso
+_SUPERVISE_S = 5.0     # intervalo de verificação dos processos de shard
+_REPLY_TIMEOUT_S = 10.0  # espera máxima por uma resposta sem prazo da requisição
+_REPLY_MARGIN_S = 0.5    # folga sobre o prazo da busca (serialização, socket)
+
+
+class ShardError(RuntimeError):
+    """O shard recebeu o pedido mas falhou ao atendê-lo (a conexão continua válida)."""
+
+
+def plan_shards(paths: List[Path], n_shards: int) -> List[List[Path]]:
+    """Reparte os livros em até `n_shards` grupos de tamanho (bytes dos arquivos) equilibrado."""
+    groups: List[List[Path]] = [[] for _ in range(max(1, min(n_shards, len(paths))))]
+    loads = [0] * len(groups)
+    for path in sorted(paths, key=lambda p: (-p.stat().st_size, p.stem)):
+        i = loads.index(min(loads))
+        groups[i].append(path)
+        loads[i] += path.stat().st_size
+    return groups
+
+
+def shard_address(i: int, directory: Optional[Path] = None) -> str:
+    return str(Path(directory or LEXICAL_SHARD_DIR) / f"shard-{i}.sock")
+
+
+def create_authkey(directory: Optional[Path] = None) -> bytes:
+    """Chave dos sockets: LEXICAL_SHARD_AUTHKEY ou uma nova, aleatória, gravada em `directory`/authkey."""
+    if LEXICAL_SHARD_AUTHKEY:
+        return LEXICAL_SHARD_AUTHKEY
+    key = secrets.token_hex(32).encode()
+    path = Path(directory or LEXICAL_SHARD_DIR) / "authkey"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        os.fchmod(f.fileno(), 0o600)  # arquivo de uma execução anterior pode ter outro modo
+        f.write(key)
+    return key
+
+
+def read_authkey(directory: Optional[Path] = None) -> bytes:
+    """Chave gravada por create_authkey (OSError se o serviço ainda não subiu)."""
+    if LEXICAL_SHARD_AUTHKEY:
+        return LEXICAL_SHARD_AUTHKEY
+    return (Path(directory or LEXICAL_SHARD_DIR) / "authkey").read_bytes()
+
+
+# =============================================================================================
+# Lado do shard
+# =============================================================================================
+class ShardServer:
+    """Processo (ou thread, nos testes) dono de `books`: responde pedidos no socket `address`."""
+
+    def __init__(self, address: str, books: List[str], authkey: Optional[bytes] = None):
+        self.address = address
+        self.books = list(books)
+        self.authkey = authkey or read_authkey(Path(address).parent)
+        self.engine = MemoryEngine()
+        self._listener: Optional[Listener] = None
+        self._closed = False
+
+    def preload(self) -> None:
+        t0 = time.perf_counter()
+        for book in self.books:
+            path = find_book_file(book)
+            if path:
+                load_book_index(path)
+        logger.info(f"[ShardServer] {self.address}: {len(self.books)} livros em {time.perf_counter() - t0:.1f}s")
+
+    def listen(self) -> None:
+        """Abre o socket (só depois disso o shard fica visível para os clientes)."""
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # socket órfão de uma execução anterior
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+
+    def serve_forever(self) -> None:
+        if self._listener is None:
+            self.listen()
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (AuthenticationError, EOFError) as e:
+                logger.warning(f"[ShardServer] conexão recusada em {self.address}: {e}")
+                continue
+            except OSError:
+                if self._closed:
+                    break
+                raise
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def close(self) -> None:
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+
+    def _serve_connection(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = {"ok": self.handle(request)}
+                except Exception as e:
+                    logger.error(f"[ShardServer] pedido {request.get('op')!r} falhou: {e}", exc_info=True)
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def handle(self, request: Dict[str, Any]) -> Any:
+        op = request.get("op")
+        if op == "books":
+            return self.books
+        owned = set(self.books)
+        paths = [p for p in (find_book_file(b) for b in request.get("books", []) if b in owned) if p]
+        if op == "cost":
+            return self.engine.query_cost(paths, request["query"])
+        if op == "search":
+            return self.engine.search_books(
+                paths, request["query"], request["limit"],
+                snippet=request.get("snippet", 0),
+                full_metadata=request.get("full_metadata", False),
+                facet_columns=request.get("facet_columns", ()),
+                budget=SearchBudget(request.get("time_budget_s"), request.get("row_budget")),
+                dedupe=request.get("dedupe", False),
+                within=request.get("within"),
+                keep_bits=request.get("keep_bits", False),
+            )
+        raise ValueError(f"Operação desconhecida: {op!r}")
+
+
+def _run_shard(address: str, books: List[str], authkey: bytes) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s", stream=sys.stdout)
+    server = ShardServer(address, books, authkey)
+    server.preload()
+    server.serve_forever()
+
+
+def start_shard(i: int, books: List[str], authkey: bytes, directory: Optional[Path] = None) -> multiprocessing.Process:
+    # spawn: o processo pai pode ter threads (fork copiaria locks em estado inconsistente)
+    proc = multiprocessing.get_context("spawn").Process(
+        target=_run_shard, args=(shard_address(i, directory), books, authkey), name=f"lexical-shard-{i}", daemon=True
+    )
+    proc.start()
+    return proc
+
+
+def run_service(n_shards: int = LEXICAL_SHARDS, directory: Optional[Path] = None) -> None:
+    """Sobe os shards e os reinicia se algum processo morrer (bloqueia até Ctrl+C)."""
+    directory = Path(directory or LEXICAL_SHARD_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    os.chmod(directory, 0o700)
+    for stale in directory.glob("shard-*.sock"):
+        stale.unlink()
+    authkey = create_authkey(directory)
+
+    paths = [p for p in (find_book_file(b) for b in available_books()) if p]
+    plan = [[p.stem for p in group] for group in plan_shards(paths, n_shards or os.cpu_count() or 1)]
+    for i, books in enumerate(plan):
+        logger.info(f"[run_service] shard {i}: {', '.join(books)}")
+    procs = [start_shard(i, books, authkey, directory) for i, books in enumerate(plan)]
+    try:
+        while True:
+            time.sleep(_SUPERVISE_S)
+            for i, proc in enumerate(procs):
+                if not proc.is_alive():
+                    logger.warning(f"[run_service] shard {i} saiu (código {proc.exitcode}); reiniciando")
+                    procs[i] = start_shard(i, plan[i], authkey, directory)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            proc.terminate()
+
+
+# =============================================================================================
+# Lado do Flask: motor "sharded"
+# =============================================================================================
+class ShardedEngine(LexicalEngine):
+    name = "sharded"
+
+    def __init__(self, directory: Optional[Path] = None, authkey: Optional[bytes] = None):
+        self.directory = Path(directory or LEXICAL_SHARD_DIR)
+        self.authkey = authkey  # None: lida de directory/authkey a cada conexão (muda se o serviço reinicia)
+        self._local = threading.local()      # conexões por thread (uma requisição por vez em cada)
+        self._down_until: Dict[str, float] = {}  # compartilhado entre as threads: só com _down_lock
+        self._down_lock = threading.Lock()
+        self._fallback = MemoryEngine()
+
+    # ---------------------------------------------------------------- conexões
+    def _shards(self) -> Dict[str, Tuple[Connection, Set[str]]]:
+        """Conexões desta thread: endereço -> (conexão, livros do shard)."""
+        shards = getattr(self._local, "shards", None)
+        if shards is None:
+            shards = self._local.shards = {}
+        now = time.monotonic()
+        for sock in sorted(self.directory.glob("shard-*.sock")):
+            address = str(sock)
+            if address in shards or self._is_down(address, now):
+                continue
+            conn = None
+            try:
+                conn = Client(address, family="AF_UNIX", authkey=self.authkey or read_authkey(self.directory))
+                conn.send({"op": "books"})
+                shards[address] = (conn, set(self._reply(conn, time.monotonic() + _REPLY_TIMEOUT_S)))
+            except (OSError, EOFError, AuthenticationError, ShardError) as e:
+                if conn is not None:
+                    conn.close()
+                self._mark_down(address)
+                logger.warning(f"[ShardedEngine] shard indisponível {address}: {e}")
+        return shards
+
+    def _drop(self, address: str, error: Exception) -> None:
+        conn, _ = self._local.shards.pop(address)
+        conn.close()
+        self._mark_down(address)
+        logger.warning(f"[ShardedEngine] shard {address} caiu ({error}); livros buscados localmente")
+
+    def _is_down(self, address: str, now: float) -> bool:
+        with self._down_lock:
+            return self._down_until.get(address, 0.0) > now
+
+    def _mark_down(self, address: str) -> None:
+        """Shard fora do ar: nenhuma thread tenta reconectar antes de _RETRY_S segundos."""
+        with self._down_lock:
+            self._down_until[address] = time.monotonic() + _RETRY_S
+
+    @staticmethod
+    def _reply(conn: Connection, deadline: float) -> Any:
+        """Lê a resposta do shard; TimeoutError se não chegar até `deadline` (time.monotonic)."""
+        if not conn.poll(max(deadline - time.monotonic(), 0.0)):
+            raise TimeoutError("sem resposta no prazo")
+        reply = conn.recv()
+        if "error" in reply:
+            raise ShardError(reply["error"])
+        return reply["ok"]
+
+    def _fan_out(
+        self, paths: List[Path], request: Dict[str, Any], timeout: float = _REPLY_TIMEOUT_S,
+        budget: Optional[SearchBudget] = None,
+    ) -> Tuple[List[Any], List[Path]]:
+        """
+        Envia `request` a todos os shards donos de algum livro de `paths` e só então lê as
+        respostas (os shards trabalham em paralelo). Retorna (respostas, livros a buscar aqui).
+        Shard que não responde em `timeout` segundos é descartado (a conexão fica com uma
+        resposta pendente) e seus livros voltam para cá.
+        Com `budget` de linhas, cada shard recebe a parte proporcional aos seus livros, debitada
+        do orçamento do chamador quando ele responde.
+        """
+        shards = self._shards()
+        owner = {book: address for address, (_, books) in shards.items() for book in books}
+        by_name = {p.stem: p for p in paths}
+        groups: Dict[str, List[str]] = {}
+        local: List[Path] = []
+        for path in paths:
+            address = owner.get(path.stem)
+            if address is None:
+                local.append(path)
+            else:
+                groups.setdefault(address, []).append(path.stem)  # na ordem de `paths`
+
+        rows_left = budget.rows_left if budget is not None else None
+        shares: Dict[str, int] = {}
+        sent: List[str] = []
+        for address, books in groups.items():
+            shard_request = {**request, "books": books}
+            if rows_left is not None:
+                shares[address] = shard_request["row_budget"] = max(1, rows_left * len(books) // len(paths))
+            try:
+                shards[address][0].send(shard_request)
+                sent.append(address)
+            except OSError as e:
+                self._drop(address, e)
+                local.extend(by_name[b] for b in books)
+
+        deadline = time.monotonic() + timeout
+        replies: List[Any] = []
+        for address in sent:
+            try:
+                replies.append(self._reply(shards[address][0], deadline))
+                if address in shares:
+                    budget.consume(shares[address])
+            except ShardError as e:
+                logger.error(f"[ShardedEngine] {address}: {e}")
+                local.extend(by_name[b] for b in groups[address])
+            except (OSError, EOFError) as e:
+                self._drop(address, e)
+                local.extend(by_name[b] for b in groups[address])
+        return replies, local
+
+    # ---------------------------------------------------------------- LexicalEngine
+    def query_cost(self, paths: List[Path], query: str) -> int:
+        replies, local = self._fan_out(paths, {"op": "cost", "query": query})
+        return sum(replies) + self._fallback.query_cost(local, query)
+
+    def search_books(
+        self, paths, query, limit, snippet=0, full_metadata=False, facet_columns=(), budget=None, dedupe=False,
+        within=None, keep_bits=False, trace=None,
+    ):
+        time_left = None
+        if budget is not None and budget.deadline is not None:
+            time_left = max(budget.deadline - time.monotonic(), 1e-3)
+        replies, local = self._fan_out(paths, {
+            "op": "search",
+            "query": query,
+            "limit": limit,
+            "snippet": snippet,
+            "full_metadata": full_metadata,
+            "facet_columns": list(facet_columns),
+            "time_budget_s": time_left,
+            "dedupe": dedupe,  # cada shard deduplica os seus livros; entre shards, no chamador
+            "within": within,  # bitsets pequenos (um int por livro): vão inteiros a todos os shards
+            "keep_bits": keep_bits,
+        }, timeout=time_left + _REPLY_MARGIN_S if time_left is not None else _REPLY_TIMEOUT_S, budget=budget)
+        out: Dict[str, BookHits] = {}
+        for per_book in replies:
+            out.update(per_book)
+        if local:
+            out.update(self._fallback.search_books(
+                local, query, limit, snippet, full_metadata, facet_columns, budget, dedupe, within, keep_bits, trace
+            ))
+        return out
+
+    def book_search(self, path, query, limit, snippet=0, full_metadata=False, budget=None):
+        found = self.search_books([path], query, limit, snippet, full_metadata, budget=budget).get(path.stem)
+        found = found or BookHits()
+        return found.count, found.hits
+
+    def book_count(self, path: Path, query: str, budget: Optional[SearchBudget] = None) -> int:
+        return self.book_search(path, query, 0, budget=budget)[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serviço de busca léxica em shards (ver docstring do módulo).")
+    parser.add_argument("--shards", type=int, default=LEXICAL_SHARDS, help="processos (0 = um por núcleo)")
+    parser.add_argument("--dir", type=Path, default=None, help="diretório dos sockets (padrão: LEXICAL_SHARD_DIR)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s", stream=sys.stdout)
+    run_service(args.shards, args.dir)
+
+
+if __name__ == "__main__":
+    main()
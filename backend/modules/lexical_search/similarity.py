@@ -0,0 +1,263 @@
+# similarity.py
+"""
+"Mais como este": parágrafos semelhantes por vetores TF-IDF esparsos, 100% local.
+
+Modelo único do corpus (todos os livros disponíveis), refeito quando algum arquivo muda:
+  - vocabulário global (palavra -> id) a partir dos tokens do índice posicional de cada livro;
+  - peso = (1 + ln tf) * idf, idf = ln((1 + N) / (1 + df)) + 1; stopwords e números ficam fora;
+  - cada linha normalizada (L2) -> similaridade = produto escalar = cosseno;
+  - por livro, a matriz é guardada em CSR (linha -> termos, para montar a consulta) e em CSC
+    (termo -> linhas, para o produto matriz-vetor com a consulta), em int32/float32.
+
+A consulta é o próprio parágrafo (livro, número); o escore de todas as linhas de um livro sai
+de um único np.bincount sobre as colunas dos termos da consulta.
+
+Nas requisições o modelo nunca é construído na hora: enquanto falta (ou está desatualizado),
+a construção roda numa thread e a consulta levanta IndexBuilding (HTTP 503).
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+from modules.lexical_search.concordance import load_position_index
+from modules.lexical_search.lexical_utils import (
+    BookIndex,
+    IndexBuilding,
+    SearchResult,
+    available_books,
+    compact_metadata,
+    find_book_file,
+    load_book_index,
+)
+from modules.lexical_search.stemmer_pt import STOPWORDS_PT
+from utils.config import MAX_SIMILAR_RESULTS, SIMILAR_RESULTS
+
+logger = logging.getLogger("cons-ai")
+
+
+@dataclass
+class BookVectors:
+    """Matriz TF-IDF (linhas L2-normalizadas) de um livro, nos ids do vocabulário global."""
+    book: str
+    n_rows: int
+    row_ptr: np.ndarray      # CSR: linha i -> [row_ptr[i], row_ptr[i+1])
+    row_terms: np.ndarray    # CSR: id global do termo
+    row_weights: np.ndarray  # CSR: peso
+    col_ptr: np.ndarray      # CSC: termo t -> [col_ptr[t], col_ptr[t+1])
+    col_rows: np.ndarray     # CSC: linha
+    col_weights: np.ndarray  # CSC: peso
+
+
+@dataclass
+class TfidfModel:
+    vocab: Dict[str, int]
+    idf: np.ndarray
+    books: Dict[str, BookVectors]
+    signature: Tuple = ()
+
+
+_model: Optional[TfidfModel] = None
+_model_lock = threading.Lock()
+_builder: Optional[threading.Thread] = None  # construção em segundo plano (get_tfidf_model(wait=False))
+_builder_lock = threading.Lock()
+
+
+# =============================================================================================
+# Construção
+# =============================================================================================
+def _book_term_counts(pos, local_to_global: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(linha, termo global, tf) por par distinto, ordenado por linha."""
+    n_local = max(len(pos.words), 1)
+    tok_word = np.frombuffer(pos.tok_word, dtype=np.uint32).astype(np.int64)
+    row_ptr = np.frombuffer(pos.row_ptr, dtype=np.uint32).astype(np.int64)
+    tok_row = np.repeat(np.arange(len(row_ptr) - 1), np.diff(row_ptr))
+    keys, tf = np.unique(tok_row * n_local + tok_word, return_counts=True)
+    rows, local = np.divmod(keys, n_local)
+    return rows, local_to_global[local], tf
+
+
+def build_tfidf_model(books: List[str]) -> TfidfModel:
+    indexes = [load_book_index(p) for p in (find_book_file(b) for b in books) if p]
+    vocab: Dict[str, int] = {}
+    triples = []
+    for index in indexes:
+        pos = load_position_index(index)
+        local_to_global = np.array([vocab.setdefault(w, len(vocab)) for w in pos.words], dtype=np.int64)
+        triples.append((index, *_book_term_counts(pos, local_to_global)))
+
+    n_terms = len(vocab)
+    n_docs = sum(index.size for index in indexes)
+    df = np.zeros(n_terms, dtype=np.int64)
+    for _, _, terms, _ in triples:
+        df += np.bincount(terms, minlength=n_terms)
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    for word, t in vocab.items():
+        if word in STOPWORDS_PT or word.isdigit():
+            idf[t] = 0.0  # não pesam na similaridade
+
+    vectors: Dict[str, BookVectors] = {}
+    for index, rows, terms, tf in triples:
+        weights = ((1.0 + np.log(tf)) * idf[terms]).astype(np.float32)
+        keep = weights > 0
+        rows, terms, weights = rows[keep], terms[keep], weights[keep]
+        norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=index.size))
+        weights /= np.where(norms > 0, norms, 1.0)[rows].astype(np.float32)
+
+        order = np.argsort(terms, kind="stable")
+        vectors[index.book] = BookVectors(
+            book=index.book,
+            n_rows=index.size,
+            row_ptr=np.searchsorted(rows, np.arange(index.size + 1)).astype(np.int32),
+            row_terms=terms.astype(np.int32),
+            row_weights=weights,
+            col_ptr=np.searchsorted(terms[order], np.arange(n_terms + 1)).astype(np.int32),
+            col_rows=rows[order].astype(np.int32),
+            col_weights=weights[order],
+        )
+
+    signature = tuple((index.book, index.mtime) for index in indexes)
+    return TfidfModel(vocab=vocab, idf=idf, books=vectors, signature=signature)
+
+
+def _build_model(books: List[str], signature: Tuple) -> TfidfModel:
+    global _model
+    with _model_lock:
+        if _model is None or _model.signature != signature:
+            t0 = time.perf_counter()
+            _model = build_tfidf_model(books)
+            logger.info(
+                f"[get_tfidf_model] {len(_model.vocab)} termos, {len(_model.books)} livros "
+                f"em {time.perf_counter() - t0:.1f}s"
+            )
+        return _model
+
+
+def _build_in_background(books: List[str], signature: Tuple) -> None:
+    try:
+        _build_model(books, signature)
+    except Exception as e:
+        logger.error(f"[get_tfidf_model] falha ao construir o modelo: {e}", exc_info=True)
+
+
+def get_tfidf_model(wait: bool = True) -> TfidfModel:
+    """
+    Modelo do corpus em cache; refeito se a lista de livros ou algum mtime mudar.
+    Com wait=False (requisições), um modelo ausente ou desatualizado é construído numa thread
+    e a chamada levanta IndexBuilding em vez de bloquear.
+    """
+    global _builder
+    books = available_books()
+    paths = [p for p in (find_book_file(b) for b in books) if p]
+    signature = tuple((p.stem, p.stat().st_mtime) for p in paths)  # = (index.book, index.mtime)
+    model = _model
+    if model is not None and model.signature == signature:
+        return model
+    if wait:
+        return _build_model(books, signature)
+    with _builder_lock:
+        if _builder is None or not _builder.is_alive():
+            _builder = threading.Thread(
+                target=_build_in_background, args=(books, signature), name="tfidf-build", daemon=True
+            )
+            _builder.start()
+    raise IndexBuilding("Índice de similaridade em construção; tente novamente em instantes.")
+
+
+# =============================================================================================
+# Consulta
+# =============================================================================================
+def book_scores(vectors: BookVectors, q_terms: np.ndarray, q_weights: np.ndarray) -> np.ndarray:
+    """Cosseno da consulta com todas as linhas do livro (produto CSC x vetor esparso)."""
+    starts, ends = vectors.col_ptr[q_terms], vectors.col_ptr[q_terms + 1]
+    lengths = ends - starts
+    if not lengths.sum():
+        return np.zeros(vectors.n_rows, dtype=np.float64)
+    # posições de todas as colunas da consulta num único vetor de índices
+    idx = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    contrib = vectors.col_weights[idx] * np.repeat(q_weights, lengths)
+    return np.bincount(vectors.col_rows[idx], weights=contrib, minlength=vectors.n_rows)
+
+
+def _model_index(model: TfidfModel, book: str) -> BookIndex:
+    """
+    BookIndex de `book` na versão do modelo (linha i dos vetores = linha i do índice). Se o
+    arquivo mudou depois do modelo, a reconstrução vai para a thread e levanta IndexBuilding.
+    """
+    path = find_book_file(book)
+    if path is None:
+        raise ValueError(f"Livro não encontrado: {book}")
+    index = load_book_index(path)
+    if dict(model.signature).get(index.book) != index.mtime:
+        get_tfidf_model(wait=False)  # desatualizado: dispara a reconstrução (e levanta IndexBuilding)
+        raise IndexBuilding("Índice de similaridade em construção; tente novamente em instantes.")
+    return index
+
+
+def similar_paragraphs(
+    book: str,
+    number: int,
+    source: Optional[List[str]] = None,
+    k: int = SIMILAR_RESULTS,
+    min_score: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Top-k parágrafos mais semelhantes ao parágrafo `number` de `book` nos livros `source`
+    (todos, se vazio). O próprio parágrafo não entra no resultado. IndexBuilding enquanto o
+    modelo do corpus está sendo (re)construído, inclusive quando algum livro do resultado
+    mudou depois do modelo (as linhas do índice já não seriam as dos vetores).
+
+    Retorno: {"query": {"source", "number", "text"}, "results": [SearchResult como dict, ...]}
+    """
+    k = max(1, min(int(k), MAX_SIMILAR_RESULTS))
+    model = get_tfidf_model(wait=False)
+    vectors = model.books.get(book)
+    if vectors is None:
+        raise ValueError(f"Livro não encontrado: {book}")
+    row = int(number) - 1  # paragraph_number = posição (1-based) da linha, como em fetch_paragraph
+    if not 0 <= row < vectors.n_rows:
+        raise ValueError(f"Parágrafo {number} fora do livro {book} (1..{vectors.n_rows}).")
+    indexes = {book: _model_index(model, book)}
+
+    lo, hi = vectors.row_ptr[row], vectors.row_ptr[row + 1]
+    q_terms, q_weights = vectors.row_terms[lo:hi], vectors.row_weights[lo:hi]
+
+    candidates: List[Tuple[float, str, int]] = []
+    for name in source or list(model.books):
+        target = model.books.get(name)
+        if target is None:
+            continue
+        scores = book_scores(target, q_terms, q_weights)
+        if name == book:
+            scores[row] = 0.0
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k] if len(scores) > k else np.arange(len(scores))
+        candidates.extend((float(scores[i]), name, int(i)) for i in top if scores[i] > min_score)
+
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+    results = []
+    for score, name, i in candidates[:k]:
+        if name not in indexes:
+            indexes[name] = _model_index(model, name)
+        index = indexes[name]
+        r = index.rows[i]
+        results.append(asdict(SearchResult(
+            source=name,
+            text=str(r.get(index.texto_key, "")),
+            number=r.get("paragraph_number", i + 1),
+            score=round(score, 4),
+            metadata=compact_metadata(r, index.texto_key) if index.has_metadata else None,
+        )))
+
+    query_index = indexes[book]
+    return {
+        "query": {
+            "source": book,
+            "number": int(number),
+            "text": str(query_index.rows[row].get(query_index.texto_key, "")),
+        },
+        "results": results,
+    }
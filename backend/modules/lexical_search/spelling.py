@@ -0,0 +1,183 @@
+# spelling.py
+"""
+Correção ortográfica ("você quis dizer") para buscas sem ocorrências.
+
+Deleções simétricas (SymSpell) sobre os N primeiros caracteres das palavras do corpus com
+frequência mínima (hápax costumam ser os próprios erros de digitação): palavra e consulta geram
+as variantes com até k caracteres removidos; candidatos são as palavras que compartilham alguma
+variante, confirmados pela distância real (edit_distance, lexical_utils).
+"""
+from dataclasses import dataclass
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import logging
+import threading
+import time
+
+from modules.lexical_search.lexical_utils import (
+    _BOOL_OPS,
+    _WORD_RE,
+    _WORD_RUN_RE,
+    _prepare_query,
+    available_books,
+    edit_distance,
+    find_book_file,
+    load_book_index,
+    normalize_for_match,
+    split_field_token,
+    tokenize_query_spans,
+)
+from modules.lexical_search.suggest import _collect_terms, lexical_suggest
+
+logger = logging.getLogger("cons-ai")
+
+_SPELL_MAX_DISTANCE = 2
+_SPELL_PREFIX_LEN = 7
+_SPELL_MIN_FREQ = 2
+_SPELL_MIN_LEN = 3
+_SPELL_MAX_TERMS = 3       # palavras desconhecidas corrigidas por query
+SPELL_SUGGESTIONS = 3      # queries sugeridas (e candidatos por palavra)
+
+
+def _deletes(word: str, max_distance: int) -> set:
+    """Todas as variantes de `word` com até `max_distance` caracteres removidos (inclui a própria)."""
+    out = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+@dataclass
+class SpellIndex:
+    """Vocabulário com frequências + deleções dos prefixos (variante -> prefixos -> palavras)."""
+    freq: Dict[str, int]
+    deletes: Dict[str, List[str]]
+    groups: Dict[str, List[str]]
+    signature: Tuple = ()
+
+    def lookup(self, word: str, max_distance: int = _SPELL_MAX_DISTANCE) -> List[Tuple[str, int, int]]:
+        """(palavra, distância, frequência) a até `max_distance`, mais próximas e frequentes primeiro."""
+        prefixes = set()
+        for d in _deletes(word[:_SPELL_PREFIX_LEN], max_distance):
+            prefixes.update(self.deletes.get(d, ()))
+        found = []
+        for p in prefixes:
+            for cand in self.groups[p]:
+                dist = edit_distance(word, cand, max_distance)
+                if 0 < dist <= max_distance:
+                    found.append((cand, dist, self.freq[cand]))
+        found.sort(key=lambda c: (c[1], -c[2], c[0]))
+        return found
+
+
+def build_spell_index(freq: Dict[str, int], signature: Tuple = ()) -> SpellIndex:
+    """Agrupa as palavras pelo prefixo e indexa as deleções de cada prefixo distinto."""
+    groups: Dict[str, List[str]] = {}
+    for word, n in freq.items():
+        if n >= _SPELL_MIN_FREQ and len(word) >= _SPELL_MIN_LEN and not word.isdigit():
+            groups.setdefault(word[:_SPELL_PREFIX_LEN], []).append(word)
+    deletes: Dict[str, List[str]] = {}
+    for p in groups:
+        for d in _deletes(p, _SPELL_MAX_DISTANCE):
+            deletes.setdefault(d, []).append(p)
+    return SpellIndex(freq=freq, deletes=deletes, groups=groups, signature=signature)
+
+
+_spell_cache: Dict[str, SpellIndex] = {}
+_spell_cache_lock = threading.Lock()
+
+
+def get_spell_index() -> SpellIndex:
+    """Índice ortográfico de todos os livros disponíveis (refeito quando algum arquivo muda)."""
+    indexes = [load_book_index(f) for f in (find_book_file(b) for b in available_books()) if f]
+    signature = tuple((ix.book, ix.mtime) for ix in indexes)
+    with _spell_cache_lock:
+        cached = _spell_cache.get("all")
+        if cached is not None and cached.signature == signature:
+            return cached
+    freq = {word: n for word, (_, n) in _collect_terms(indexes).items()}
+    built = build_spell_index(freq, signature=signature)
+    with _spell_cache_lock:
+        _spell_cache["all"] = built
+    return built
+
+
+def spelling_suggestions(search_term: str, files: List[Path], limit: int = SPELL_SUGGESTIONS) -> List[Dict[str, Any]]:
+    """
+    Queries alternativas para uma busca sem ocorrências: troca as palavras simples (ver
+    query_word_spans) ausentes dos livros pesquisados pelas vizinhas ortográficas mais
+    frequentes que existem nesses livros. Sugestões iguais à própria query ficam de fora.
+
+    Retorna: [{"query": "...", "corrections": {"consiensia": "consciencia"}, "distance": 2}, ...]
+    """
+    indexes = [load_book_index(f) for f in files]
+
+    def known(word: str) -> bool:
+        return any(word in ix.postings for ix in indexes)
+
+    spans = query_word_spans(search_term)
+    unknown: List[str] = []
+    for _, _, word in spans:
+        if len(word) >= _SPELL_MIN_LEN and not word.isdigit() and not known(word) and word not in unknown:
+            unknown.append(word)
+    if not unknown:
+        return []
+
+    spell = get_spell_index()
+    options: List[List[Tuple[str, int, int]]] = []
+    for word in unknown[:_SPELL_MAX_TERMS]:
+        cands = [c for c in spell.lookup(word) if known(c[0])][:limit]
+        options.append([(word, 0, 0)] + cands)  # manter a palavra também é uma opção
+
+    combos = []
+    for combo in product(*options):
+        changes = {w: c[0] for w, c in zip(unknown, combo) if c[0] != w}
+        if changes:
+            combos.append((sum(c[1] for c in combo), -min(c[2] for c in combo if c[1]), changes))
+    combos.sort(key=lambda c: (-len(c[2]), c[0], c[1]))
+
+    out = []
+    for distance, _, changes in combos[:limit]:
+        # só as palavras extraídas acima são trocadas (campos, ~k/~stem e curingas ficam intactos)
+        query, end = "", 0
+        for start, stop, word in spans:
+            if word in changes:
+                query += search_term[end:start] + changes[word]
+                end = stop
+        query += search_term[end:]
+        if query != search_term:
+            out.append({"query": query, "corrections": changes, "distance": distance})
+    return out
+
+
+def query_word_spans(search_term: str) -> List[Tuple[int, int, str]]:
+    """
+    (início, fim, palavra normalizada) das palavras simples de `search_term`, nas folhas de
+    `query_leaves`: fora de curingas, termos aproximados (~k, ~stem) e campos (title:…, e
+    também o nome de campo sem valor, "title:").
+    """
+    raw = search_term or ""
+    q = _prepare_query(raw)
+    # _prepare_query tira os espaços das pontas e pode pôr a query entre aspas (frase implícita)
+    shift = len(raw) - len(raw.lstrip()) - (1 if q != raw.strip() else 0)
+    spans: List[Tuple[int, int, str]] = []
+    for leaf, start, end in tokenize_query_spans(q):
+        if leaf in _BOOL_OPS or leaf in "()" or "*" in leaf or "~" in leaf or split_field_token(leaf):
+            continue
+        for m in _WORD_RUN_RE.finditer(q, start, end):
+            word = normalize_for_match(m.group(0))
+            if _WORD_RE.fullmatch(word):
+                spans.append((m.start() + shift, m.end() + shift, word))
+    return spans
+
+
+def warm_lexical_caches() -> None:
+    """Carrega todos os livros e monta autocomplete + índice ortográfico (uso: thread no boot)."""
+    t0 = time.perf_counter()
+    lexical_suggest("a")
+    get_spell_index()
+    logger.info(f"[warm_lexical_caches] índices prontos em {time.perf_counter() - t0:.1f}s")
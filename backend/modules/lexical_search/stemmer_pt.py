@@ -0,0 +1,107 @@
+# stemmer_pt.py
+"""
+Radicalizador leve de português para a busca léxica (sem dependências externas).
+
+Trabalha sobre palavras já normalizadas por `normalize_for_match` (minúsculas, sem acentos).
+Inspirado no RSLP (Orengo & Huyck), em versão reduzida: plural -> advérbio -> grau ->
+sufixos nominais -> sufixos verbais -> vogal temática. Cada passo só remove o sufixo se
+sobrar um radical com o tamanho mínimo da regra.
+
+Ex.: projecao, projecoes, projetivo, projetar, projetado, projeto -> "projet"
+
+STOPWORDS_PT lista palavras funcionais para estatísticas (colocações) que devem ignorá-las.
+
+Antes de radicalizar, grafias anteriores ao Acordo Ortográfico (ou lusitanas) são trocadas
+pela forma brasileira atual (ORTHO_VARIANTS), de modo que "projecto" e "projeto" caiam no mesmo radical.
+"""
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# Grafias pré-reforma / lusitanas -> forma atual no Brasil (já sem acentos). Palavras em que o
+# Brasil mantém a consoante (recepção, excepcional) ficam fora: a forma lusitana pós-Acordo
+# (receção, excecional) não é a do corpus.
+ORTHO_VARIANTS: Dict[str, str] = {
+    "accao": "acao", "accoes": "acoes",
+    "actual": "atual", "actuais": "atuais", "actualmente": "atualmente",
+    "actividade": "atividade", "actividades": "atividades", "activo": "ativo", "activa": "ativa",
+    "coleccao": "colecao", "coleccoes": "colecoes",
+    "contacto": "contato", "contactos": "contatos",
+    "correcto": "correto", "correcta": "correta", "correccao": "correcao",
+    "direccao": "direcao", "direccoes": "direcoes", "directo": "direto", "directa": "direta",
+    "efectivo": "efetivo", "efectiva": "efetiva",
+    "exacto": "exato", "exacta": "exata", "exactamente": "exatamente",
+    "facto": "fato", "factos": "fatos",
+    "objecto": "objeto", "objectos": "objetos", "objectivo": "objetivo", "objectivos": "objetivos",
+    "optimo": "otimo", "optima": "otima", "optimismo": "otimismo", "optimista": "otimista",
+    "projecto": "projeto", "projectos": "projetos", "projeccao": "projecao", "projeccoes": "projecoes",
+    "projectar": "projetar", "projectivo": "projetivo", "projector": "projetor",
+    "reaccao": "reacao", "reaccoes": "reacoes",
+    "seccao": "secao", "seccoes": "secoes",
+    "seleccao": "selecao", "seleccoes": "selecoes",
+    "tecto": "teto", "arquitecto": "arquiteto", "arquitectura": "arquitetura",
+    "baptismo": "batismo", "excepcao": "excecao", "adopcao": "adocao",
+}
+
+# Palavras funcionais (já sem acentos), fora das estatísticas de colocação por padrão
+STOPWORDS_PT = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles
+depois do dos e ela elas ele eles em entre era eram essa essas esse esses esta estas este estes
+eu foi foram ha isso isto ja la lhe lhes mais mas me mesmo meu meus minha minhas muito na nas
+nem no nos nossa nossas nosso nossos num numa o os ou para pela pelas pelo pelos por qual quando
+que quem se sem ser seu seus so sua suas tambem te tem ter teu tua um uma umas uns voce voces
+vos sao sobre seja sejam pode podem esta estao cada outro outra outros outras ainda assim onde
+""".split())
+
+# (sufixo, substituição, tamanho mínimo do radical que sobra); ordem = prioridade
+_PLURAL: List[Tuple[str, str, int]] = [
+    ("oes", "ao", 2), ("aes", "ao", 2), ("ais", "al", 2), ("eis", "el", 2), ("ois", "ol", 2),
+    ("ns", "m", 2), ("res", "r", 3), ("zes", "z", 3), ("les", "l", 3), ("s", "", 3),
+]
+_ADVERB: List[Tuple[str, str, int]] = [("mente", "", 4)]
+_DEGREE: List[Tuple[str, str, int]] = [
+    ("issimo", "", 3), ("issima", "", 3), ("zinho", "", 3), ("zinha", "", 3),
+    ("inho", "", 3), ("inha", "", 3), ("ito", "", 4), ("ita", "", 4),
+]
+_NOUN: List[Tuple[str, str, int]] = [
+    ("amento", "", 3), ("imento", "", 3), ("encial", "ent", 3), ("ancial", "ant", 3),
+    ("encia", "ent", 3), ("ancia", "ant", 3), ("idade", "", 3), ("acao", "", 3), ("icao", "", 3),
+    ("ecao", "et", 3), ("ucao", "ut", 3), ("ador", "", 3), ("adora", "", 3), ("edor", "", 3),
+    ("idor", "", 3), ("etor", "et", 3), ("etora", "et", 3), ("ismo", "", 3), ("ista", "", 3),
+    ("avel", "", 3), ("ivel", "", 3), ("oso", "", 3), ("osa", "", 3), ("ivo", "", 3), ("iva", "", 3),
+    ("ico", "", 3), ("ica", "", 3), ("ial", "", 3),
+]
+_VERB: List[Tuple[str, str, int]] = [
+    ("ariamos", "", 3), ("eriamos", "", 3), ("iriamos", "", 3), ("assemos", "", 3),
+    ("aramos", "", 3), ("eramos", "", 3), ("iramos", "", 3), ("avamos", "", 3),
+    ("aria", "", 3), ("eria", "", 3), ("iria", "", 3), ("asse", "", 3), ("esse", "", 3),
+    ("isse", "", 3), ("aram", "", 3), ("eram", "", 3), ("iram", "", 3), ("avam", "", 3),
+    ("ando", "", 3), ("endo", "", 3), ("indo", "", 3), ("amos", "", 3), ("emos", "", 3),
+    ("imos", "", 3), ("ado", "", 3), ("ada", "", 3), ("ido", "", 3), ("ida", "", 3),
+    ("ava", "", 3), ("ar", "", 3), ("er", "", 3), ("ir", "", 3), ("am", "", 3), ("em", "", 3),
+    ("ou", "", 3), ("eu", "", 3), ("iu", "", 3),
+]
+_VOWEL: List[Tuple[str, str, int]] = [("a", "", 3), ("e", "", 3), ("o", "", 3)]
+
+
+def _apply(word: str, rules: List[Tuple[str, str, int]]) -> Tuple[str, bool]:
+    """Aplica a primeira regra cujo sufixo casa e deixa radical >= mínimo."""
+    for suffix, repl, min_stem in rules:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            return word[: len(word) - len(suffix)] + repl, True
+    return word, False
+
+
+@lru_cache(maxsize=65536)
+def stem_pt(word: str) -> str:
+    """Radical de uma palavra normalizada (palavras curtas e números voltam intactos)."""
+    word = ORTHO_VARIANTS.get(word, word)
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    word, _ = _apply(word, _PLURAL)
+    word, _ = _apply(word, _ADVERB)
+    word, _ = _apply(word, _DEGREE)
+    word, changed = _apply(word, _NOUN)
+    if not changed:
+        word, _ = _apply(word, _VERB)
+    word, _ = _apply(word, _VOWEL)
+    return word
@@ -0,0 +1,150 @@
+# suggest.py
+"""
+Autocomplete por prefixo (termos do corpus e títulos de verbetes), ranqueado por frequência.
+
+Derivado dos índices por livro já em cache (lexical_utils); o índice de sugestões é refeito só
+quando muda o conjunto de livros ou algum arquivo. Chaves normalizadas em ordem: prefixos até
+N caracteres têm o top-K já ranqueado; os mais longos ranqueiam só o intervalo (pequeno) do
+vocabulário ordenado que começa com eles.
+"""
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import heapq
+import threading
+
+from modules.lexical_search.lexical_utils import (
+    BookIndex,
+    available_books,
+    find_book_file,
+    load_book_index,
+    normalize_for_match,
+)
+from utils.config import MAX_SUGGEST_LIMIT, SUGGEST_LIMIT
+
+_SUGGEST_PRECOMPUTED_LEN = 3
+_SUGGEST_TOP_K = MAX_SUGGEST_LIMIT
+_SUGGEST_TITLE_BOOK = "EC"
+
+
+@dataclass
+class SuggestIndex:
+    """Chaves normalizadas em ordem (intervalo de prefixo via bisect) + top-K de prefixos curtos."""
+    keys: List[str]
+    labels: List[str]
+    weights: List[int]
+    top: Dict[str, List[int]] = field(default_factory=dict)
+    signature: Tuple = ()
+
+    def lookup(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """(rótulo, frequência) das chaves que começam com `prefix`, mais frequentes primeiro."""
+        if len(prefix) <= _SUGGEST_PRECOMPUTED_LEN:
+            ids = self.top.get(prefix, [])[:limit]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + "\uffff", lo)
+            ids = heapq.nsmallest(limit, range(lo, hi), key=lambda i: (-self.weights[i], self.keys[i]))
+        return [(self.labels[i], self.weights[i]) for i in ids]
+
+
+def build_suggest_index(weighted: Dict[str, Tuple[str, int]], signature: Tuple = ()) -> SuggestIndex:
+    """Monta o índice a partir de {chave normalizada: (rótulo, frequência)}."""
+    keys = sorted(weighted)
+    labels = [weighted[k][0] for k in keys]
+    weights = [weighted[k][1] for k in keys]
+
+    # percorre do mais frequente ao menos frequente: cada prefixo curto guarda os K primeiros
+    top: Dict[str, List[int]] = {}
+    for i in sorted(range(len(keys)), key=lambda i: (-weights[i], keys[i])):
+        k = keys[i]
+        for n in range(1, min(len(k), _SUGGEST_PRECOMPUTED_LEN) + 1):
+            bucket = top.setdefault(k[:n], [])
+            if len(bucket) < _SUGGEST_TOP_K:
+                bucket.append(i)
+    return SuggestIndex(keys=keys, labels=labels, weights=weights, top=top, signature=signature)
+
+
+_suggest_cache: Dict[str, SuggestIndex] = {}
+_suggest_cache_lock = threading.Lock()
+
+
+def _cached_suggest_index(
+    kind: str, files: List[Path], collect: Callable[[List[BookIndex]], Dict[str, Tuple[str, int]]]
+) -> SuggestIndex:
+    """Índice de sugestões para `files`, refeito quando muda o conjunto de livros ou algum mtime."""
+    indexes = [load_book_index(f) for f in files]
+    signature = tuple((ix.book, ix.mtime) for ix in indexes)
+    cache_key = f"{kind}:{','.join(sorted(str(f) for f in files))}"
+    with _suggest_cache_lock:
+        cached = _suggest_cache.get(cache_key)
+        if cached is not None and cached.signature == signature:
+            return cached
+    built = build_suggest_index(collect(indexes), signature=signature)
+    with _suggest_cache_lock:
+        _suggest_cache[cache_key] = built
+    return built
+
+
+def _collect_terms(indexes: List[BookIndex]) -> Dict[str, Tuple[str, int]]:
+    """Palavras do texto principal; frequência = nº de parágrafos (somado entre livros)."""
+    weighted: Dict[str, Tuple[str, int]] = {}
+    for ix in indexes:
+        for word, ids in ix.postings.items():
+            prev = weighted.get(word)
+            weighted[word] = (word, len(ids) + (prev[1] if prev else 0))
+    return weighted
+
+
+def _collect_titles(indexes: List[BookIndex]) -> Dict[str, Tuple[str, int]]:
+    """Títulos (coluna `title`) com o rótulo original; frequência = nº de parágrafos do título."""
+    weighted: Dict[str, Tuple[str, int]] = {}
+    for ix in indexes:
+        fidx = ix.fields.get("title")
+        if fidx is None:
+            continue
+        for value, ids in fidx.distinct.items():
+            prev = weighted.get(value)
+            weighted[value] = (fidx.labels[value], len(ids) + (prev[1] if prev else 0))
+    return weighted
+
+
+def get_term_suggest_index(files: List[Path]) -> SuggestIndex:
+    return _cached_suggest_index("terms", files, _collect_terms)
+
+
+def get_title_suggest_index(path: Path) -> SuggestIndex:
+    return _cached_suggest_index("titles", [path], _collect_titles)
+
+
+def lexical_suggest(
+    prefix: str,
+    source: Optional[List[str]] = None,
+    limit: int = SUGGEST_LIMIT,
+) -> Dict[str, Any]:
+    """
+    Autocomplete: termos do corpus e títulos de verbetes (EC) que começam com `prefix`,
+    ordenados por frequência. Sem `source`, usa todos os livros disponíveis.
+
+    Retorna: {"prefix": <normalizado>, "terms": [{"term", "count"}], "titles": [{"title", "count"}]}
+    """
+    key = normalize_for_match(prefix).strip()
+    limit = max(1, min(int(limit), MAX_SUGGEST_LIMIT))
+    if not key:
+        return {"prefix": key, "terms": [], "titles": []}
+
+    books = list(source) if source else available_books()
+    files = [f for f in (find_book_file(b) for b in books) if f is not None]
+    terms = get_term_suggest_index(files).lookup(key, limit) if files else []
+
+    titles: List[Tuple[str, int]] = []
+    ec_file = find_book_file(_SUGGEST_TITLE_BOOK)
+    if ec_file is not None:
+        titles = get_title_suggest_index(ec_file).lookup(key, limit)
+
+    return {
+        "prefix": key,
+        "terms": [{"term": t, "count": c} for t, c in terms],
+        "titles": [{"title": t, "count": c} for t, c in titles],
+    }
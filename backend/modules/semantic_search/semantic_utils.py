@@ -0,0 +1,310 @@
+# semantic_utils.py
+"""
+Busca semântica local (sem rede): embeddings LSA dos parágrafos, calculados com NumPy.
+
+Alternativa offline ao file_search da OpenAI para os mesmos livros de FILES_SEARCH_DIR.
+
+Pipeline:
+  1) matriz TF-IDF do corpus (a mesma do /similar, ver similarity.py);
+  2) SVD truncada aleatorizada (Halko et al.): projeção gaussiana + iterações de potência,
+     sem materializar a matriz densa -> matriz termo x dimensão (V x d);
+  3) embedding de cada parágrafo = linha TF-IDF x termos, normalizado (L2);
+  4) consulta: texto -> vetor TF-IDF com o mesmo vocabulário/idf -> mesmo espaço -> cosseno.
+
+O índice fica em SEMANTIC_INDEX_DIR (docs.npy, terms.npy, idf.npy, vocab.json, meta.json) e é
+aberto com mmap (float32), sem carregar a matriz inteira na RAM. É refeito quando a lista
+de livros ou algum mtime muda. A busca é força bruta por livro (um produto matriz-vetor).
+Nas requisições o índice nunca é construído na hora: enquanto falta (ou está desatualizado),
+a construção roda numa thread e a busca levanta IndexBuilding (HTTP 503).
+"""
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from modules.lexical_search.lexical_utils import (
+    IndexBuilding,
+    SearchResult,
+    available_books,
+    compact_metadata,
+    find_book_file,
+    load_book_index,
+    normalize_for_match,
+)
+from modules.lexical_search.similarity import TfidfModel, get_tfidf_model
+from utils.config import MAX_SEMANTIC_RESULTS, SEMANTIC_DIM, SEMANTIC_INDEX_DIR, SEMANTIC_RESULTS
+
+logger = logging.getLogger("cons-ai")
+
+_OVERSAMPLE = 16        # colunas extras da projeção aleatória (precisão da SVD)
+_POWER_ITERATIONS = 2   # iterações de potência (espectro da TF-IDF decai devagar)
+_CHUNK_NNZ = 200_000    # não-nulos por bloco nos produtos esparsos (limita a memória)
+_SEED = 20240601
+
+
+@dataclass
+class SemanticIndex:
+    vocab: Dict[str, int]
+    idf: np.ndarray
+    terms: np.ndarray                         # V x d (mmap)
+    docs: np.ndarray                          # N x d, linhas L2-normalizadas (mmap)
+    books: Dict[str, Tuple[int, int]]         # livro -> [início, fim) em docs
+    signature: Tuple = ()
+
+
+_index: Optional[SemanticIndex] = None
+_index_lock = threading.Lock()
+_builder: Optional[threading.Thread] = None  # construção em segundo plano (load_semantic_index(wait=False))
+_builder_lock = threading.Lock()
+
+
+# =============================================================================================
+# Álgebra esparsa (CSR/CSC em arrays simples; sem scipy)
+# =============================================================================================
+def _sparse_dot(ptr: np.ndarray, idx: np.ndarray, val: np.ndarray, dense: np.ndarray) -> np.ndarray:
+    """
+    (matriz esparsa comprimida por linha) @ dense. Serve tanto para X (CSR) quanto para Xᵀ
+    (CSC de X). Processa em blocos de ~_CHUNK_NNZ não-nulos.
+    """
+    n_out = len(ptr) - 1
+    out = np.zeros((n_out, dense.shape[1]), dtype=np.float32)
+    lengths = np.diff(ptr)
+    start = 0
+    while start < n_out:
+        stop = int(np.searchsorted(ptr, ptr[start] + _CHUNK_NNZ, side="right")) - 1
+        stop = min(max(stop, start + 1), n_out)
+        lo, hi = int(ptr[start]), int(ptr[stop])
+        if hi > lo:
+            contrib = dense[idx[lo:hi]] * val[lo:hi, None]
+            nonempty = np.nonzero(lengths[start:stop])[0]
+            # reduceat soma cada segmento; linhas vazias ficam de fora (ficariam com lixo)
+            sums = np.add.reduceat(contrib, ptr[start:stop][nonempty] - lo, axis=0)
+            out[start + nonempty] = sums
+        start = stop
+    return out
+
+
+def _stack_corpus(model: TfidfModel, books: List[str]):
+    """CSR e CSC globais (linhas empilhadas na ordem de `books`)."""
+    ptrs, terms, weights, offsets = [np.zeros(1, dtype=np.int64)], [], [], {}
+    n_rows = 0
+    for book in books:
+        vec = model.books[book]
+        ptrs.append(vec.row_ptr[1:].astype(np.int64) + ptrs[-1][-1])
+        terms.append(vec.row_terms)
+        weights.append(vec.row_weights)
+        offsets[book] = (n_rows, n_rows + vec.n_rows)
+        n_rows += vec.n_rows
+    row_ptr = np.concatenate(ptrs)
+    row_terms = np.concatenate(terms) if terms else np.zeros(0, dtype=np.int32)
+    row_weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+
+    rows = np.repeat(np.arange(n_rows, dtype=np.int32), np.diff(row_ptr))
+    order = np.argsort(row_terms, kind="stable")
+    col_ptr = np.searchsorted(row_terms[order], np.arange(len(model.vocab) + 1))
+    csr = (row_ptr, row_terms, row_weights)
+    csc = (col_ptr, rows[order], row_weights[order])
+    return csr, csc, offsets
+
+
+def randomized_svd_terms(csr, csc, n_terms: int, dim: int) -> np.ndarray:
+    """Vetores singulares à direita (V x dim) da TF-IDF, por SVD aleatorizada."""
+    rng = np.random.default_rng(_SEED)
+    width = dim + _OVERSAMPLE
+    omega = rng.standard_normal((n_terms, width)).astype(np.float32)
+    q, _ = np.linalg.qr(_sparse_dot(*csr, omega))
+    for _ in range(_POWER_ITERATIONS):
+        z, _ = np.linalg.qr(_sparse_dot(*csc, q))
+        q, _ = np.linalg.qr(_sparse_dot(*csr, z))
+    b_t = _sparse_dot(*csc, q)                      # (Qᵀ X)ᵀ: V x width
+    _, _, vt = np.linalg.svd(b_t.T, full_matrices=False)
+    return np.ascontiguousarray(vt[:dim].T, dtype=np.float32)
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms > 0, norms, 1.0)
+
+
+# =============================================================================================
+# Construção / persistência
+# =============================================================================================
+def build_semantic_index(directory: Path = None, dim: int = SEMANTIC_DIM) -> SemanticIndex:
+    directory = Path(directory or SEMANTIC_INDEX_DIR)
+    model = get_tfidf_model()
+    books = [book for book, _ in model.signature]
+    csr, csc, offsets = _stack_corpus(model, books)
+    dim = max(1, min(dim, len(model.vocab), len(csr[0]) - 1))
+
+    terms = randomized_svd_terms(csr, csc, len(model.vocab), dim)
+    docs = _normalize_rows(_sparse_dot(*csr, terms))
+
+    # grava em .tmp e troca no fim; meta.json por último marca o índice como válido
+    directory.mkdir(parents=True, exist_ok=True)
+    vocab_words = sorted(model.vocab, key=model.vocab.get)
+    payload = {
+        "docs.npy": docs, "terms.npy": terms, "idf.npy": model.idf.astype(np.float32),
+    }
+    for name, arr in payload.items():
+        tmp = directory / f"{name}.tmp"
+        with open(tmp, "wb") as fh:
+            np.save(fh, arr)
+        os.replace(tmp, directory / name)
+    meta = {
+        "dim": dim,
+        "signature": [list(s) for s in model.signature],
+        "books": {book: list(span) for book, span in offsets.items()},
+    }
+    for name, obj in (("vocab.json", vocab_words), ("meta.json", meta)):
+        tmp = directory / f"{name}.tmp"
+        tmp.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, directory / name)
+    return open_semantic_index(directory)
+
+
+def open_semantic_index(directory: Path = None) -> Optional[SemanticIndex]:
+    """Abre o índice gravado (matrizes em mmap) ou None se ausente/incompleto."""
+    directory = Path(directory or SEMANTIC_INDEX_DIR)
+    try:
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        words = json.loads((directory / "vocab.json").read_text(encoding="utf-8"))
+        return SemanticIndex(
+            vocab={w: i for i, w in enumerate(words)},
+            idf=np.load(directory / "idf.npy"),
+            terms=np.load(directory / "terms.npy", mmap_mode="r"),
+            docs=np.load(directory / "docs.npy", mmap_mode="r"),
+            books={book: tuple(span) for book, span in meta["books"].items()},
+            signature=tuple(tuple(s) for s in meta["signature"]),
+        )
+    except (OSError, ValueError, KeyError) as e:
+        logger.info(f"[open_semantic_index] índice indisponível em {directory}: {e}")
+        return None
+
+
+def _refresh_index(signature: Tuple, build: bool) -> Optional[SemanticIndex]:
+    """Com _index_lock: reabre o índice do disco ou, com `build`, refaz (None se faltar)."""
+    global _index
+    if _index is not None and _index.signature == signature:
+        return _index
+    stored = open_semantic_index()
+    if stored is not None and stored.signature == signature:
+        _index = stored
+    elif build:
+        t0 = time.perf_counter()
+        _index = build_semantic_index()
+        logger.info(
+            f"[load_semantic_index] {len(_index.docs)} parágrafos x {_index.docs.shape[1]} dims "
+            f"em {time.perf_counter() - t0:.1f}s"
+        )
+    else:
+        return None
+    return _index
+
+
+def _build_in_background(signature: Tuple) -> None:
+    try:
+        with _index_lock:
+            _refresh_index(signature, build=True)
+    except Exception as e:
+        logger.error(f"[load_semantic_index] falha ao construir o índice: {e}", exc_info=True)
+
+
+def load_semantic_index(wait: bool = True) -> SemanticIndex:
+    """
+    Índice em memória; reaberto do disco ou refeito se os livros mudaram.
+    Com wait=False (requisições), só reabre um índice já gravado; se for preciso refazê-lo,
+    a construção vai para uma thread e a chamada levanta IndexBuilding em vez de bloquear.
+    """
+    global _builder
+    paths = [p for p in (find_book_file(b) for b in available_books()) if p]
+    signature = tuple((p.stem, p.stat().st_mtime) for p in paths)  # = (index.book, index.mtime)
+    index = _index
+    if index is not None and index.signature == signature:
+        return index
+    if wait:
+        with _index_lock:
+            return _refresh_index(signature, build=True)
+    if _index_lock.acquire(blocking=False):  # ocupado = construção em andamento
+        try:
+            index = _refresh_index(signature, build=False)
+        finally:
+            _index_lock.release()
+        if index is not None:
+            return index
+    with _builder_lock:
+        if _builder is None or not _builder.is_alive():
+            _builder = threading.Thread(
+                target=_build_in_background, args=(signature,), name="semantic-build", daemon=True
+            )
+            _builder.start()
+    raise IndexBuilding("Índice semântico em construção; tente novamente em instantes.")
+
+
+# =============================================================================================
+# Consulta
+# =============================================================================================
+def embed_query(index: SemanticIndex, text: str) -> Optional[np.ndarray]:
+    """Texto -> vetor no espaço LSA (None se nenhuma palavra pesa no vocabulário)."""
+    counts: Dict[int, int] = {}
+    for chunk in text.split():
+        t = index.vocab.get(normalize_for_match(chunk))
+        if t is not None and index.idf[t] > 0:
+            counts[t] = counts.get(t, 0) + 1
+    if not counts:
+        return None
+    ids = np.fromiter(counts, dtype=np.int64)
+    weights = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32))) * index.idf[ids]
+    vec = weights @ index.terms[ids]
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else None
+
+
+def semantic_search(
+    query: str,
+    source: Optional[List[str]] = None,
+    k: int = SEMANTIC_RESULTS,
+) -> Dict[str, Any]:
+    """
+    Top-k parágrafos por cosseno no espaço LSA, nos livros `source` (todos, se vazio).
+    IndexBuilding enquanto o índice está sendo (re)construído.
+
+    Retorno: {"results": [SearchResult como dict, ...]} (score = cosseno).
+    """
+    query = (query or "").strip()
+    if not query:
+        raise ValueError("Query vazia.")
+    k = max(1, min(int(k), MAX_SEMANTIC_RESULTS))
+    index = load_semantic_index(wait=False)
+    qv = embed_query(index, query)
+    if qv is None:
+        return {"results": []}
+
+    candidates: List[Tuple[float, str, int]] = []
+    for book in source or list(index.books):
+        span = index.books.get(book)
+        if span is None:
+            continue
+        scores = index.docs[span[0]:span[1]] @ qv
+        top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+        candidates.extend((float(scores[i]), book, int(i)) for i in top if scores[i] > 0)
+
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+    results = []
+    for score, book, i in candidates[:k]:
+        book_index = load_book_index(find_book_file(book))
+        r = book_index.rows[i]
+        results.append(asdict(SearchResult(
+            source=book,
+            text=str(r.get(book_index.texto_key, "")),
+            number=r.get("paragraph_number"),
+            score=round(score, 4),
+            metadata=compact_metadata(r, book_index.texto_key) if book_index.has_metadata else None,
+        )))
+    return {"results": results}
@@ -0,0 +1,84 @@
+"""
+Motor em memória x SQLite FTS5 no corpus real (não coletado pelo pytest).
+
+Uso (a partir de backend/):
+    python -m tests.bench_engines                    # banco em LEXICAL_SQLITE_PATH
+    python -m tests.bench_engines --db /tmp/fts.db   # outro arquivo (recriado do zero)
+
+Mede a indexação no SQLite (tempo e tamanho do arquivo), a carga dos índices em memória e,
+por query, o total de linhas em cada motor e o tempo de uma busca de 100 resultados.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+
+from modules.lexical_search import lexical_utils
+from modules.lexical_search.engines import MemoryEngine
+from modules.lexical_search.fts_engine import SqliteFtsEngine, to_fts5
+from modules.lexical_search.lexical_utils import available_books, find_book_file
+
+QUERIES: List[str] = [
+    "consciencia",
+    "proj*",
+    '"projecao consciente"',
+    "tenepes & amparador",
+    "evolucao & !intrafisica",
+    "(cosmoetica | autodiscernimento) & lucidez",
+]
+
+
+def _timeit(fn: Callable[[], object], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=None, help="arquivo SQLite (padrão: LEXICAL_SQLITE_PATH)")
+    args = parser.parse_args()
+    if args.db is not None and args.db.exists():
+        args.db.unlink()
+
+    paths = [find_book_file(b) for b in available_books()]
+    fts, mem = SqliteFtsEngine(args.db), MemoryEngine()
+
+    t0 = time.perf_counter()
+    for path in paths:
+        fts.sync_book(path)
+    t_fts = time.perf_counter() - t0
+    size = fts.db_path.stat().st_size + sum(
+        p.stat().st_size for p in fts.db_path.parent.glob(fts.db_path.name + "-wal")
+    )
+
+    lexical_utils.clear_index_cache()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for path in paths:
+        lexical_utils.load_book_index(path)
+    t_mem = time.perf_counter() - t0
+    mem_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{len(paths)} livros")
+    print(f"sqlite: indexação {t_fts:.1f}s, arquivo {size / 1e6:.1f} MB")
+    print(f"memory: carga {t_mem:.1f}s, ~{mem_bytes / 1e6:.0f} MB alocados (tracemalloc)\n")
+    print(f"{'query':<45} {'total mem':>9} {'total fts':>9} {'mem (ms)':>9} {'fts (ms)':>9}")
+    for query in QUERIES:
+        assert to_fts5(query), query
+        total_mem = sum(mem.book_count(p, query) for p in paths)
+        total_fts = sum(fts.book_count(p, query) for p in paths)
+        t_m = _timeit(lambda: [mem.book_search(p, query, 100) for p in paths])
+        t_f = _timeit(lambda: [fts.book_search(p, query, 100) for p in paths])
+        print(f"{query:<45} {total_mem:>9} {total_fts:>9} {t_m * 1000:>9.1f} {t_f * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmarks da busca léxica (não coletado pelo pytest).
+
+Uso (a partir de backend/):
+    python -m tests.bench_lexical              # padrões adversariais + corpus real
+    python -m tests.bench_lexical --no-corpus  # só os adversariais
+
+Compara a regex de referência (`wildcard_pattern`) com o matcher linear
+(`compile_wildcard`) e mede a avaliação completa por livro do corpus.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+from modules.lexical_search import lexical_utils
+from modules.lexical_search.lexical_utils import compile_wildcard, wildcard_pattern
+
+# (padrão, texto) em que a regex com ".*" encadeados retrocede de forma polinomial
+ADVERSARIAL: List[Tuple[str, str]] = [
+    ("a*a*b", "a" * 3000),
+    ("*a*a*a*b*", "a" * 200),
+    ("ab*ab*ab*c", "ab" * 600),
+    ("x*y*z", ("x " * 2000) + "y"),
+    ("*cao*mente*ismo", "projecao " * 500),
+]
+
+CORPUS_QUERIES = ["*logia", "proj*", "*a*b*c*", "cons*cia", "*mente*", "holo*pens*"]
+
+
+def _timeit(fn: Callable[[], object], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_adversarial() -> None:
+    print(f"{'padrão':<20} {'len':>6} {'regex (ms)':>12} {'linear (ms)':>12}")
+    for term, text in ADVERSARIAL:
+        rx, lin = wildcard_pattern(term), compile_wildcard(term)
+        assert bool(rx.search(text)) == bool(lin.search(text)), term
+        t_rx = _timeit(lambda: rx.search(text), repeat=1)
+        t_lin = _timeit(lambda: lin.search(text))
+        print(f"{term:<20} {len(text):>6} {t_rx * 1000:>12.2f} {t_lin * 1000:>12.3f}")
+
+
+def bench_corpus() -> None:
+    paths = sorted(lexical_utils.FILES_SEARCH_DIR.glob("*.xlsx"))
+    if not paths:
+        print(f"(sem livros em {lexical_utils.FILES_SEARCH_DIR})")
+        return
+    t0 = time.perf_counter()
+    indexes = [lexical_utils.load_book_index(p) for p in paths]
+    rows = sum(ix.size for ix in indexes)
+    print(f"\n{len(indexes)} livros, {rows} linhas (carga {time.perf_counter() - t0:.1f}s)")
+    print(f"{'consulta':<14} {'regex (ms)':>12} {'linear (ms)':>12} {'avaliação (ms)':>15} {'hits':>7}")
+    for query in CORPUS_QUERIES:
+        rx, lin = wildcard_pattern(query), compile_wildcard(query)
+        texts = [t for ix in indexes for t in ix.norm]
+        t_rx = _timeit(lambda: sum(1 for t in texts if rx.search(t)), repeat=1)
+        t_lin = _timeit(lambda: sum(1 for t in texts if lin.search(t)))
+        hits = 0
+
+        def evaluate() -> None:
+            nonlocal hits
+            hits = sum(lexical_utils.evaluate_query_bits(ix, query).bit_count() for ix in indexes)
+
+        t_eval = _timeit(evaluate)
+        print(f"{query:<14} {t_rx * 1000:>12.1f} {t_lin * 1000:>12.1f} {t_eval * 1000:>15.1f} {hits:>7}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--no-corpus", action="store_true", help="não mede o corpus em files/Lexical")
+    args = parser.parse_args()
+    bench_adversarial()
+    if not args.no_corpus:
+        bench_corpus()
+
+
+if __name__ == "__main__":
+    main()
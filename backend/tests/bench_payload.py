@@ -0,0 +1,60 @@
+"""
+Tamanho e serialização da resposta de /lexical_search (não coletado pelo pytest).
+
+Uso (a partir de backend/):
+    python -m tests.bench_payload                 # query padrão, todos os livros
+    python -m tests.bench_payload "evolucao"      # outra query
+
+Mede, para uma busca de 100 resultados em todos os livros, o JSON no formato antigo
+(fields=["all"]), no esquema compacto padrão, com seleção de campos e com snippet.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+from modules.lexical_search.lexical_utils import available_books, lexical_search_detailed
+
+# (rótulo, parâmetros de lexical_search_detailed)
+VARIANTS: List[Tuple[str, Dict[str, Any]]] = [
+    ("antigo (fields=all)", {"fields": ["all"]}),
+    ("compacto (padrão)", {}),
+    ("fields=source,number,text,title", {"fields": ["source", "number", "text", "title"]}),
+    ("compacto + snippet=200", {"snippet": 200}),
+]
+
+
+def _timeit(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query", nargs="?", default="consciencia")
+    args = parser.parse_args()
+
+    books = available_books()
+    lexical_search_detailed(args.query, books)  # aquece índices
+    print(f"query={args.query!r}, {len(books)} livros")
+    print(f"{'variante':<34} {'hits':>5} {'bytes':>10} {'busca (ms)':>11} {'json (ms)':>10}")
+    for label, params in VARIANTS:
+        search = lexical_search_detailed(args.query, books, **params)
+        response = {"results": search["results"], "total": search["total"], "facets": search["facets"]}
+        payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        t_search = _timeit(lambda: lexical_search_detailed(args.query, books, **params))
+        t_json = _timeit(lambda: json.dumps(response, ensure_ascii=False))
+        print(
+            f"{label:<34} {len(search['results']):>5} {len(payload):>10,} "
+            f"{t_search * 1000:>11.1f} {t_json * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
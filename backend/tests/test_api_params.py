@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import pytest
+
+import app as api
+
+
+@pytest.fixture
+def client():
+    api.app.config["TESTING"] = True
+    return api.app.test_client()
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Substitui as buscas por stubs que só registram os argumentos recebidos."""
+    calls = {}
+
+    def detailed(query, source, **kwargs):
+        calls["detailed"] = kwargs
+        return {"results": [], "total": 0, "facets": {"books": {}}, "truncated": False, "skipped_books": [],
+                "suggestions": [], "duplicates": 0, "result_id": None, "phases": {}, "explain": None}
+
+    def batch(queries, source, **kwargs):
+        calls["batch"] = kwargs
+        return []
+
+    monkeypatch.setattr(api, "lexical_search_detailed", detailed)
+    monkeypatch.setattr(api, "lexical_search_batch", batch)
+    return calls
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/lexical_search", {"term": "projecao"}),
+    ("/lexical_search_batch", {"queries": ["projecao"]}),
+])
+def test_time_budget_is_clamped_to_the_server_ceiling(client, captured, monkeypatch, path, body):
+    monkeypatch.setattr(api, "LEXICAL_TIME_BUDGET_S", 3.0)
+    key = "detailed" if path == "/lexical_search" else "batch"
+
+    assert client.post(path, json=body).status_code == 200
+    assert captured[key]["time_budget_s"] == 3.0
+    assert client.post(path, json={**body, "time_budget_ms": "500"}).status_code == 200
+    assert captured[key]["time_budget_s"] == 0.5
+    assert client.post(path, json={**body, "time_budget_ms": 60000}).status_code == 200
+    assert captured[key]["time_budget_s"] == 3.0
+
+    # "0" desligaria o prazo e negativo cortaria tudo: o cliente não desliga o orçamento
+    for bad in ("0", 0, -100, "abc"):
+        captured.clear()
+        response = client.post(path, json={**body, "time_budget_ms": bad})
+        assert response.status_code == 400, bad
+        assert key not in captured
+
+
+def test_batch_max_results_and_engine_are_validated(client, captured):
+    body = {"queries": ["projecao"], "mode": "results"}
+    assert client.post("/lexical_search_batch", json={**body, "max_results": "5", "engine": "SQLite"}).status_code == 200
+    assert captured["batch"]["max_results"] == 5 and captured["batch"]["engine"] == "sqlite"
+    assert client.post("/lexical_search_batch", json=body).status_code == 200
+    assert captured["batch"]["max_results"] == 20 and captured["batch"]["engine"] is None
+
+    for bad in ("abc", -1, 2.5):
+        captured.clear()
+        assert client.post("/lexical_search_batch", json={**body, "max_results": bad}).status_code == 400, bad
+        assert "batch" not in captured
+
+
+@pytest.mark.parametrize("path, body, name, bad", [
+    ("/lexical_search", {"term": "projecao"}, "snippet", ["abc", -1, 1.5]),
+    ("/lexical_search_batch", {"queries": ["projecao"]}, "snippet", ["abc", -1]),
+    ("/lexical_suggest", {"q": "proj"}, "limit", ["abc", 0]),
+    ("/concordance", {"term": "projecao"}, "window", ["abc", -1]),
+    ("/concordance", {"term": "projecao"}, "offset", ["abc", -1]),
+    ("/concordance", {"term": "projecao"}, "limit", ["abc", -1]),
+    ("/collocations", {"term": "projecao"}, "window", ["abc", 0]),
+    ("/collocations", {"term": "projecao"}, "min_count", ["abc", 0]),
+    ("/collocations", {"term": "projecao"}, "limit", ["abc", 0]),
+    ("/similar", {"book": "LO", "number": 1}, "k", ["abc", 0]),
+    ("/similar", {"book": "LO"}, "number", ["abc", 0]),
+    ("/semantic_search", {"query": "projecao"}, "k", ["abc", 0]),
+    ("/paragraph", {"ids": "LO: 1"}, "context", ["abc", -1]),
+    ("/paragraph", {"ids": "LO: 1"}, "before", ["abc", -1]),
+    ("/paragraph", {"ids": "LO: 1"}, "after", ["abc", -1]),
+])
+def test_integer_params_are_validated_before_searching(client, path, body, name, bad):
+    for value in bad:
+        response = client.post(path, json={**body, name: value})
+        assert response.status_code == 400, (name, value)
+        assert name in response.get_json()["details"]
+
+
+def test_paragraph_get_validates_number_and_context(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, "fetch_paragraph", lambda *args: calls.append(args) or {"book": args[0]})
+
+    assert client.get("/paragraph?book=LO&number=12&context=2&after=0").status_code == 200
+    assert calls == [("LO", 12, 2, 0)]
+    for query in ("number=abc", "number=0", "number=1&context=-1", "number=1&before=x"):
+        assert client.get(f"/paragraph?book=LO&{query}").status_code == 400, query
+    assert len(calls) == 1
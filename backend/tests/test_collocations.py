@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.lexical_search import lexical_utils
+from modules.lexical_search.collocations import association_scores, lexical_collocations
+
+
+@pytest.fixture
+def books(tmp_path: Path, monkeypatch):
+    texts = [
+        "A tenepes diária com o amparador.",
+        "Tenepes diária e ofiex.",
+        "A tenepes exige amparador e diária disciplina.",
+        "O amparador técnico.",
+        "Projeção lúcida diária.",
+        "Projeção lúcida.",
+    ]
+    pd.DataFrame([{"text": t} for t in texts]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+
+def _by_word(stats: dict) -> dict:
+    return {c["word"]: c for c in stats["collocates"]}
+
+
+def test_paragraph_scope_counts_shared_paragraphs(books):
+    stats = lexical_collocations("tenepes", ["LO"], min_count=1)
+    assert stats["total"] == 3
+    found = _by_word(stats)
+    assert found["diaria"]["count"] == 3 and found["diaria"]["freq"] == 4
+    assert found["amparador"]["count"] == 2 and found["amparador"]["freq"] == 3
+    assert "tenepes" not in found and "a" not in found  # o próprio termo e stopwords ficam fora
+    assert "a" in _by_word(lexical_collocations("tenepes", ["LO"], min_count=1, stopwords=True))
+
+
+def test_window_scope_only_counts_nearby_tokens(books):
+    found = _by_word(lexical_collocations("tenepes", ["LO"], scope="window", window=1, min_count=1))
+    assert set(found) == {"diaria", "exige"}
+    assert found["diaria"]["count"] == 2
+
+
+def test_association_scores_match_contingency_table():
+    # 2x2: a=10, slots=20 (X), f_w=30, total=200 -> E11 = 20*30/200 = 3
+    scores = association_scores(np.array([10]), np.array([30]), 20, 200)
+    assert scores["pmi"][0] == pytest.approx(np.log2(10 / 3))
+    k = np.array([10, 10, 20, 160])
+    e = np.array([3, 17, 27, 153])
+    assert scores["ll"][0] == pytest.approx(2 * np.sum(k * np.log(k / e)))
+
+    with pytest.raises(ValueError):
+        lexical_collocations("tenepes | ofiex", ["LO"])
+
+
+def test_queries_reuse_the_precomputed_normalized_entries(books):
+    from modules.lexical_search import collocations
+
+    collocations._result_cache.clear()
+    assert collocations.precompute_collocations(["LO"], top_n=3) == 3
+    cached = list(collocations._result_cache)
+
+    # grafia da consulta (maiúsculas, acentos) não cria outra entrada para o mesmo termo
+    stats = lexical_collocations("Diária", ["LO"], min_count=1)
+    assert "diaria" in {key[2] for key in cached}
+    assert set(collocations._result_cache) == set(cached)
+    assert _by_word(stats)["tenepes"]["count"] == 3
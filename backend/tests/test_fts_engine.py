@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from modules.lexical_search import engines, lexical_utils
+from modules.lexical_search.engines import LexicalEngine, MemoryEngine
+from modules.lexical_search.fts_engine import SqliteFtsEngine, to_fts5
+
+
+def _without_hash(found):
+    total, hits = found
+    return total, [{k: v for k, v in h.items() if k != "content_hash"} for h in hits]
+
+
+def test_to_fts5_translates_supported_syntax_and_rejects_the_rest():
+    assert to_fts5("Consciência") == '"consciencia"'
+    assert to_fts5("proj*") == '"proj"*'
+    assert to_fts5('"Projeção Consciente"') == '"projecao consciente"'
+    assert to_fts5("(a | b) & c") == '(("a" OR "b") AND "c")'
+    assert to_fts5("evolucao & !intrafisica") == '("evolucao" NOT "intrafisica")'
+    for query in ("!evolucao", "*cao", "pro*cao", "projecao~1", "title:holo*", "a | !b"):
+        assert to_fts5(query) is None, query
+
+
+def test_sqlite_engine_matches_memory_engine(tmp_path: Path, monkeypatch):
+    texts = [
+        "A projeção consciente e a tenepes.",
+        "Tipos: | 1. Projeção lúcida. | 2. Projeção semilúcida. | 3. Tenepes diária.",
+        "Evolução intrafísica da consciência.",
+        "Evolução da consciência.",
+    ]
+    pd.DataFrame([{"text": t, "title": f"T{i}"} for i, t in enumerate(texts)]).to_excel(
+        tmp_path / "LO.xlsx", index=False
+    )
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+    path = tmp_path / "LO.xlsx"
+    fts, mem = SqliteFtsEngine(tmp_path / "fts.sqlite3"), MemoryEngine()
+
+    for query in ("projecao", "projecao & !semilucida", "lucida & tenepes", "evolucao & !intrafisica", "tene*"):
+        assert _without_hash(fts.book_search(path, query, 10)) == mem.book_search(path, query, 10), query
+        assert fts.book_count(path, query) == mem.book_count(path, query), query
+
+    # fallback: sintaxe sem equivalente em FTS5 vai para o motor em memória
+    assert fts.book_count(path, "*cao") == mem.book_count(path, "*cao")
+
+    # arquivo alterado -> livro reindexado
+    pd.DataFrame([{"text": "Só tenepes."}]).to_excel(path, index=False)
+    lexical_utils.clear_index_cache()
+    assert fts.book_search(path, "tenepes", 10)[1][0]["paragraph_text"] == "Só tenepes."
+    assert fts.book_count(path, "projecao") == 0
+
+
+def test_batch_search_uses_the_requested_engine(tmp_path: Path, monkeypatch):
+    texts = ["A projeção consciente.", "Projeção e tenepes.", "Evolução da consciência."]
+    pd.DataFrame([{"text": t} for t in texts]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+    fts = SqliteFtsEngine(tmp_path / "fts.sqlite3")
+    monkeypatch.setattr(engines, "_engines", {"sqlite": fts})
+    searched = []
+    original = fts.book_search
+    monkeypatch.setattr(
+        fts, "book_search", lambda path, query, *args: searched.append(query) or original(path, query, *args)
+    )
+
+    queries = ["projecao", "projecao & tenepes", "*cao"]
+    batch = lexical_utils.lexical_search_batch(queries, ["LO"], mode="results", engine="sqlite")
+    assert searched == queries  # sem cache de folhas: uma busca do motor por query
+    assert batch == lexical_utils.lexical_search_batch(queries, ["LO"], mode="results", engine="memory")
+    assert [q["total"] for q in batch] == [2, 1, 3]
+
+
+def test_engines_must_implement_book_count_and_book_search():
+    class CountOnly(LexicalEngine):
+        def book_count(self, path, query, budget=None):
+            return 0
+
+    for engine in (LexicalEngine, CountOnly):
+        with pytest.raises(TypeError):
+            engine()
+    SqliteFtsEngine(Path("nao-existe.sqlite3"))  # motores concretos implementam os dois
@@ -0,0 +1,550 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from modules.lexical_search import lexical_utils
+from modules.lexical_search.concordance import lexical_concordance
+from modules.lexical_search.lexical_utils import (
+    QueryCostExceeded,
+    SearchBudget,
+    WildcardMatcher,
+    build_book_index,
+    compile_wildcard,
+    edit_distance,
+    evaluate_query_bits,
+    facet_counts,
+    fuzzy_expand,
+    iter_bits,
+    lexical_search_batch,
+    lexical_search_counts,
+    lexical_search_detailed,
+    load_book_index,
+    plan_text_term,
+    search_book_index,
+    search_excel_rows,
+    search_md_content,
+    stem_query,
+    tokenize_query,
+    wildcard_pattern,
+)
+from modules.lexical_search.stemmer_pt import stem_pt
+from modules.lexical_search.suggest import lexical_suggest
+
+
+def _ec_rows() -> list[dict]:
+    rows = [
+        {"text": "**Definologia.** O holopensene pessoal e a consciência.", "number": "1",
+         "title": "Holopensene Pessoal", "date": "09/08/2005", "area": "Experimentologia",
+         "author": "Waldo Vieira"},
+        {"text": "A bicorporeidade na projeção consciente.", "number": "2",
+         "title": "Bicorporeidade", "date": "15/03/2010", "area": "Projeciologia",
+         "author": "Waldo Vieira"},
+        {"text": "O corpo humano e a projeção.", "number": "150",
+         "title": "Soma", "date": "20/11/2015", "area": "Somatologia",
+         "author": "Maria Silva"},
+    ]
+    for i, row in enumerate(rows, start=1):
+        row["paragraph_number"] = i
+    return rows
+
+
+def _numbers(matches: list[dict]) -> list[int]:
+    return [m["paragraph_number"] for m in matches]
+
+
+def test_tokenize_keeps_field_phrase_as_single_token():
+    tokens = tokenize_query('author:"waldo vieira" & title:holo*')
+    assert tokens == ['author:"waldo vieira"', "&", "title:holo*"]
+
+
+def test_field_terms_use_metadata_columns():
+    rows = _ec_rows()
+    assert _numbers(search_excel_rows(rows, "title:holo*")) == [1]
+    assert _numbers(search_excel_rows(rows, 'autor:"waldo vieira"')) == [1, 2]
+    assert _numbers(search_excel_rows(rows, "area:projeciologia | area:somatologia")) == [2, 3]
+    assert _numbers(search_excel_rows(rows, "author:vieira & !area:experimentologia")) == [2]
+    # campo inexistente no livro nunca casa
+    assert search_excel_rows(rows, "theme:homeostatico") == []
+
+
+def test_field_ranges_on_numbers_and_dates():
+    rows = _ec_rows()
+    assert _numbers(search_excel_rows(rows, "number:2..200")) == [2, 3]
+    assert _numbers(search_excel_rows(rows, "number:..1")) == [1]
+    assert _numbers(search_excel_rows(rows, "date:2010..2015")) == [2, 3]
+    assert _numbers(search_excel_rows(rows, "data:01/01/2006..31/12/2012")) == [2]
+    # faixa em coluna textual não casa
+    assert search_excel_rows(rows, "title:a..z") == []
+
+
+def test_field_and_text_terms_combine():
+    rows = _ec_rows()
+    assert _numbers(search_excel_rows(rows, "projecao & author:silva")) == [3]
+    # "corpo" é palavra inteira: a negação não descarta "bicorporeidade"
+    assert _numbers(search_excel_rows(rows, "projecao & !corpo")) == [2]
+
+
+def test_evaluate_query_bits_matches_book_order():
+    index = build_book_index("EC", _ec_rows())
+    bits = evaluate_query_bits(index, "projecao | holopensene")
+    assert list(iter_bits(bits)) == [0, 1, 2]
+    assert evaluate_query_bits(index, "!projecao") == 0b001
+    assert search_book_index(index, "consciencia", limit=1)[0]["metadata"]["title"] == "Holopensene Pessoal"
+
+
+def test_facet_counts_use_bitsets_and_original_labels():
+    index = build_book_index("EC", _ec_rows())
+    bits = evaluate_query_bits(index, "projecao | holopensene")
+    assert facet_counts(index, bits, "author") == {"Waldo Vieira": 2, "Maria Silva": 1}
+    assert facet_counts(index, bits & 0b110, "area") == {"Projeciologia": 1, "Somatologia": 1}
+    assert facet_counts(index, bits, "theme") == {}
+
+
+def test_md_content_has_no_fields():
+    content = "Primeira linha sobre title\n\nSegunda linha\n"
+    assert search_md_content(content, "title") == [
+        {"paragraph_text": "Primeira linha sobre title", "paragraph_number": 1}
+    ]
+    assert search_md_content(content, "title:primeira") == []
+
+
+def test_load_book_index_is_cached_until_file_changes(tmp_path: Path):
+    xlsx_path = tmp_path / "EC.xlsx"
+    pd.DataFrame([{"text": "Texto um", "title": "Um"}]).to_excel(xlsx_path, index=False)
+
+    first = load_book_index(xlsx_path)
+    assert load_book_index(xlsx_path) is first
+    assert first.fields["title"].postings == {"um": [0]}
+
+    pd.DataFrame([{"text": "Texto dois", "title": "Dois"}]).to_excel(xlsx_path, index=False)
+    os.utime(xlsx_path, (first.mtime + 10, first.mtime + 10))
+    second = load_book_index(xlsx_path)
+    assert second is not first
+    assert _numbers(search_book_index(second, "title:dois")) == [1]
+
+
+def test_text_terms_are_planned_over_postings():
+    index = build_book_index("EC", _ec_rows())
+    assert plan_text_term(index, "projecao").strategy == "postings"
+    assert plan_text_term(index, "proj*").groups == [["projecao"]]
+    assert plan_text_term(index, "*cao").strategy == "postings"
+    assert plan_text_term(index, '"projecao consciente"').strategy == "verify"
+    assert plan_text_term(index, "*").strategy == "scan"
+
+    # o plano não altera o resultado: compara com a regex aplicada linha a linha
+    for query in ["proj*", "*corp*", "pro*ao", '"a projecao"', '"consciente"', "*"]:
+        pattern = lexical_utils.term_pattern(query)
+        expected = [i for i, text in enumerate(index.norm) if pattern.search(text)]
+        assert list(iter_bits(evaluate_query_bits(index, query))) == expected, query
+
+
+def test_wildcard_matcher_agrees_with_regex():
+    texts = ["", "a", "ab ab", "a_b", "aab\nb", "b a", "xa\nay b", "consciencia cosmica", "-ab-"]
+    terms = ["a*", "*b", "a*b", "*a*b*", "a**b", "ab*ab", "a*b*a", "cons*cia", "*cia", "*"]
+    for term in terms:
+        regex, linear = wildcard_pattern(term), compile_wildcard(term)
+        for text in texts:
+            assert bool(linear.search(text)) == bool(regex.search(text)), (term, text)
+
+    assert isinstance(compile_wildcard("a*a*a*b"), WildcardMatcher)
+    assert compile_wildcard("a*a*a*b").search("a" * 50_000) is False
+
+
+def test_count_and_exists_modes(tmp_path: Path, monkeypatch):
+    pd.DataFrame(_ec_rows()).drop(columns="paragraph_number").to_excel(tmp_path / "EC.xlsx", index=False)
+    pd.DataFrame([{"text": "Sem relação"}]).to_excel(tmp_path / "TNP.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    assert lexical_search_counts("projecao", ["EC", "TNP"]) == {
+        "counts": {"EC": 2, "TNP": 0},
+        "total": 2,
+        "truncated": False,
+    }
+    assert lexical_search_counts("projecao", ["EC", "TNP"], mode="exists") == {
+        "exists": {"EC": True, "TNP": False},
+        "any": True,
+        "truncated": False,
+    }
+    with pytest.raises(ValueError):
+        lexical_search_counts("projecao", ["EC"], mode="results")
+
+
+def test_batch_search_shares_terms_within_each_book(tmp_path: Path, monkeypatch):
+    pd.DataFrame(_ec_rows()).drop(columns="paragraph_number").to_excel(tmp_path / "EC.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    resolved = []
+    original = lexical_utils.text_term_bits
+    monkeypatch.setattr(
+        lexical_utils,
+        "text_term_bits",
+        lambda index, token, *args: resolved.append(token) or original(index, token, *args),
+    )
+
+    batch = lexical_search_batch(["projecao", "projecao & corpo", "author:silva"], ["EC"])
+    assert [q["total"] for q in batch] == [2, 1, 1]
+    assert sorted(resolved) == ["corpo", "projecao"]
+
+    batch = lexical_search_batch(["projecao"], ["EC"], mode="results", max_results=1)
+    assert batch[0]["count"] == 1 and batch[0]["total"] == 2
+    with pytest.raises(ValueError):
+        lexical_search_batch([], ["EC"])
+
+
+def test_batch_shares_one_budget_and_cost_ceiling(tmp_path: Path, monkeypatch):
+    rows = [{"text": f"linha {i} {'abacate' if i % 3 else 'amendoa'}"} for i in range(3000)]
+    pd.DataFrame(rows).to_excel(tmp_path / "LO.xlsx", index=False)
+    pd.DataFrame(rows).to_excel(tmp_path / "DAC.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    wide = ["*a*", "*e* | *o*", "a*e"]
+    with pytest.raises(QueryCostExceeded):
+        lexical_search_batch(wide, ["LO", "DAC"], max_cost=1000)
+
+    # curingas resolvidos por postings não gastam o orçamento; a regex de "a*e" esgota no LO
+    batch = lexical_search_batch(wide, ["LO", "DAC"], max_cost=None, row_budget=1000)
+    assert batch[0]["counts"] == {"LO": 3000} and batch[0]["skipped_books"] == ["DAC"]
+    assert 0 < batch[2]["counts"]["LO"] < 2000 and batch[2]["skipped_books"] == ["DAC"]
+    assert all(q["truncated"] for q in batch)
+
+    full = lexical_search_batch(wide, ["LO", "DAC"], max_cost=None, row_budget=None)
+    assert [q["total"] for q in full] == [6000, 6000, 4000]
+    assert not any(q["truncated"] or q["skipped_books"] for q in full)
+
+
+def test_budget_truncates_book_but_keeps_partial_results_exact():
+    rows = [{"text": f"linha {i} {'abacate' if i % 3 else 'amendoa'}", "paragraph_number": i + 1} for i in range(2000)]
+    index = build_book_index("LO", rows, has_metadata=False)
+    full = evaluate_query_bits(index, "a*e & !*doa")
+
+    budget = SearchBudget(row_budget=600)
+    partial = evaluate_query_bits(index, "a*e & !*doa", budget=budget)
+    assert budget.exhausted and budget.cutoff is not None and 0 < budget.cutoff < index.size
+    assert partial == full & ((1 << budget.cutoff) - 1)
+
+
+def test_query_cost_ceiling_rejects_before_searching(tmp_path: Path, monkeypatch):
+    pd.DataFrame(_ec_rows()).drop(columns="paragraph_number").to_excel(tmp_path / "EC.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    with pytest.raises(QueryCostExceeded):
+        lexical_search_detailed("*a* | *e*", ["EC"], max_cost=10)
+    search = lexical_search_detailed("projecao", ["EC"], max_cost=10)
+    assert search["total"] == 2 and search["truncated"] is False
+
+
+def test_suggest_ranks_terms_and_titles_by_frequency(tmp_path: Path, monkeypatch):
+    pd.DataFrame(_ec_rows()).drop(columns="paragraph_number").to_excel(tmp_path / "EC.xlsx", index=False)
+    pd.DataFrame([{"text": "Projeção e projeções; projeção lúcida."}, {"text": "Projeção."}]).to_excel(
+        tmp_path / "LO.xlsx", index=False
+    )
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    out = lexical_suggest("Proj")
+    assert out["prefix"] == "proj"
+    assert out["terms"][:2] == [{"term": "projecao", "count": 4}, {"term": "projecoes", "count": 1}]
+    assert lexical_suggest("bico")["titles"] == [{"title": "Bicorporeidade", "count": 1}]
+
+    # prefixo longo (fora do top-K pré-calculado) e filtro por livro
+    assert [t["term"] for t in lexical_suggest("projeco", source=["LO"])["terms"]] == ["projecoes"]
+    assert lexical_suggest("p", limit=1)["terms"] == [{"term": "projecao", "count": 4}]
+    assert lexical_suggest("  ") == {"prefix": "", "terms": [], "titles": []}
+
+
+def test_zero_hit_queries_get_spelling_suggestions(tmp_path: Path, monkeypatch):
+    texts = ["A consciência e a projeção.", "Consciência lúcida.", "Projeção consciente.", "Conscienciologia."]
+    pd.DataFrame([{"text": t} for t in texts]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    assert edit_distance("consiencia", "consciencia", 2) == 1
+    assert edit_distance("projecoa", "projecao", 2) == 1  # transposição
+    assert edit_distance("abc", "xyzw", 2) == 3
+
+    search = lexical_search_detailed("Consiência & projecoa", ["LO"])
+    assert search["total"] == 0
+    assert search["suggestions"][0] == {
+        "query": "consciencia & projecao",
+        "corrections": {"consiencia": "consciencia", "projecoa": "projecao"},
+        "distance": 2,
+    }
+    # curingas e campos não são corrigidos; com ocorrências não há sugestão
+    assert lexical_search_detailed("consiencia* | title:consiencia", ["LO"])["suggestions"] == []
+    assert lexical_search_detailed("consciencia", ["LO"])["suggestions"] == []
+
+
+def test_spelling_suggestions_skip_field_names_and_operator_suffixes(tmp_path: Path, monkeypatch):
+    texts = ["A projeção e o tilte.", "Projeção lúcida; tilte.", "O steam.", "Mais steam."]
+    pd.DataFrame([{"text": t} for t in texts]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    # "title:" sem valor é nome de campo, não a palavra "title" (vizinha de "tilte")
+    assert [(s["query"], s["corrections"]) for s in lexical_search_detailed("title: projecoa", ["LO"])["suggestions"]] == [
+        ("title: projecao", {"projecoa": "projecao"}),
+    ]
+    # o sufixo ~stem não é reescrito junto com a palavra "stem" corrigida
+    assert [s["query"] for s in lexical_search_detailed("stem & projecoa~stem", ["LO"])["suggestions"]] == [
+        "steam & projecoa~stem",
+    ]
+
+
+def test_fuzzy_operator_expands_vocabulary_within_distance():
+    vocab = sorted(["consciencia", "conscencia", "consciencias", "conciencia", "conscienciologia", "cons", "ciencia"])
+    for k in (0, 1, 2):
+        expected = [w for w in vocab if edit_distance(w, "consciencia", k) <= k]
+        assert fuzzy_expand(vocab, "consciencia", k) == expected
+    assert fuzzy_expand(["ab", "ba", "bca"], "ab", 1) == ["ab", "ba"]  # transposição = 1
+
+    rows = [{"text": t, "paragraph_number": i + 1} for i, t in enumerate(
+        ["A consciencia.", "A conciencia.", "As consciencias.", "Conscienciologia."]
+    )]
+    index = build_book_index("LO", rows, has_metadata=False)
+    assert plan_text_term(index, "Consciência~1").strategy == "postings"
+    assert list(iter_bits(evaluate_query_bits(index, "consciencia~1"))) == [0, 1, 2]
+    assert list(iter_bits(evaluate_query_bits(index, "consciencia~"))) == [0, 1, 2]
+    assert list(iter_bits(evaluate_query_bits(index, "consciencia~0 | conscienciologia"))) == [0, 3]
+    # fora do índice (campos) o mesmo termo usa o matcher por palavra
+    assert _numbers(search_excel_rows(_ec_rows(), "title:bicorporeidadi~1")) == [2]
+
+
+def test_stem_operator_groups_inflections_and_old_spellings():
+    forms = ["projecao", "projecoes", "projetivo", "projetar", "projetado", "projeto", "projecto"]
+    assert {stem_pt(w) for w in forms} == {"projet"}
+    assert stem_pt("consciencia") == stem_pt("conscientemente")
+    assert stem_pt("dos") == "dos"
+    # "recepção" e "excepcional" mantêm o p no Brasil: não viram a grafia lusitana
+    assert stem_pt("recepcao") == stem_pt("recepcoes") != stem_pt("rececao")
+    assert stem_pt("excepcional") != stem_pt("excecional")
+
+    rows = [{"text": t, "paragraph_number": i + 1} for i, t in enumerate(
+        ["As projeções lúcidas.", "O projetor e o projecto.", "Consciência projetiva.", "Prometeu."]
+    )]
+    index = build_book_index("LO", rows, has_metadata=False)
+    assert plan_text_term(index, "projeção~stem").strategy == "postings"
+    assert list(iter_bits(evaluate_query_bits(index, "projeção~stem"))) == [0, 1, 2]
+    assert list(iter_bits(evaluate_query_bits(index, "projecao"))) == []
+
+    assert stem_query('projecao & "a consciencia" | title:holo* | cons~1') == (
+        'projecao~stem & "a consciencia" | title:holo* | cons~1'
+    )
+    assert list(iter_bits(evaluate_query_bits(index, stem_query("projecao & !consciencia")))) == [0, 1]
+
+
+def test_concordance_returns_kwic_lines_sorted_and_paged(tmp_path: Path, monkeypatch):
+    texts = [
+        "A **projeção** consciente é treinável.",
+        "Sem projeção, nada; com auto-estima, projeção lúcida.",
+        "Holopensene pessoal.",
+    ]
+    pd.DataFrame([{"text": t} for t in texts]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    out = lexical_concordance("projecao", ["LO"], window=2)
+    assert out["total"] == 3 and out["counts"] == {"LO": 3}
+    assert out["lines"][0] == {"source": "LO", "number": 1, "left": "A", "match": "projeção", "right": "consciente é"}
+    assert out["lines"][1] == {"source": "LO", "number": 2, "left": "Sem", "match": "projeção", "right": ", nada; com"}
+
+    assert [l["right"] for l in lexical_concordance("projecao", ["LO"], window=1, sort="right")["lines"]] == [
+        "consciente", "lúcida.", ", nada;",  # ordena pela palavra seguinte, não pela pontuação
+    ]
+    assert lexical_concordance("projecao", ["LO"], offset=2, limit=5)["lines"][0]["right"].startswith("lúcida")
+    # frase = posições consecutivas; pontuação interna some como na busca (auto-estima -> autoestima)
+    assert lexical_concordance("holopensene pessoal", ["LO"])["lines"][0]["match"] == "Holopensene pessoal"
+    assert lexical_concordance("autoestima", ["LO"])["lines"][0]["match"] == "auto-estima"
+    with pytest.raises(ValueError):
+        lexical_concordance("projecao & consciente", ["LO"])
+
+
+def test_fetch_paragraph_with_neighbors_and_refs(tmp_path, monkeypatch):
+    pd.DataFrame([{"text": t} for t in ["Um.", "Dois.", "Três.", "Quatro."]]).to_excel(
+        tmp_path / "TNP.xlsx", index=False
+    )
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    item = lexical_utils.fetch_paragraph("TNP", 2, before=5, after=1)
+    assert (item["source"], item["number"], item["text"]) == ("TNP", 2, "Dois.")
+    assert [p["number"] for p in item["before"]] == [1]
+    assert [p["number"] for p in item["after"]] == [3]
+
+    refs = lexical_utils.parse_paragraph_refs("TNP: 4, 9; XYZ: 1")
+    assert refs == [("TNP", 4), ("TNP", 9), ("XYZ", 1)]
+    batch = lexical_utils.fetch_paragraphs(refs)
+    assert batch[0]["text"] == "Quatro."
+    assert "error" in batch[1] and "error" in batch[2]
+
+
+def test_pipe_rows_are_filtered_per_segment_with_boolean_semantics():
+    rows = [
+        {"text": "Tipos: | 1. Projeção lúcida. | 2. Projeção semilúcida. | 3. Tenepes diária."},
+        {"text": "Projeção sem itens."},
+    ]
+    index = build_book_index("PROJ", rows)
+    assert index.segments is not None and index.segments.index.size == 3
+
+    hits = search_book_index(index, "projecao & !semilucida")
+    assert [h["paragraph_text"] for h in hits] == ["Tipos: 1. Projeção lúcida.", "Projeção sem itens."]
+    # termos em itens diferentes não casam juntos
+    assert search_book_index(index, "lucida & tenepes") == []
+    assert evaluate_query_bits(index, "lucida & tenepes") == 0
+    # só o cabeçalho casa -> a linha agregadora não é resultado
+    assert _numbers(search_book_index(index, "tipos")) == []
+
+
+def test_segment_evaluation_is_restricted_to_candidate_rows_and_budgeted():
+    rows = [{"text": f"Tipos {i}: | 1. Projeção lúcida. | 2. Tenepes {i}."} for i in range(400)]
+    rows[7]["text"] = "Tipos: | 1. Projeção semilúcida. | 2. Tenepes."
+    index = build_book_index("PROJ", rows)
+    segments = index.segments
+
+    bits = evaluate_query_bits(index, "semilucida")
+    assert list(iter_bits(bits)) == [7]
+    # sem negação só os itens das linhas que já casaram são avaliados e guardados
+    assert list(segments.cache) == [("semilucida", 1 << 7)]
+
+    # com negação, todas as linhas agregadoras (dentro de `within`) são candidatas
+    within = (1 << 10) - 1
+    bits = evaluate_query_bits(index, "projecao & !semilucida", within=within)
+    assert list(iter_bits(bits)) == [i for i in range(10) if i != 7]
+
+    # o orçamento acaba nos itens: o corte volta para a linha do item onde parou
+    budget = SearchBudget(row_budget=800)
+    bits = evaluate_query_bits(index, "proj*o & !*semil*", budget=budget)
+    assert budget.cutoff is not None and 0 < budget.cutoff < 400
+    assert list(iter_bits(bits)) == [i for i in range(budget.cutoff) if i != 7]
+    # avaliação truncada não entra no cache
+    assert ("proj*o & !*semil*", segments.rows_bits) not in segments.cache
+
+
+def test_snippet_windows_around_densest_matches():
+    text = "**Início.** " + "palavra " * 60 + "a projeção lúcida e a projeção consciente " + "outra " * 60
+    snippet = lexical_utils.make_snippet(text, "projecao & !inicio", 60)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "projeção lúcida e a projeção" in snippet and len(snippet) <= 62
+    assert "*" not in lexical_utils.make_snippet("**Curto.** texto", "texto", 100)
+
+    index = build_book_index("LO", [{"text": text}])
+    hit = search_book_index(index, '"projecao consciente"')[0]
+    assert hit["paragraph_text"] == text
+    hit = lexical_utils.materialize_hits(index, 1, '"projecao consciente"', 1, snippet=50)[0]
+    assert "projeção consciente" in hit["paragraph_text"] and len(hit["paragraph_text"]) <= 52
+
+
+def test_results_default_to_compact_metadata_and_fields_select(tmp_path, monkeypatch):
+    pd.DataFrame(_ec_rows()).drop(columns="paragraph_number").assign(link="").to_excel(
+        tmp_path / "EC.xlsx", index=False
+    )
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    compact = lexical_search_detailed("bicorporeidade", ["EC"])["results"][0]
+    assert set(compact) == {"source", "text", "number", "metadata"}
+    assert "text" not in compact["metadata"] and "link" not in compact["metadata"]
+    assert compact["metadata"]["title"] == "Bicorporeidade"
+
+    full = lexical_search_detailed("bicorporeidade", ["EC"], fields=["all"])["results"][0]
+    assert full["score"] == 0.0 and full["metadata"]["text"] == full["text"]
+
+    picked = lexical_search_detailed("bicorporeidade", ["EC"], fields=["number", "title"])["results"][0]
+    assert picked == {"number": 2, "metadata": {"title": "Bicorporeidade"}}
+
+
+def test_dedupe_collapses_identical_paragraphs_across_books(tmp_path, monkeypatch):
+    pd.DataFrame([{"text": "**A projeção** lúcida."}, {"text": "Outra projeção."}]).to_excel(
+        tmp_path / "LO.xlsx", index=False
+    )
+    pd.DataFrame([{"text": "A projeção lúcida!"}, {"text": "Terceira projeção."}]).to_excel(
+        tmp_path / "TNP.xlsx", index=False
+    )
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    plain = lexical_search_detailed("projecao", ["LO", "TNP"])
+    assert len(plain["results"]) == 4 and plain["duplicates"] == 0
+
+    search = lexical_search_detailed("projecao", ["LO", "TNP"], dedupe=True)
+    assert [(r["source"], r["number"]) for r in search["results"]] == [("LO", 1), ("LO", 2), ("TNP", 2)]
+    assert search["results"][0]["duplicates"] == [{"source": "TNP", "number": 1}]
+    assert search["duplicates"] == 1 and search["total"] == 4
+
+
+def test_refine_searches_only_within_cached_result(tmp_path, monkeypatch):
+    texts = ["Projeção lúcida.", "Projeção consciente.", "Consciência lúcida.", "Projeção semilúcida."]
+    pd.DataFrame([{"text": t} for t in texts]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    first = lexical_search_detailed("projecao", ["LO"])
+    assert first["total"] == 3 and first["result_id"]
+
+    refined = lexical_search_detailed("*lucida", [], refine=first["result_id"])
+    assert [r["number"] for r in refined["results"]] == [1, 4]
+    again = lexical_search_detailed("!semi*", [], refine=refined["result_id"])
+    assert [r["number"] for r in again["results"]] == [1]
+
+    with pytest.raises(ValueError):
+        lexical_search_detailed("lucida", [], refine="desconhecido")
+
+
+def test_result_cache_is_lru_with_ttl(monkeypatch):
+    from modules.lexical_search import result_cache as rc
+
+    cache = rc.ResultCache(max_entries=2, ttl_s=60)
+    a, b = cache.put(["a"], {"LO": (0b1, 1.0)}), cache.put(["b"], {"LO": (0b10, 1.0)})
+    assert cache.get(a).queries == ["a"]           # a passa a ser o mais recente
+    c = cache.put(["c"], {"LO": (0b11, 1.0)})
+    assert cache.get(b) is None and cache.get(c).total == 2
+
+    now = rc.time.monotonic()
+    monkeypatch.setattr(rc.time, "monotonic", lambda: now + 61)
+    assert cache.get(a) is None and len(cache) == 1
+
+
+def test_export_reads_cached_result_or_reruns_the_search(tmp_path, monkeypatch):
+    texts = [f"Projeção número {i}." for i in range(150)] + ["Outro assunto."]
+    pd.DataFrame([{"text": t, "title": f"T{i}"} for i, t in enumerate(texts)]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    search = lexical_search_detailed("projecao", ["LO"])
+    assert len(search["results"]) == 100
+    refined = lexical_search_detailed("numero & !1*", [], refine=search["result_id"])
+
+    cached = len(lexical_utils.result_cache)
+    export = lexical_utils.lexical_search_export(refined["result_id"])
+    assert export["search_term"] == "(projecao) & (numero & !1*)"
+    assert len(export["results"]) == refined["total"] == 150 - 61
+    assert export["results"][0]["metadata"]["title"] == "T0"  # metadados completos
+
+    rerun = lexical_utils.lexical_search_export("expirado", "projecao", ["LO"])
+    assert len(rerun["results"]) == 150
+    # a exportação não ocupa o LRU de result_id (não tira resultados que ainda são refinados)
+    assert export["result_id"] is rerun["result_id"] is None
+    assert len(lexical_utils.result_cache) == cached
+    # orçamento próprio da exportação; se cortar, o corte volta para o documento
+    partial = lexical_utils.lexical_search_export("expirado", "*u*e*o* & !outro", ["LO"], row_budget=10)
+    assert partial["truncated"] and len(partial["results"]) < 150
+    with pytest.raises(ValueError):
+        lexical_utils.lexical_search_export("expirado")
+
+
+def test_explain_reports_plan_counts_and_phases(tmp_path, monkeypatch):
+    texts = ["Projeção no campo de força.", "Projeção lúcida.", "Campo verde de luz.", "Campo de energia."]
+    pd.DataFrame([{"text": t} for t in texts]).to_excel(tmp_path / "LO.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+
+    plain = lexical_search_detailed("projecao", ["LO"])
+    assert plain["explain"] is None
+    assert {"load", "cost", "search", "total"} <= set(plain["phases"])  # sempre (slow-query log)
+    search = lexical_search_detailed('proj* & "campo de"', ["LO"], explain=True)
+    assert search["total"] == 1
+    explain = search["explain"]
+    assert explain["engine"] == "memory"
+    assert explain["rpn"] == ["proj*", '"campo de"', "&"]
+    assert {"load", "cost", "search", "merge", "total"} <= set(explain["phases"])
+
+    book = explain["books"]["LO"]
+    assert (book["rows"], book["matched"]) == (4, 1)
+    prefix, phrase = book["terms"]
+    assert (prefix["strategy"], prefix["scanned"], prefix["matched"]) == ("postings", 0, 2)
+    # postings de "campo" e "de*" deixam 3 candidatas; a regex da frase confirma 2
+    assert (phrase["strategy"], phrase["prefiltered"], phrase["scanned"], phrase["matched"]) == ("verify", 3, 3, 2)
+    assert {"evaluate", "materialize"} <= set(book["ms"])
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import os
+
+from utils import logs
+
+
+def test_slow_queries_are_written_async_and_filterable(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, "resolve_log_dir", lambda: str(tmp_path))
+
+    assert logs.log_slow_query({"endpoint": "/lexical_search", "ms": 2500.0, "query": "holo*", "results": 12})
+    assert logs.log_slow_query({"endpoint": "/download", "ms": 9100.0, "query": "holo*", "results": 12})
+    assert logs.log_slow_query({"endpoint": "/lexical_search", "ms": 4000.0, "query": "proj*", "results": 3})
+    logs.flush_slow_log()
+
+    # arquivo próprio ao lado dos logs de acesso, que continuam vazios
+    assert [n for n in os.listdir(tmp_path) if n.startswith("slow-")]
+    assert logs.read_records() == []
+
+    records = logs.read_slow_records()
+    assert [r["query"] for r in records] == ["holo*", "holo*", "proj*"]
+    assert all(r["pid"] == os.getpid() and r["_server_ts"] for r in records)
+    assert [r["ms"] for r in logs.read_slow_records(endpoint="/lexical_search")] == [2500.0, 4000.0]
+    assert [r["endpoint"] for r in logs.read_slow_records(min_ms=5000)] == ["/download"]
+    assert [r["query"] for r in logs.read_slow_records(limit=1)] == ["proj*"]
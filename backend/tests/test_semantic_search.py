@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.lexical_search import lexical_utils, similarity
+from modules.lexical_search.lexical_utils import IndexBuilding
+from modules.semantic_search import semantic_utils
+from modules.semantic_search.semantic_utils import (
+    _sparse_dot,
+    load_semantic_index,
+    open_semantic_index,
+    semantic_search,
+)
+
+
+@pytest.fixture
+def books(tmp_path: Path, monkeypatch):
+    lo = [
+        "A tenepes diária com o amparador técnico.",
+        "Projeção lúcida e desdobramento consciente.",
+        "O amparador técnico assiste a tenepes diária.",
+        "Cosmoética e autodiscernimento.",
+        "Desdobramento lúcido fora do corpo.",
+    ]
+    dac = ["Projeção consciente lúcida.", "Tenepes e amparador."]
+    books_dir = tmp_path / "Lexical"
+    books_dir.mkdir()
+    pd.DataFrame([{"text": t} for t in lo]).to_excel(books_dir / "LO.xlsx", index=False)
+    pd.DataFrame([{"text": t} for t in dac]).to_excel(books_dir / "DAC.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", books_dir)
+    monkeypatch.setattr(similarity, "_model", None)
+    monkeypatch.setattr(semantic_utils, "_index", None)
+    monkeypatch.setattr(semantic_utils, "SEMANTIC_INDEX_DIR", tmp_path / "semantic")
+    return tmp_path / "semantic"
+
+
+def test_sparse_dot_matches_dense():
+    rng = np.random.default_rng(0)
+    dense_x = rng.random((7, 5)).astype(np.float32) * (rng.random((7, 5)) < 0.4)
+    dense_x[3] = 0  # linha vazia
+    ptr = np.concatenate([[0], np.cumsum((dense_x != 0).sum(axis=1))])
+    rows, cols = np.nonzero(dense_x)
+    m = rng.random((5, 3)).astype(np.float32)
+    got = _sparse_dot(ptr, cols, dense_x[rows, cols], m)
+    assert np.allclose(got, dense_x @ m, atol=1e-5)
+
+
+def test_semantic_search_ranks_related_paragraphs(books):
+    load_semantic_index()  # a busca não constrói o índice (ver test_search_builds_index_in_background)
+    hits = semantic_search("tenepes com amparador", k=3)["results"]
+    assert {(r["source"], r["number"]) for r in hits[:3]} == {("LO", 1), ("LO", 3), ("DAC", 2)}
+    only_dac = semantic_search("projeção lúcida", ["DAC"], k=1)["results"]
+    assert [(r["source"], r["number"]) for r in only_dac] == [("DAC", 1)]
+    assert semantic_search("palavrainexistente")["results"] == []
+
+
+def test_index_is_persisted_and_memory_mapped(books):
+    built = load_semantic_index()
+    stored = open_semantic_index(books)
+    assert isinstance(stored.docs, np.memmap) and stored.docs.dtype == np.float32
+    assert stored.signature == built.signature
+    assert np.allclose(np.linalg.norm(stored.docs, axis=1), 1.0, atol=1e-5)
+
+
+def test_search_builds_index_in_background(books, monkeypatch):
+    with pytest.raises(IndexBuilding):
+        semantic_search("tenepes")
+    semantic_utils._builder.join(timeout=60)
+    assert semantic_search("tenepes")["results"]
+
+    # índice gravado e válido: reaberto do disco na própria requisição
+    monkeypatch.setattr(semantic_utils, "_index", None)
+    assert semantic_search("tenepes")["results"]
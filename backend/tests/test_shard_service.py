@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+import stat
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from modules.lexical_search import lexical_utils
+from modules.lexical_search.engines import MemoryEngine
+from modules.lexical_search.lexical_utils import SearchBudget
+from modules.lexical_search.shard_service import (
+    ShardedEngine,
+    ShardServer,
+    create_authkey,
+    plan_shards,
+    read_authkey,
+    shard_address,
+)
+
+
+def _write_books(directory: Path) -> list[Path]:
+    books = {
+        "LO": ["A projeção consciente.", "Evolução da consciência."] * 30,
+        "TNP": ["Tenepes e projeção.", "Amparador extrafísico."] * 10,
+        "EC": ["Holopensene pessoal e projeção."] * 5,
+    }
+    for name, texts in books.items():
+        pd.DataFrame([{"text": t, "area": name.lower()} for t in texts]).to_excel(directory / f"{name}.xlsx", index=False)
+    return [directory / f"{name}.xlsx" for name in ("EC", "LO", "TNP")]
+
+
+def test_plan_shards_balances_by_file_size(tmp_path: Path):
+    sizes = {"A": 900, "B": 500, "C": 400, "D": 100}
+    for name, size in sizes.items():
+        (tmp_path / f"{name}.md").write_bytes(b"x" * size)
+    groups = plan_shards(sorted(tmp_path.glob("*.md")), 2)
+    assert [[p.stem for p in g] for g in groups] == [["A", "D"], ["B", "C"]]
+    assert len(plan_shards(sorted(tmp_path.glob("*.md")), 8)) == 4
+
+
+def test_sharded_engine_matches_memory_engine(tmp_path: Path, monkeypatch):
+    paths = _write_books(tmp_path)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+    create_authkey(shard_dir)
+
+    # dois shards em threads; EC fica sem dono e é buscado localmente
+    servers = [ShardServer(shard_address(0, shard_dir), ["LO"]), ShardServer(shard_address(1, shard_dir), ["TNP"])]
+    for server in servers:
+        server.listen()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        engine, memory = ShardedEngine(shard_dir), MemoryEngine()
+        for query, limit in (("projecao", 50), ("consciencia | amparador", 100), ("tenepes", 0)):
+            got = engine.search_books(paths, query, limit, facet_columns=["area"], budget=SearchBudget(5.0))
+            want = memory.search_books(paths, query, limit, facet_columns=["area"], budget=SearchBudget(5.0))
+            assert got == want, query
+        assert engine.query_cost(paths, "proj*") == memory.query_cost(paths, "proj*")
+
+        # shard fora do ar (socket removido): seus livros voltam a ser buscados localmente
+        servers[1].close()
+        assert ShardedEngine(shard_dir).book_count(paths[2], "tenepes") == 10
+    finally:
+        for server in servers:
+            server.close()
+
+
+class _SlowShard(ShardServer):
+    """Shard que registra os pedidos de busca e demora a responder."""
+
+    def __init__(self, *args, delay: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.requests = []
+
+    def handle(self, request):
+        if request.get("op") == "search":
+            self.requests.append(request)
+            time.sleep(self.delay)
+        return super().handle(request)
+
+
+def test_sharded_engine_splits_rows_and_falls_back_on_timeout(tmp_path: Path, monkeypatch):
+    paths = _write_books(tmp_path)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+    create_authkey(shard_dir)
+
+    fast = _SlowShard(shard_address(0, shard_dir), ["LO"])
+    slow = _SlowShard(shard_address(1, shard_dir), ["TNP"], delay=2.0)
+    for server in (fast, slow):
+        server.listen()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        engine = ShardedEngine(shard_dir)
+        budget = SearchBudget(0.2, row_budget=3000)
+        t0 = time.monotonic()
+        got = engine.search_books(paths, "projecao", 100, budget=budget)
+        assert time.monotonic() - t0 < 1.5
+        # o shard lento é descartado e TNP é buscado aqui
+        want = MemoryEngine().search_books(paths, "projecao", 100, budget=SearchBudget(5.0))
+        assert got == want
+        # cada shard recebe só a parte das linhas proporcional aos seus livros
+        assert fast.requests[0]["row_budget"] == slow.requests[0]["row_budget"] == 1000
+        # o shard descartado fica fora do ar para todas as threads (estado sob _down_lock)
+        seen = []
+        other = threading.Thread(target=lambda: seen.append(set(engine._shards())))
+        other.start()
+        other.join()
+        assert seen == [{shard_address(0, shard_dir)}]
+    finally:
+        fast.close()
+        slow.close()
+
+
+def test_authkey_is_random_private_and_required(tmp_path: Path, monkeypatch):
+    paths = _write_books(tmp_path)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+    key = create_authkey(shard_dir)
+    assert key == read_authkey(shard_dir) and key != create_authkey(tmp_path)
+    assert stat.S_IMODE(os.stat(shard_dir / "authkey").st_mode) == 0o600
+
+    server = ShardServer(shard_address(0, shard_dir), ["TNP"])
+    server.listen()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # chave errada: a conexão é recusada e o livro é buscado localmente
+        engine = ShardedEngine(shard_dir, authkey=b"outra")
+        assert engine.book_count(paths[2], "tenepes") == 10
+        assert engine._shards() == {}
+        assert set(ShardedEngine(shard_dir)._shards()) == {shard_address(0, shard_dir)}
+    finally:
+        server.close()
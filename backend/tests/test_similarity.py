@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.lexical_search import lexical_utils, similarity
+from modules.lexical_search.lexical_utils import IndexBuilding
+from modules.lexical_search.similarity import get_tfidf_model, similar_paragraphs
+
+
+@pytest.fixture
+def books(tmp_path: Path, monkeypatch):
+    lo = [
+        "A tenepes diária com o amparador técnico.",
+        "Projeção lúcida e desdobramento.",
+        "O amparador técnico assiste a tenepes.",
+        "Cosmoética e autodiscernimento.",
+    ]
+    dac = [
+        "Projeção consciente lúcida.",
+        "Tenepes e amparador.",
+    ]
+    pd.DataFrame([{"text": t} for t in lo]).to_excel(tmp_path / "LO.xlsx", index=False)
+    pd.DataFrame([{"text": t} for t in dac]).to_excel(tmp_path / "DAC.xlsx", index=False)
+    monkeypatch.setattr(lexical_utils, "FILES_SEARCH_DIR", tmp_path)
+    monkeypatch.setattr(similarity, "_model", None)
+    get_tfidf_model()  # as consultas não constroem o modelo (ver test_similar_builds_model_in_background)
+
+
+def test_rows_are_unit_vectors_without_stopwords(books):
+    model = get_tfidf_model()
+    vec = model.books["LO"]
+    norms = np.sqrt(np.bincount(
+        np.repeat(np.arange(vec.n_rows), np.diff(vec.row_ptr)), weights=vec.row_weights.astype(np.float64) ** 2
+    ))
+    assert np.allclose(norms, 1.0, atol=1e-5)
+    assert model.idf[model.vocab["a"]] == 0 and model.idf[model.vocab["tenepes"]] > 0
+
+
+def test_similar_ranks_across_books_and_skips_query(books):
+    out = similar_paragraphs("LO", 1)
+    ranked = [(r["source"], r["number"]) for r in out["results"]]
+    assert ranked[:2] == [("LO", 3), ("DAC", 2)]
+    assert ("LO", 1) not in ranked
+    assert ("LO", 4) not in ranked  # nenhum termo em comum
+    assert out["query"]["text"].startswith("A tenepes")
+
+    only_dac = similar_paragraphs("LO", 2, ["DAC"], k=1)["results"]
+    assert [(r["source"], r["number"]) for r in only_dac] == [("DAC", 1)]
+
+
+def test_similar_rejects_unknown_paragraph(books):
+    with pytest.raises(ValueError):
+        similar_paragraphs("LO", 99)
+    with pytest.raises(ValueError):
+        similar_paragraphs("XYZ", 1)
+
+
+def test_similar_builds_model_in_background(books, monkeypatch):
+    monkeypatch.setattr(similarity, "_model", None)
+    with pytest.raises(IndexBuilding):
+        similar_paragraphs("LO", 1)
+    similarity._builder.join(timeout=30)
+    assert similar_paragraphs("LO", 1)["results"]
+
+    # livro alterado: o modelo antigo não é usado; a reconstrução também vai para a thread
+    pd.DataFrame([{"text": "Tenepes."}]).to_excel(lexical_utils.FILES_SEARCH_DIR / "EC.xlsx", index=False)
+    with pytest.raises(IndexBuilding):
+        similar_paragraphs("LO", 1)
+    similarity._builder.join(timeout=30)
+    assert "EC" in get_tfidf_model(wait=False).books
+
+
+def test_similar_refuses_an_index_newer_than_the_model(books, monkeypatch):
+    # o livro muda entre a leitura do modelo e a montagem dos resultados
+    original = similarity.book_scores
+    changed = []
+
+    def change_dac(vectors, *args):
+        if vectors.book == "DAC" and not changed:
+            changed.append(True)
+            texts = ["Outro texto.", "Tenepes e amparador.", "Novo."]
+            pd.DataFrame([{"text": t} for t in texts]).to_excel(lexical_utils.FILES_SEARCH_DIR / "DAC.xlsx", index=False)
+        return original(vectors, *args)
+
+    monkeypatch.setattr(similarity, "book_scores", change_dac)
+    with pytest.raises(IndexBuilding):
+        similar_paragraphs("LO", 1)
+    similarity._builder.join(timeout=30)
+    ranked = [(r["source"], r["number"], r["text"]) for r in similar_paragraphs("LO", 1)["results"]]
+    assert ("DAC", 2, "Tenepes e amparador.") in ranked
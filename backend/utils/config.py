@@ -10,6 +10,52 @@ TEMPERATURE=0.3
 LLM_MAX_RESULTS=3 #INTERNAL
 MAX_OUTPUT_TOKENS=500
 MAX_OVERALL_SEARCH_RESULTS = 100
+MAX_EXPORT_RESULTS = int(os.getenv("MAX_EXPORT_RESULTS", "5000"))  # /download por result_id: teto de itens
+MAX_BATCH_QUERIES = 100          # /lexical_search_batch: máximo de queries por lote
+SUGGEST_LIMIT = 10               # /lexical_suggest: sugestões por lista (padrão)
+MAX_SUGGEST_LIMIT = 50           # /lexical_suggest: teto pedido pelo cliente
+CONCORDANCE_WINDOW = 6           # /concordance: palavras de contexto de cada lado (padrão)
+MAX_CONCORDANCE_WINDOW = 30
+CONCORDANCE_LIMIT = 200          # /concordance: linhas por página (padrão)
+MAX_CONCORDANCE_LIMIT = 5000
+COLLOCATION_WINDOW = 5           # /collocations: distância máxima no escopo "window"
+MAX_COLLOCATION_WINDOW = 20
+COLLOCATION_LIMIT = 30           # /collocations: colocados devolvidos (padrão)
+MAX_COLLOCATION_LIMIT = 500
+SIMILAR_RESULTS = 10             # /similar: parágrafos devolvidos (padrão)
+MAX_SIMILAR_RESULTS = 100
+SEMANTIC_RESULTS = 10            # /semantic_search: parágrafos devolvidos (padrão)
+MAX_SEMANTIC_RESULTS = 100
+SNIPPET_MIN_CHARS = 40           # snippet=N: trecho em torno das ocorrências (limites de N)
+SNIPPET_MAX_CHARS = 2000
+MAX_PARAGRAPH_CONTEXT = 20       # /paragraph: vizinhos antes/depois (teto)
+MAX_PARAGRAPH_BATCH = 200        # /paragraph (POST): ids por lote
+SEMANTIC_DIM = int(os.getenv("SEMANTIC_DIM", "256"))  # dimensões do embedding LSA local
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))      # result_id: conjuntos guardados (LRU)
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "900"))  # result_id: validade (s)
+
+# Orçamento por busca léxica (0 desliga): prazo, linhas varridas por regex e custo estimado
+LEXICAL_TIME_BUDGET_S = float(os.getenv("LEXICAL_TIME_BUDGET_S", "3.0"))
+LEXICAL_ROW_BUDGET = int(os.getenv("LEXICAL_ROW_BUDGET", "2000000"))
+LEXICAL_MAX_QUERY_COST = int(os.getenv("LEXICAL_MAX_QUERY_COST", "6000000"))
+# ...e na exportação (/download), que não é interativa e busca todos os hits
+LEXICAL_EXPORT_TIME_BUDGET_S = float(os.getenv("LEXICAL_EXPORT_TIME_BUDGET_S", "30.0"))
+LEXICAL_EXPORT_ROW_BUDGET = int(os.getenv("LEXICAL_EXPORT_ROW_BUDGET", "20000000"))
+# Motor léxico padrão: "memory" (bitsets em memória), "sqlite" (FTS5 em disco, LEXICAL_SQLITE_PATH)
+# ou "sharded" (processos de shard: python -m modules.lexical_search.shard_service)
+LEXICAL_ENGINE = os.getenv("LEXICAL_ENGINE", "memory")
+# Processos de shard do serviço de busca (0 = um por núcleo) e chave de autenticação dos sockets
+# (vazia: o serviço sorteia uma a cada início e a grava em LEXICAL_SHARD_DIR/authkey, modo 0600)
+LEXICAL_SHARDS = int(os.getenv("LEXICAL_SHARDS", "0"))
+LEXICAL_SHARD_AUTHKEY = os.getenv("LEXICAL_SHARD_AUTHKEY", "").encode()
+# Pré-carrega índices e autocomplete em segundo plano no boot (evita a 1ª tecla lenta)
+LEXICAL_WARMUP = os.getenv("LEXICAL_WARMUP", "0") == "1"
+# ...e, no mesmo boot, os colocados dos N termos mais frequentes de cada livro (0 desliga)
+COLLOCATION_PRECOMPUTE_TOP = int(os.getenv("COLLOCATION_PRECOMPUTE_TOP", "0"))
+# ...e o índice semântico local (refeito só se algum livro mudou; senão abre do disco)
+SEMANTIC_WARMUP = os.getenv("SEMANTIC_WARMUP", "0") == "1"
+# Slow-query log (/lexical_search, /llm_query, /download): requisições acima de N ms (0 desliga)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "2000"))
 
 
 # Vector Store ID - OPENAI
@@ -32,6 +78,12 @@ DEFAULT_VECTOR_STORE_OPENAI = [OPENAI_ID_ALLWV]
 BASE_DIR = Path(__file__).parent.parent.resolve()
 
 FILES_SEARCH_DIR = Path(os.getenv("FILES_SEARCH_DIR", BASE_DIR / "files" / "Lexical")).resolve()
+# Banco SQLite FTS5 do motor léxico "sqlite" (gerado a partir dos livros; não versionar)
+LEXICAL_SQLITE_PATH = Path(os.getenv("LEXICAL_SQLITE_PATH", BASE_DIR / "cache" / "lexical_fts.sqlite3")).resolve()
+# Sockets Unix dos processos de shard (shard-0.sock, shard-1.sock, ...)
+LEXICAL_SHARD_DIR = Path(os.getenv("LEXICAL_SHARD_DIR", BASE_DIR / "cache" / "shards")).resolve()
+# Índice semântico local (embeddings gerados; não versionar)
+SEMANTIC_INDEX_DIR = Path(os.getenv("SEMANTIC_INDEX_DIR", BASE_DIR / "cache" / "semantic")).resolve()
 
 INSTRUCTIONS_LLM_BACKEND = "Você é um assistente da Conscienciologia no estilo ChatGPT."
 
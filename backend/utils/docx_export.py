@@ -1,6 +1,7 @@
 from io import BytesIO
 import json
 import logging
+import re
 import unicodedata
 
 from docx import Document
@@ -129,6 +130,18 @@ def build_docx(data: dict, group_results_by_book: bool):
 
     p.space_after = Pt(6)
     p.space_before = Pt(6)
+
+    # Exportação cortada pelo orçamento da busca: o documento não traz todos os resultados
+    if data.get("truncated"):
+        p = doc.add_paragraph()
+        p.add_run("Aviso: ").bold = True
+        skipped = [bookName(src) for src in data.get("skipped_books") or []]
+        p.add_run(
+            "resultados parciais (orçamento da busca esgotado)"
+            + (f"; fontes não avaliadas: {', '.join(skipped)}" if skipped else "")
+        )
+        p.space_after = Pt(6)
+        p.space_before = Pt(6)
     doc.add_paragraph("")
 
 
@@ -164,6 +177,10 @@ def build_docx(data: dict, group_results_by_book: bool):
     # Agrupar lexical e semantic
     _add_items(array_data_lexical, "lexical")
 
+    # Contagens exatas vindas do motor (facets.books), quando a busca as devolveu;
+    # sem elas, conta os itens recebidos
+    book_totals = (data.get("facets") or {}).get("books") or {}
+
     # Cabeçalho da seção
     p = doc.add_paragraph()
     p.add_run("Estatística de Resultados:").bold = True
@@ -171,14 +188,17 @@ def build_docx(data: dict, group_results_by_book: bool):
     # Impressão final por fonte com detalhamento
     for src, groups in newData.items():
         n_lex = len(groups["lexical"])
-        total = n_lex
+        total = book_totals.get(src, n_lex)
         livro = bookName(src)
 
         # Linha principal por source
         p = doc.add_paragraph()
         run1 = p.add_run(f"●   {livro}:   ")
         run1.bold = True
-        p.add_run(f"Total = {total}")
+        if total > n_lex:
+            p.add_run(f"Total = {total}  (exibidos: {n_lex})")
+        else:
+            p.add_run(f"Total = {n_lex}")
         p.paragraph_format.space_before = Pt(3)
         p.paragraph_format.space_after = Pt(3)
 
@@ -384,6 +404,39 @@ def display_results_simple(doc, data, group_results_by_book):
 
 
 
+#_________________________________________________________
+# _simple_markdown_spans
+#_________________________________________________________
+# Markdown "simples": uma linha, sem HTML/links/código/listas, só ** e * como ênfase
+_MD_SPECIAL = re.compile(r"[<>&\[\]`_#\\\n]|^\s*(?:[-+>]|\d+[.)])\s|\s$|^\s")
+_MD_SPACES = re.compile(r"\s{2,}")  # o HTML colapsa espaços repetidos
+_MD_EMPHASIS = re.compile(r"\*\*(?=\S)([^*]+?)(?<=\S)\*\*|\*(?=\S)([^*]+?)(?<=\S)\*")
+
+
+def _simple_markdown_spans(mdText):
+    """
+    [(texto, negrito, itálico), ...] quando o Markdown só tem **negrito** / *itálico*;
+    None nos demais casos (aí vale a conversão completa via HTML).
+    """
+    if _MD_SPECIAL.search(mdText):
+        return None
+    spans, pos = [], 0
+    for m in _MD_EMPHASIS.finditer(mdText):
+        before, after = mdText[m.start() - 1:m.start()], mdText[m.end():m.end() + 1]
+        if before.isalnum() or before == "*" or after.isalnum() or after == "*":
+            return None  # ênfase intrapalavra/aninhada: regras do markdown2 decidem
+        if m.start() > pos:
+            spans.append((_MD_SPACES.sub(" ", mdText[pos:m.start()]), False, False))
+        spans.append((_MD_SPACES.sub(" ", m.group(1) or m.group(2)), m.group(1) is not None, m.group(2) is not None))
+        pos = m.end()
+    rest = mdText[pos:]
+    if "*" in rest or any("*" in text for text, _, _ in spans):
+        return None
+    if rest:
+        spans.append((_MD_SPACES.sub(" ", rest), False, False))
+    return spans
+
+
 #_________________________________________________________
 # insert_markdown_into_paragraph
 #_________________________________________________________
@@ -395,29 +448,38 @@ def insert_markdown_into_paragraph(mdText, paragraph):
     if not mdText:
         return
 
-    # Converte Markdown -> HTML
-    html = markdown2.markdown(mdText)
-
-    # Cria doc temporário a partir do HTML
-    tmp_bytes = html2docx(html, title="tmp")
-    tmp_doc = Document(tmp_bytes)
-
-    # Copia runs do doc temporário para o parágrafo existente
-    for para in tmp_doc.paragraphs:
-        for run in para.runs:
-            new_run = paragraph.add_run(run.text)
-            new_run.bold = run.bold
-            new_run.italic = run.italic
-            new_run.underline = run.underline
-            new_run.font.size = run.font.size or Pt(10)
-            new_run.font.color.rgb = (
-                run.font.color.rgb if run.font.color else RGBColor(0, 0, 0)
-            )
-        
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        paragraph.space_before  = 0
-        paragraph.space_after   = 0
-        paragraph.line_spacing = LINE_SPACING
+    # Caso comum (só **negrito** / *itálico* numa linha): runs direto, sem doc temporário
+    spans = _simple_markdown_spans(mdText)
+    if spans is not None:
+        runs = [(text, bold or None, italic or None, None, None, None) for text, bold, italic in spans]
+    else:
+        # Converte Markdown -> HTML
+        html = markdown2.markdown(mdText)
+
+        # Cria doc temporário a partir do HTML
+        tmp_bytes = html2docx(html, title="tmp")
+        tmp_doc = Document(tmp_bytes)
+        if not tmp_doc.paragraphs:
+            return
+        runs = [
+            (run.text, run.bold, run.italic, run.underline, run.font.size,
+             run.font.color.rgb if run.font.color else None)
+            for para in tmp_doc.paragraphs for run in para.runs
+        ]
+
+    # Copia os runs para o parágrafo existente
+    for text, bold, italic, underline, size, rgb in runs:
+        new_run = paragraph.add_run(text)
+        new_run.bold = bold
+        new_run.italic = italic
+        new_run.underline = underline
+        new_run.font.size = size or Pt(10)
+        new_run.font.color.rgb = rgb or RGBColor(0, 0, 0)
+
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    paragraph.space_before  = 0
+    paragraph.space_after   = 0
+    paragraph.line_spacing = LINE_SPACING
     
 
 
@@ -3,6 +3,7 @@ import json
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Dict, Any, Iterable, List, Optional, Tuple
+import queue
 import threading
 import urllib.request
 import urllib.error
@@ -24,6 +25,13 @@ _FILENAME_FMT = "access-%Y-%m-%d.log"
 _MAX_VALUE_LEN = 2000
 _MAX_META_ITEMS = 12
 
+# Slow-query log: own NDJSON files next to the access logs, written by a background thread
+_SLOW_FILENAME_FMT = "slow-%Y-%m-%d.log"
+_SLOW_QUEUE_MAX = 1000
+_slow_lock = threading.Lock()
+_slow_queue: Optional["queue.Queue[Dict[str, Any]]"] = None
+_slow_pid: Optional[int] = None  # process that owns the queue/writer (reset after fork)
+
 _geoip_cache_lock = threading.Lock()
 _geoip_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 _geoip_ttl_seconds = 3600
@@ -112,16 +120,16 @@ def _clean_meta(meta: Any, depth: int = 0) -> Any:
     return _trim_string(meta)
 
 
-def clean_old_logs(retention_days: Optional[int] = None) -> int:
-    """Delete files older than retention_days in the access logs directory.
-    Returns number of files deleted."""
+def clean_old_logs(retention_days: Optional[int] = None, prefix: str = "access-") -> int:
+    """Delete files older than retention_days in the access logs directory
+    (only files named <prefix>*.log). Returns number of files deleted."""
     retention_days = int(retention_days if retention_days is not None else _DEFAULT_RETENTION_DAYS)
     cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
     folder = resolve_log_dir()
     deleted = 0
     try:
         for name in os.listdir(folder):
-            if not name.startswith("access-") or not name.endswith(".log"):
+            if not name.startswith(prefix) or not name.endswith(".log"):
                 continue
             fpath = os.path.join(folder, name)
             try:
@@ -480,3 +488,97 @@ def summarize_records(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
         "top_accesses": [{"label": key, "count": count} for key, count in module_counter.most_common(5)],
         "top_locations": [{"label": key, "count": count} for key, count in recent_locations.most_common(4)],
     }
+
+
+# ---------------------- Slow-query log ----------------------
+def get_slow_log_path(dt: Optional[datetime] = None) -> str:
+    dt = dt or datetime.now(timezone.utc)
+    return os.path.join(resolve_log_dir(), dt.strftime(_SLOW_FILENAME_FMT))
+
+
+def _slow_writer_loop(q: "queue.Queue[Dict[str, Any]]") -> None:
+    """Drain the queue in batches and append them to today's slow-query file."""
+    while True:
+        batch = [q.get()]
+        while True:
+            try:
+                batch.append(q.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            path = get_slow_log_path()
+            with open(path, "a", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            clean_old_logs(prefix="slow-")
+        except Exception:
+            pass
+        finally:
+            for _ in batch:
+                q.task_done()
+
+
+def _slow_log_queue() -> "queue.Queue[Dict[str, Any]]":
+    """Queue of this process, starting its writer thread on first use (and again after fork)."""
+    global _slow_queue, _slow_pid
+    pid = os.getpid()
+    with _slow_lock:
+        if _slow_queue is None or _slow_pid != pid:
+            _slow_queue = queue.Queue(maxsize=_SLOW_QUEUE_MAX)
+            _slow_pid = pid
+            threading.Thread(
+                target=_slow_writer_loop, args=(_slow_queue,), name="slow-query-log", daemon=True
+            ).start()
+        return _slow_queue
+
+
+def log_slow_query(record: Dict[str, Any]) -> bool:
+    """Queue one slow request for the background writer (never blocks the request).
+    Adds _server_ts and pid. Returns False if the queue is full and the record was dropped."""
+    record = {"_server_ts": datetime.now(timezone.utc).isoformat(), "pid": os.getpid(), **record}
+    if "query" in record:
+        record["query"] = _trim_string(record["query"])
+    try:
+        _slow_log_queue().put_nowait(record)
+        return True
+    except queue.Full:
+        return False
+
+
+def flush_slow_log() -> None:
+    """Wait until every queued slow-query record has been written."""
+    _slow_log_queue().join()
+
+
+def _list_slow_files_desc() -> List[str]:
+    folder = resolve_log_dir()
+    try:
+        names = [n for n in os.listdir(folder) if n.startswith("slow-") and n.endswith(".log")]
+    except Exception:
+        return []
+    return sorted((os.path.join(folder, n) for n in names), reverse=True)
+
+
+def read_slow_records(
+    limit: Optional[int] = None,
+    endpoint: Optional[str] = None,
+    min_ms: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Most recent slow-query records (oldest first), optionally filtered by endpoint
+    and minimum latency. `limit` counts records after filtering."""
+    out: List[Dict[str, Any]] = []
+    for fpath in _list_slow_files_desc():
+        try:
+            with open(fpath, "r", encoding="utf-8") as f:
+                records = parse_ndjson_lines(f.read())
+        except (IOError, OSError):
+            continue
+        for record in reversed(records):
+            if endpoint and record.get("endpoint") != endpoint:
+                continue
+            if min_ms is not None and float(record.get("ms") or 0) < min_ms:
+                continue
+            out.append(record)
+            if limit and len(out) >= limit:
+                return list(reversed(out))
+    return list(reversed(out))
@@ -1,5 +1,6 @@
 // escopo de módulo
 let _lexicalController = null;
+let _lexicalSuggestController = null;
 let _llmQueryController = null;
 let _randomPensataController = null;
 let _biblioWvController = null;
@@ -83,6 +84,50 @@ async function call_lexical(parameters) {
 }
 
 
+//_________________________________________________________
+// Lexical Suggest (autocomplete: chamado a cada tecla)
+//_________________________________________________________
+async function call_lexical_suggest(prefix, source = [], limit = 10) {
+  // só a última tecla interessa: cancela a sugestão anterior
+  if (_lexicalSuggestController) _lexicalSuggestController.abort();
+  _lexicalSuggestController = new AbortController();
+
+  const params = new URLSearchParams({ q: prefix, limit: String(limit) });
+  if (source && source.length) params.set('source', source.join(','));
+
+  const response = await fetch(`${apiBaseUrl}/lexical_suggest?${params}`, {
+    method: 'GET',
+    signal: _lexicalSuggestController.signal
+  });
+
+  if (!response.ok) {
+    const err = await response.text().catch(() => '');
+    throw new Error(`HTTP ${response.status} ${err}`);
+  }
+
+  return await response.json();  // { prefix, terms: [{term, count}], titles: [{title, count}] }
+}
+
+
+//_________________________________________________________
+// Parágrafos por id (ex.: citações "TNP: 538, 816" do RAGbot)
+//_________________________________________________________
+async function call_paragraphs(ids, context = 0) {
+  const response = await fetch(`${apiBaseUrl}/paragraph`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ ids, context })
+  });
+
+  if (!response.ok) {
+    const err = await response.text().catch(() => '');
+    throw new Error(`HTTP ${response.status} ${err}`);
+  }
+
+  return await response.json();  // { count, paragraphs: [{source, number, text, metadata, before, after} | {source, number, error}] }
+}
+
+
 
 //_________________________________________________________
 // LLM
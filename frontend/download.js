@@ -234,7 +234,18 @@ async function downloadResults(format, payload, searchTerm, searchType) {
     // ***************************************************************************************
     // Call Download with the search type
     // ***************************************************************************************
-    const response = await call_download(format, payload);
+    // Com result_id, o backend busca os hits no próprio cache (sem reenviar a lista);
+    // termo e fontes vão junto para refazer a busca se o handle tiver expirado
+    const body = payload?.result_id
+      ? {
+          result_id: payload.result_id,
+          search_term: payload.search_term,
+          source_array: payload.source_array,
+          group_results_by_book: payload.group_results_by_book,
+          display_option: payload.display_option,
+        }
+      : payload;
+    const response = await call_download(format, body);
     
     // ***************************************************************************************
         
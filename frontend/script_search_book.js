@@ -159,6 +159,10 @@ async function search_book() {
             respHistory.lexical = Array.isArray(respLexical.results) 
                 ? respLexical.results 
                 : [];
+            // Contagens exatas por livro (sem o teto de 100 resultados)
+            respHistory.facets = respLexical.facets || {};
+            // Conjunto completo guardado no servidor: o download usa o handle em vez da lista
+            respHistory.result_id = respLexical.result_id || null;
 
 
             removeLoading(resultsDiv);
@@ -192,6 +196,11 @@ async function search_book() {
         const container = document.getElementById('results');
         showSortedData(container, sortedData, term, flag_grouping);
 
+        // Nenhuma ocorrência: oferece as correções sugeridas pelo backend (um clique refaz a busca)
+        if (sortedData.length === 0 && Array.isArray(respLexical.suggestions) && respLexical.suggestions.length) {
+            showSuggestions(container, respLexical.suggestions);
+        }
+
         //console.log("<< script_search_book >>  --- sortedData FINAL", sortedData);
 
 
@@ -213,6 +222,8 @@ async function search_book() {
             group_results_by_book: false,
             display_option: 'simple',
             lexical: respHistory.lexical,
+            facets: respHistory.facets || {},
+            result_id: respHistory.result_id,
         };
 
         // Update results using centralized function
@@ -267,6 +278,26 @@ async function search_book() {
 // ______________________________________________________________________________________________
 // Função personalizada para exibir mensagem com botões
 // ______________________________________________________________________________________________
+function showSuggestions(container, suggestions) {
+    const box = document.createElement('div');
+    box.className = 'search-message msg-info';
+    box.append('Você quis dizer: ');
+    suggestions.forEach((s, i) => {
+        const link = document.createElement('a');
+        link.href = '#';
+        link.textContent = s.query;
+        link.addEventListener('click', e => {
+            e.preventDefault();
+            document.getElementById('searchInput').value = s.query;
+            search_book();
+        });
+        if (i) box.append(' · ');
+        box.append(link);
+    });
+    container.appendChild(box);
+}
+
+
 function showMessageWithButtons(container, message, type = 'info') {
     const classes = {
         error: 'msg-error',